@@ -0,0 +1,196 @@
+""" Throughput and memory benchmarks for the main S1 code paths
+
+A deterministic synthetic THA file is generated (see `s1.synthetic`) and each
+code path is timed over it, reporting lines/sec, MB/sec and peak traced memory.
+Results are compared against the stored baseline, and regressions beyond the
+tolerance make the run exit non-zero. Baselines are machine dependent, so
+record a fresh one (`--save`) before comparing on a new machine.
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --encounters 20000 --save
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from s1 import ColumnarS1Parser, S1Parser, S1Validator
+from s1.parsing import parse_line_with_spec, record_id_from_line
+from s1.reader import MappedS1Reader
+from s1.records.registry import spec_from_record_id
+from s1.synthetic import write_file
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+
+
+def read_lines(path: str) -> List[str]:
+    with open(path) as fobj:
+        return list(fobj)
+
+
+def bench_parse_line_with_spec(path: str, lines: List[str]) -> None:
+    for line in lines:
+        parse_line_with_spec(
+            line, spec_from_record_id(record_id_from_line(line))
+        )
+
+
+def bench_parser_feed(path: str, lines: List[str]) -> None:
+    parser = S1Parser(batch_size=1000)
+    for line in lines:
+        try:
+            parser.feed(line)
+        except parser.BatchSizeExceeded:
+            parser.flush()
+    parser.finish()
+    parser.flush()
+
+
+def parser_in_mode(record_mode: str) -> Callable[[str, List[str]], None]:
+    def bench(path: str, lines: List[str]) -> None:
+        parser = S1Parser(record_mode=record_mode)
+        for _ in parser.iter_batches(lines, batch_size=1000):
+            pass
+
+    return bench
+
+
+def bench_columnar(path: str, lines: List[str]) -> None:
+    for _ in ColumnarS1Parser(batch_size=1000).iter_batches(lines):
+        pass
+
+
+def bench_mapped_reader(path: str, lines: List[str]) -> None:
+    with MappedS1Reader(path) as reader:
+        for _ in S1Parser().iter_batches(reader, batch_size=1000):
+            pass
+
+
+def bench_validate(path: str, lines: List[str]) -> None:
+    validator = S1Validator()
+    for line in lines:
+        validator.validate(line)
+
+
+def bench_validate_fast(path: str, lines: List[str]) -> None:
+    validator = S1Validator(fast=True)
+    for line in lines:
+        validator.validate(line)
+
+
+def bench_validate_file(path: str, lines: List[str]) -> None:
+    S1Validator(fast=True).validate_file(path)
+
+
+CASES: Dict[str, Callable[[str, List[str]], None]] = {
+    "parse_line_with_spec": bench_parse_line_with_spec,
+    "S1Parser.feed": bench_parser_feed,
+    "S1Parser.iter_batches[dict]": parser_in_mode("dict"),
+    "S1Parser.iter_batches[compact]": parser_in_mode("compact"),
+    "S1Parser.iter_batches[lazy]": parser_in_mode("lazy"),
+    "ColumnarS1Parser.iter_batches": bench_columnar,
+    "MappedS1Reader+S1Parser": bench_mapped_reader,
+    "S1Validator.validate": bench_validate,
+    "S1Validator.validate[fast]": bench_validate_fast,
+    "S1Validator.validate_file[fast]": bench_validate_file,
+}
+
+
+def measure(
+    case: Callable[[str, List[str]], None],
+    path: str,
+    lines: List[str],
+    size: int,
+    repeat: int,
+) -> Dict[str, float]:
+    best = min(timed(case, path, lines) for _ in range(repeat))
+    tracemalloc.start()
+    case(path, lines)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "lines_per_sec": len(lines) / best,
+        "mb_per_sec": size / best / 1e6,
+        "peak_memory_mb": peak / 1e6,
+    }
+
+
+def timed(
+    case: Callable[[str, List[str]], None], path: str, lines: List[str]
+) -> float:
+    start = time.perf_counter()
+    case(path, lines)
+    return time.perf_counter() - start
+
+
+def regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    found = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result["lines_per_sec"] < previous["lines_per_sec"] * (
+            1 - tolerance
+        ):
+            found.append(f"{name}: lines/sec fell below baseline")
+        if result["peak_memory_mb"] > previous["peak_memory_mb"] * (
+            1 + tolerance
+        ):
+            found.append(f"{name}: peak memory rose above baseline")
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--encounters", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("cases", nargs="*", help="Only run these cases")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "synthetic.s1")
+        size = write_file(path, args.encounters, seed=args.seed)
+        lines = read_lines(path)
+        results = {}
+        for name, case in CASES.items():
+            if args.cases and name not in args.cases:
+                continue
+            result = measure(case, path, lines, size, args.repeat)
+            results[name] = result
+            print(
+                f"{name:<34} {result['lines_per_sec']:>12,.0f} lines/s "
+                f"{result['mb_per_sec']:>8.1f} MB/s "
+                f"{result['peak_memory_mb']:>8.1f} MB peak"
+            )
+
+    if args.save:
+        with open(args.baseline, "w") as fobj:
+            json.dump(results, fobj, indent=2, sort_keys=True)
+            fobj.write("\n")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as fobj:
+        baseline = json.load(fobj)
+    found = regressions(results, baseline, args.tolerance)
+    for message in found:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
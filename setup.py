@@ -41,6 +41,10 @@ EXTRAS_REQUIRE = {
     "dev": TESTS_REQUIRE + DOCS_REQUIRE,
     "test": TESTS_REQUIRE,
     "docs": DOCS_REQUIRE,
+    "json": ["orjson"],
+    "parquet": ["pyarrow"],
+    "typed": ["pyarrow"],
+    "zstd": ["zstandard>=0.15"],
 }
 
 ###############################################################################
@@ -105,6 +109,7 @@ if __name__ == "__main__":
         python_requires=PYTHON_REQUIRES,
         install_requires=INSTALL_REQUIRES,
         extras_require=EXTRAS_REQUIRE,
+        entry_points={"console_scripts": ["s1 = s1.cli:main"]},
         zip_safe=False,
         options={"bdist_wheel": {"universal": "1"}},
     )
@@ -12,4 +12,7 @@ __copyright__ = "Copyright (c) 2020 " + __author__
 
 from s1 import specifications
 from s1.parsers import S1Parser
+from s1.parsers.aio import AsyncS1Parser
+from s1.parsers.columnar import ColumnarS1Parser
+from s1.parsers.parallel import ParallelS1Parser
 from s1.validators import S1Validator
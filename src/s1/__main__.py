@@ -0,0 +1,5 @@
+import sys
+
+from s1.cli import main
+
+sys.exit(main())
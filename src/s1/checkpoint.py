@@ -0,0 +1,73 @@
+""" Checkpoints for resuming the parsing of a large file
+
+A checkpoint is a small JSON file recording the byte offset of the first line
+not yet handed on, which is always the first line of an encounter, along with
+the parser's counts at that point. `S1Parser.iter_checkpointed` writes one
+after each batch it yields and, when started on the same file again, picks up
+from the last one instead of byte zero. The size and modification time of the
+S1 file are kept too, so a checkpoint isn't applied to a file that changed.
+
+Checkpoints are written to a temporary file first and then moved into place,
+so a job dying mid-write leaves the previous checkpoint intact. """
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Iterator, Optional, Tuple
+
+from s1.compression import ReadAheadS1Reader, S1Reader
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+@dataclass
+class Checkpoint:
+    # Byte offset of the first line of the first encounter not yet handed on
+    # (in the decompressed data for compressed files)
+    offset: int = 0
+    total_lines: int = 0
+    total_sets: int = 0
+    rejected_lines: int = 0
+    dropped_sets: int = 0
+    # Set once every encounter of the file has been handed on
+    complete: bool = False
+    # Of the S1 file, to tell when the checkpoint no longer applies
+    size: int = 0
+    mtime_ns: int = 0
+
+    @classmethod
+    def load(cls, state_path: str) -> Optional["Checkpoint"]:
+        """ The checkpoint saved at `state_path`, None if there is none """
+        try:
+            with open(state_path) as fobj:
+                return cls(**json.load(fobj))
+        except FileNotFoundError:
+            return None
+
+    def save(self, state_path: str) -> None:
+        temporary = state_path + ".tmp"
+        with open(temporary, "w") as fobj:
+            json.dump(asdict(self), fobj)
+            fobj.flush()
+            os.fsync(fobj.fileno())
+        os.replace(temporary, state_path)
+
+    def matches(self, path: str) -> bool:
+        """ Whether the S1 file is still the one the checkpoint was taken of """
+        stat = os.stat(path)
+        return (self.size, self.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+
+
+def iter_raw_lines_from(
+    reader: S1Reader, offset: int
+) -> Iterator[Tuple[int, bytes]]:
+    """ The lines of `reader` starting at `offset`, which has to be the start
+    of a line
+
+    Memory-mapped files are read from `offset` directly; compressed files
+    can't seek, so their earlier lines are decompressed and skipped. """
+    if not isinstance(reader, ReadAheadS1Reader):
+        yield from reader.iter_raw_lines(offset)
+        return
+    for line_offset, line in reader.iter_raw_lines():
+        if line_offset >= offset:
+            yield line_offset, line
@@ -0,0 +1,378 @@
+""" The `s1` command line tool
+
+    s1 validate data.s1.gz [--fast] [--max-errors N]
+    s1 parse data.s1 [-o out.ndjson]
+    s1 convert data.s1 out_dir/ [--format parquet]
+    s1 stats data.s1
+    s1 diff old.s1 new.s1 [-o changes.ndjson]
+
+Every subcommand streams its input, detects compressed files (see
+`s1.compression`), and takes `--workers`, `--batch-size`, `--encoding` and
+`--profile`. With more than one worker an uncompressed file is cut into
+ranges that are handled by a pool of processes; compressed files are always
+read by a single process, since they can't be split. `--profile` runs in one
+process and prints the seconds spent in each stage to stderr. `diff` takes
+two files and writes a JSON line per added, removed or changed encounter
+(see `s1.diff`). """
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from s1.compression import detect_compression, open_s1
+from s1.deadletter import DeadLetter
+from s1.exceptions import describe_error
+from s1.metrics import ParserMetrics, Snapshot
+from s1.parsers import S1Parser
+from s1.parsers.columnar import ColumnarS1Parser
+from s1.parsers.parallel import ByteRange, ParallelS1Parser, map_byte_ranges
+from s1.reader import MappedS1Reader
+from s1.records.base import LAZY_RECORDS, RECORD_MODES
+from s1.validators import S1Validator, ValidationReport
+
+COLUMNAR_FORMATS = ("parquet",)
+
+
+class StageTimer:
+    """ Seconds spent per stage, for `--profile` """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.started = time.perf_counter()
+
+    def timed(self, stage: str, items: Iterable[Any]) -> Iterator[Any]:
+        """ Yield from `items`, counting the time spent producing them """
+        if not self.enabled:
+            yield from items
+            return
+        iterator = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.seconds[stage] += time.perf_counter() - started
+                return
+            self.seconds[stage] += time.perf_counter() - started
+            yield item
+
+    def add(self, stage: str, started: float) -> None:
+        if self.enabled:
+            self.seconds[stage] += time.perf_counter() - started
+
+    def report(self, metrics: Optional[ParserMetrics] = None) -> None:
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.started
+        print(f"{'stage':<24}{'seconds':>10}{'share':>8}", file=sys.stderr)
+        stages: List[Tuple[str, float]] = list(self.seconds.items())
+        if metrics is not None:
+            # Parser stages happen within the time counted for reading lines
+            stages += [
+                (f"  {stage}", seconds)
+                for stage, seconds in metrics.stage_seconds.items()
+            ]
+        for stage, seconds in stages + [("total", total)]:
+            share = seconds / total if total else 0.0
+            print(f"{stage:<24}{seconds:>10.3f}{share:>8.1%}", file=sys.stderr)
+
+
+def use_workers(args: argparse.Namespace) -> bool:
+    if args.workers <= 1:
+        return False
+    if args.profile:
+        print("s1: --profile runs in a single process", file=sys.stderr)
+        return False
+    if detect_compression(args.path) is not None:
+        print(
+            "s1: compressed files are read by a single process",
+            file=sys.stderr,
+        )
+        return False
+    return True
+
+
+def print_validation_report(report: ValidationReport) -> None:
+    for error in report.errors:
+        print(
+            f"line {error.line_number} (offset {error.offset}): {error.kind}"
+            f" {error.record_id!r} {error.message}".rstrip()
+        )
+    summary = {
+        "total_lines": report.total_lines,
+        "record_counts": dict(report.record_counts),
+        "error_counts": dict(report.error_counts),
+        "is_valid": report.is_valid,
+    }
+    print(json.dumps(summary))
+
+
+def run_validate(args: argparse.Namespace) -> int:
+    timer = StageTimer(args.profile)
+    validator = S1Validator(fast=args.fast)
+    started = time.perf_counter()
+    report = validator.validate_file(
+        args.path,
+        args.encoding,
+        args.max_errors,
+        workers=args.workers if use_workers(args) else None,
+    )
+    timer.add("validate", started)
+    print_validation_report(report)
+    timer.report()
+    return 0 if report.is_valid else 1
+
+
+def run_parse(args: argparse.Namespace) -> int:
+    from s1.writers import NDJSONWriter
+
+    timer = StageTimer(args.profile)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with NDJSONWriter(out) as writer:
+            if use_workers(args):
+                parallel = ParallelS1Parser(
+                    args.workers, encoding=args.encoding
+                )
+                # Workers hand back their encounters already serialized
+                for chunk in parallel.iter_ndjson(args.path):
+                    out.write(chunk)
+                return 0
+
+            metrics = ParserMetrics(timing=True) if args.profile else None
+            parser = S1Parser(
+                batch_size=args.batch_size,
+                record_mode=args.record_mode,
+                metrics=metrics,
+            )
+            with open_s1(args.path, args.encoding) as lines:
+                batches = parser.iter_batches(lines)
+                for batch in timer.timed("read and parse", batches):
+                    started = time.perf_counter()
+                    writer.write_all(batch)
+                    timer.add("write", started)
+            timer.report(metrics)
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+def run_convert(args: argparse.Namespace) -> int:
+    from s1.writers.parquet import ParquetWriter
+
+    timer = StageTimer(args.profile)
+    workers = use_workers(args)
+    if workers and args.typed:
+        print("s1: --typed runs in a single process", file=sys.stderr)
+        workers = False
+    with ParquetWriter(args.output) as writer:
+        if workers:
+            parallel = ParallelS1Parser(args.workers, encoding=args.encoding)
+            for tables in parallel.iter_tables(args.path, args.batch_size):
+                writer.write_tables(tables)
+            total_sets = parallel.total_sets
+        else:
+            parser = ColumnarS1Parser(
+                batch_size=args.batch_size, typed=args.typed
+            )
+            with open_s1(args.path, args.encoding) as lines:
+                batches = parser.iter_batches(lines)
+                for batch in timer.timed("read and parse", batches):
+                    started = time.perf_counter()
+                    writer.write(batch)
+                    timer.add("write", started)
+            for bad in parser.bad_values:
+                print(
+                    f"s1: encounter {bad.encounter}: {bad.table} "
+                    f"{bad.field_name} {bad.value!r} set to null",
+                    file=sys.stderr,
+                )
+            if parser.total_bad_values:
+                print(
+                    f"s1: {parser.total_bad_values} values set to null",
+                    file=sys.stderr,
+                )
+            total_sets = parser.total_sets
+    print(
+        f"s1: wrote {total_sets} encounters to {args.output}", file=sys.stderr
+    )
+    timer.report()
+    return 0
+
+
+def collect_stats(
+    path: str, byte_range: ByteRange, encoding: str
+) -> Tuple[ParserMetrics, int]:
+    """ Metrics for one range of a file, run within a worker process """
+    metrics = ParserMetrics(encoding=encoding)
+    parser = S1Parser(
+        record_mode=LAZY_RECORDS, metrics=metrics, dead_letters=ignore
+    )
+    with MappedS1Reader(path, encoding) as reader:
+        for _, raw_line in reader.iter_raw_lines(*byte_range):
+            parser.add_raw_line(raw_line, encoding)
+    parser.take_current_encounter()
+    return metrics, parser.total_sets
+
+
+def ignore(dead_letter: DeadLetter) -> None:
+    """ Bad lines are counted by the metrics already """
+
+
+def run_stats(args: argparse.Namespace) -> int:
+    timer = StageTimer(args.profile)
+    metrics = ParserMetrics(timing=args.profile, encoding=args.encoding)
+    total_sets = 0
+    if use_workers(args):
+        for range_metrics, range_sets in map_byte_ranges(
+            collect_stats,
+            args.path,
+            workers=args.workers,
+            encoding=args.encoding,
+        ):
+            metrics.merge(range_metrics)
+            total_sets += range_sets
+    else:
+        # Lazy records, since nothing but the counts is kept
+        parser = S1Parser(
+            record_mode=LAZY_RECORDS, metrics=metrics, dead_letters=ignore
+        )
+        encounters = parser.iter_file(args.path, args.encoding)
+        for _ in timer.timed("read and parse", encounters):
+            pass
+        total_sets = parser.total_sets
+    stats: Snapshot = metrics.snapshot()
+    stats["total_sets"] = total_sets
+    if not args.profile:
+        del stats["stage_seconds"]
+    print(json.dumps(stats, indent=2, sort_keys=True))
+    timer.report(metrics)
+    return 0
+
+
+def run_diff(args: argparse.Namespace) -> int:
+    from s1.diff import EncounterDiff
+    from s1.writers.ndjson import json_encoder
+
+    encode = json_encoder()
+    diff = EncounterDiff(args.memory_mb * 1024 * 1024, args.tmpdir)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        changes = diff.iter_file_changes(args.old, args.new, args.encoding)
+        for change in changes:
+            provider_id, patient_control_number = change.key
+            row = {
+                "change": change.kind,
+                "provider_id": provider_id,
+                "patient_control_number": patient_control_number,
+                "encounter": change.encounter.as_dict(),
+            }
+            out.write(encode(row) + b"\n")
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+    print(json.dumps(diff.counts), file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("path", help="S1 file, optionally compressed")
+    common.add_argument("--encoding", default="utf-8")
+    common.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes to use for uncompressed files (default: 1)",
+    )
+    common.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="encounters held in memory at once (default: 1000)",
+    )
+    common.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each stage to stderr",
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="s1", description="Validate, parse and convert S1 files"
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    validate = commands.add_parser(
+        "validate", parents=[common], help="check every line of a file"
+    )
+    validate.add_argument(
+        "--fast", action="store_true", help="only count separators"
+    )
+    validate.add_argument(
+        "--max-errors",
+        type=int,
+        default=100,
+        help="errors to list (default: 100)",
+    )
+    validate.set_defaults(run=run_validate)
+
+    parse = commands.add_parser(
+        "parse", parents=[common], help="write encounters as NDJSON"
+    )
+    parse.add_argument("-o", "--output", help="output file (default: stdout)")
+    parse.add_argument(
+        "--record-mode", choices=RECORD_MODES, default=RECORD_MODES[0]
+    )
+    parse.set_defaults(run=run_parse)
+
+    convert = commands.add_parser(
+        "convert", parents=[common], help="write one columnar file per table"
+    )
+    convert.add_argument("output", help="output directory")
+    convert.add_argument(
+        "--format", choices=COLUMNAR_FORMATS, default=COLUMNAR_FORMATS[0]
+    )
+    convert.add_argument(
+        "--typed",
+        action="store_true",
+        help="convert dates, amounts and counts (default: keep strings)",
+    )
+    convert.set_defaults(run=run_convert)
+
+    stats = commands.add_parser(
+        "stats", parents=[common], help="count lines, bytes and errors"
+    )
+    stats.set_defaults(run=run_stats)
+
+    diff = commands.add_parser(
+        "diff", help="list the encounters that changed between two files"
+    )
+    diff.add_argument("old", help="earlier S1 file, optionally compressed")
+    diff.add_argument("new", help="later S1 file, optionally compressed")
+    diff.add_argument("-o", "--output", help="output file (default: stdout)")
+    diff.add_argument("--encoding", default="utf-8")
+    diff.add_argument(
+        "--memory-mb",
+        type=int,
+        default=256,
+        help="memory for sorting both files by key (default: 256)",
+    )
+    diff.add_argument("--tmpdir", help="where sorted runs are spilled")
+    diff.set_defaults(run=run_diff)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return int(args.run(args))
+    except (ValueError, OSError, ImportError) as exc:
+        print(f"s1: error: {describe_error(exc)}", file=sys.stderr)
+        return 2
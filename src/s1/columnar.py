@@ -0,0 +1,122 @@
+""" Column-oriented storage for parsed S1 lines
+
+Instead of one dict per record, lines of a RecordSpec are accumulated as
+columns: one list of values per field name. A spec with a RepeatedBlock also
+gets a child table, where every block entry is a row pointing back at the
+encounter and the parent row it came from. """
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from s1.records import RecordSpec
+
+# Index columns added next to the spec's fields
+ENCOUNTER_INDEX = "encounter_index"
+ROW_INDEX = "row_index"
+INDEX_COLUMNS = (ENCOUNTER_INDEX, ROW_INDEX)
+
+# Child tables are named after their parent and the repeated block's key
+CHILD_SEP = "."
+
+
+def child_table_name(spec: RecordSpec) -> str:
+    if not spec.repeated_block:
+        raise ValueError(f"Spec {spec.record_id} has no repeated block")
+    return f"{spec.record_id}{CHILD_SEP}{spec.repeated_block.key_name}"
+
+
+@dataclass
+class ColumnBatch:
+    """ One table's worth of columns, all of equal length """
+
+    name: str
+    columns: Dict[str, List[Any]]
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.columns[ENCOUNTER_INDEX])
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """ Convert every column to a numpy array (requires numpy) """
+        import numpy
+
+        return {
+            name: numpy.asarray(column) for name, column in self.columns.items()
+        }
+
+    def arrow_schema(self) -> Any:
+        """ The batch's `pyarrow.Schema`: int64 index columns, string fields
+        and whatever type columns already converted to arrays have (see
+        `s1.typed`), so that tables of every batch agree even when one of
+        them is empty (requires pyarrow) """
+        import pyarrow
+
+        fields = []
+        for name, column in self.columns.items():
+            if isinstance(column, pyarrow.Array):
+                arrow_type = column.type
+            elif name in INDEX_COLUMNS:
+                arrow_type = pyarrow.int64()
+            else:
+                arrow_type = pyarrow.string()
+            fields.append(pyarrow.field(name, arrow_type))
+        return pyarrow.schema(fields)
+
+    def to_arrow(self) -> Any:
+        """ Convert the batch to a `pyarrow.Table` (requires pyarrow) """
+        import pyarrow
+
+        return pyarrow.table(self.columns, schema=self.arrow_schema())
+
+
+class ColumnBuilder:
+    """ Accumulates the already-split lines of a single RecordSpec
+
+    Static fields are kept as rows of values and transposed into columns with
+    `zip` when the batch is built. Repeated block values go straight into their
+    columns using fixed-stride slices of the line, so no per-entry objects are
+    ever created. """
+
+    def __init__(self, spec: RecordSpec):
+        self.spec = spec
+        self.rows: List[List[str]] = []
+        self.encounter_index: List[int] = []
+        block = spec.repeated_block
+        self.block_columns: List[List[str]] = (
+            [[] for _ in block.fields] if block else []
+        )
+        self.block_encounter_index: List[int] = []
+        self.block_row_index: List[int] = []
+
+    def append(self, fields: List[str], encounter_index: int) -> None:
+        spec = self.spec
+        n_static = spec.num_static_fields
+        row_index = len(self.rows)
+        self.encounter_index.append(encounter_index)
+        if not spec.repeated_block:
+            self.rows.append(fields)
+            return
+
+        self.rows.append(fields[:n_static])
+        stride = spec.num_repeat_fields
+        for offset, column in enumerate(self.block_columns):
+            column.extend(fields[n_static + offset :: stride])
+        n_entries = (len(fields) - n_static) // stride
+        self.block_encounter_index.extend([encounter_index] * n_entries)
+        self.block_row_index.extend([row_index] * n_entries)
+
+    def build(self) -> List[ColumnBatch]:
+        """ The spec's table, followed by its child table if it has one """
+        spec = self.spec
+        columns: Dict[str, List[Any]] = {ENCOUNTER_INDEX: self.encounter_index}
+        columns.update(
+            zip(spec.all_static_field_names, map(list, zip(*self.rows)))
+        )
+        batches = [ColumnBatch(spec.record_id, columns)]
+        if spec.repeated_block:
+            child: Dict[str, List[Any]] = {
+                ENCOUNTER_INDEX: self.block_encounter_index,
+                ROW_INDEX: self.block_row_index,
+            }
+            child.update(zip(spec.repeated_block.fields, self.block_columns))
+            batches.append(ColumnBatch(child_table_name(spec), child))
+        return batches
@@ -0,0 +1,187 @@
+""" Read compressed S1 files, decompressing ahead of the parser
+
+`open_s1` looks at a file's first bytes to tell gzip, bz2, xz and zstd apart
+(zstd needs the `zstandard` package, `pip install s1-python[zstd]`) and hands
+back a reader of its lines. Uncompressed files get a `MappedS1Reader`.
+Compressed ones get a `ReadAheadS1Reader`: a background thread decompresses
+the file into a bounded queue of chunks while the caller splits and parses
+lines. zlib, bz2, lzma and zstandard all release the GIL while they work, so
+decompression runs alongside parsing rather than in turns with it.
+
+Either reader yields decoded lines (without line endings) when iterated, so it
+can feed `S1Parser` and `S1Validator` directly::
+
+    with open_s1("data.s1.gz") as lines:
+        for encounter in S1Parser().iter_encounters(lines):
+            ...
+"""
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+from s1.reader import MappedS1Reader, RawLineReader
+from s1.records import RecordSpec
+from s1.records.registry import default_registry
+
+GZIP = "gzip"
+BZ2 = "bz2"
+XZ = "xz"
+ZSTD = "zstd"
+COMPRESSIONS = (GZIP, BZ2, XZ, ZSTD)
+
+MAGIC_NUMBERS = {
+    GZIP: b"\x1f\x8b",
+    BZ2: b"BZh",
+    XZ: b"\xfd7zXZ\x00",
+    ZSTD: b"\x28\xb5\x2f\xfd",
+}
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_READ_AHEAD = 8
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """ The compression a file's magic number belongs to, None if it has none
+    we know """
+    with open(path, "rb") as fobj:
+        head = fobj.read(max(len(magic) for magic in MAGIC_NUMBERS.values()))
+    for compression, magic in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_decompressed(path: str, compression: str) -> BinaryIO:
+    """ Open a compressed file as a binary stream of its decompressed bytes """
+    if compression == GZIP:
+        return gzip.open(path, "rb")  # type: ignore
+    if compression == BZ2:
+        return bz2.open(path, "rb")  # type: ignore
+    if compression == XZ:
+        return lzma.open(path, "rb")  # type: ignore
+    if compression == ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "Reading zstd files requires zstandard, "
+                "`pip install s1-python[zstd]`"
+            )
+        return zstandard.open(path, "rb")  # type: ignore
+    raise ValueError(f"compression must be one of {COMPRESSIONS}")
+
+
+class ReadAheadS1Reader(RawLineReader):
+    """ Reads the lines of a compressed S1 file, decompressed on a thread
+
+    At most `read_ahead` chunks of `chunk_size` decompressed bytes wait in the
+    queue, which bounds memory when the parser is the slower side. Offsets
+    are positions in the decompressed stream. The file can be read once. """
+
+    def __init__(
+        self,
+        path: str,
+        encoding: str = "utf-8",
+        compression: Optional[str] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+        registry=None,
+    ):
+        self.path = path
+        self.encoding = encoding
+        self.compression = compression or detect_compression(path)
+        if self.compression is None:
+            raise ValueError(f"{path} isn't a compressed file")
+        self.chunk_size = chunk_size
+        self.registry = default_registry if registry is None else registry
+        self._specs: Dict[bytes, RecordSpec] = {}
+        self._chunks: "queue.Queue[Union[bytes, BaseException]]" = queue.Queue(
+            maxsize=read_ahead
+        )
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "ReadAheadS1Reader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            # Make room in case the thread is waiting on a full queue
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread.join()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError("A ReadAheadS1Reader can only be read once")
+        self._thread = threading.Thread(
+            target=self.decompress, name=f"s1-read-ahead:{self.path}"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def decompress(self) -> None:
+        """ Runs on the background thread, filling the queue """
+        try:
+            with open_decompressed(self.path, str(self.compression)) as fobj:
+                while not self._stopping.is_set():
+                    chunk = fobj.read(self.chunk_size)
+                    # The empty chunk at the end of the stream is put too
+                    self.put(chunk)
+                    if not chunk:
+                        return
+        except BaseException as exc:
+            self.put(exc)
+
+    def put(self, item: Any) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        self.start()
+        while True:
+            chunk = self._chunks.get()
+            if isinstance(chunk, BaseException):
+                raise chunk
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_raw_lines(self) -> Iterator[Tuple[int, bytes]]:
+        offset = 0
+        remainder = b""
+        for chunk in self.iter_chunks():
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                yield offset, line.rstrip(b"\r")
+                offset += len(line) + 1
+        if remainder:
+            yield offset, remainder.rstrip(b"\r")
+
+
+S1Reader = Union[MappedS1Reader, ReadAheadS1Reader]
+
+
+def open_s1(path: str, encoding: str = "utf-8", **kwargs) -> S1Reader:
+    """ A reader for the lines of an S1 file, compressed or not
+
+    Keyword arguments go to `ReadAheadS1Reader` for compressed files. """
+    compression = detect_compression(path)
+    if compression is None:
+        return MappedS1Reader(path, encoding, kwargs.get("registry"))
+    return ReadAheadS1Reader(path, encoding, compression, **kwargs)
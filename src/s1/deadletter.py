@@ -0,0 +1,43 @@
+""" Dead letters: lines a tolerant parser set aside instead of raising
+
+A sink is any callable taking a `DeadLetter`, so `list.append` collects them in
+memory and `DeadLetterWriter` streams them to a file as JSON lines.
+
+What happens to the encounter a bad line belonged to is up to the policy:
+
+* `partial` keeps the encounter without the bad line
+* `drop` discards the whole encounter
+* `flag` keeps the encounter without the bad line and sets its `flagged`
+"""
+import json
+from dataclasses import asdict, dataclass
+from typing import IO, Callable
+
+KEEP_PARTIAL = "partial"
+DROP = "drop"
+FLAG = "flag"
+ENCOUNTER_POLICIES = (KEEP_PARTIAL, DROP, FLAG)
+
+
+@dataclass
+class DeadLetter:
+    line_number: int
+    # Offset of the line's start, counted in characters of the lines fed,
+    # which equals the byte offset for the single-byte encodings S1 uses
+    offset: int
+    record_id: str
+    reason: str
+    line: str
+
+
+DeadLetterSink = Callable[[DeadLetter], None]
+
+
+class DeadLetterWriter:
+    """ A sink writing one JSON object per dead letter to a text file """
+
+    def __init__(self, fobj: IO[str]):
+        self.fobj = fobj
+
+    def __call__(self, dead_letter: DeadLetter) -> None:
+        self.fobj.write(json.dumps(asdict(dead_letter)) + "\n")
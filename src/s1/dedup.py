@@ -0,0 +1,211 @@
+""" Drop encounters already seen, across files and across runs
+
+A `Deduplicator` keeps an on-disk sqlite index from each encounter key
+(provider id, patient control number) to the fingerprint of the version it
+last kept (see `s1.fingerprint`). Lookups are primary key queries, so the
+index can grow to hundreds of millions of keys while only sqlite's page cache
+is held in memory. The index persists between runs, so next month's files
+are deduplicated against everything seen before.
+
+The policy decides which version of a key is kept:
+
+* `first` keeps a key's first encounter and drops any later one
+* `changed` keeps an encounter when its key is new or its content differs
+  from the version kept before, which then becomes the one compared against
+* `last` keeps only the final encounter of each key across the files given.
+  That can only be known at the end, so the files are read twice: first to
+  find where each key's last encounter is, then to hand those encounters on.
+"""
+import sqlite3
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from s1.compression import open_s1
+from s1.deadletter import DeadLetter
+from s1.fingerprint import EncounterKey, encounter_key, fingerprint
+from s1.parsers import S1Parser
+from s1.records import RecordSet
+from s1.records.base import LAZY_RECORDS
+
+KEEP_FIRST = "first"
+KEEP_LAST = "last"
+KEEP_CHANGED = "changed"
+DEDUP_POLICIES = (KEEP_FIRST, KEEP_LAST, KEEP_CHANGED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS encounters (
+    provider_id TEXT NOT NULL,
+    patient_control_number TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (provider_id, patient_control_number)
+) WITHOUT ROWID;
+"""
+
+# Where each key's last encounter is, for the `last` policy
+LAST_SEEN_SCHEMA = """
+CREATE TEMP TABLE last_seen (
+    provider_id TEXT NOT NULL,
+    patient_control_number TEXT NOT NULL,
+    file_index INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (provider_id, patient_control_number)
+) WITHOUT ROWID;
+"""
+
+# Rows written between commits
+COMMIT_EVERY = 10000
+
+
+def skip(dead_letter: DeadLetter) -> None:
+    """ Bad lines are reported by the second pass, if at all """
+
+
+class Deduplicator:
+    def __init__(self, index_path: str, policy: str = KEEP_FIRST):
+        if policy not in DEDUP_POLICIES:
+            raise ValueError(f"policy must be one of {DEDUP_POLICIES}")
+        self.index_path = index_path
+        self.policy = policy
+        self.total_sets: int = 0
+        self.kept_sets: int = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pending: int = 0
+
+    def __enter__(self) -> "Deduplicator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.index_path)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def dropped_sets(self) -> int:
+        return self.total_sets - self.kept_sets
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM encounters"
+        ).fetchone()
+        return int(count)
+
+    def stored_fingerprint(self, key: EncounterKey) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT fingerprint FROM encounters "
+            "WHERE provider_id = ? AND patient_control_number = ?",
+            key,
+        ).fetchone()
+        return None if row is None else str(row[0])
+
+    def store(self, key: EncounterKey, content: str) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO encounters VALUES (?, ?, ?)",
+            key + (content,),
+        )
+        self.written()
+
+    def written(self) -> None:
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.connection.commit()
+            self._pending = 0
+
+    def keep(self, encounter: RecordSet) -> bool:
+        """ Whether to hand on an encounter under the `first` or `changed`
+        policy, recording it in the index if so """
+        key = encounter_key(encounter)
+        stored = self.stored_fingerprint(key)
+        if self.policy == KEEP_FIRST:
+            if stored is not None:
+                return False
+            self.store(key, fingerprint(encounter))
+            return True
+        content = fingerprint(encounter)
+        if stored == content:
+            return False
+        self.store(key, content)
+        return True
+
+    def filter(self, encounters: Iterable[RecordSet]) -> Iterator[RecordSet]:
+        """ Yield the encounters to keep, in order (`first` and `changed`
+        policies only; `last` needs `iter_files`) """
+        if self.policy == KEEP_LAST:
+            raise ValueError(
+                "The 'last' policy needs every file, see iter_files"
+            )
+        for encounter in encounters:
+            self.total_sets += 1
+            if self.keep(encounter):
+                self.kept_sets += 1
+                yield encounter
+        self.connection.commit()
+
+    def iter_files(
+        self,
+        paths: List[str],
+        encoding: str = "utf-8",
+        parser_factory: Callable[[], S1Parser] = S1Parser,
+    ) -> Iterator[RecordSet]:
+        """ Yield the encounters to keep from each file in turn, which may be
+        compressed, parsing with parsers made by `parser_factory` """
+        if self.policy != KEEP_LAST:
+            for path in paths:
+                yield from self.filter(
+                    parser_factory().iter_file(path, encoding)
+                )
+            return
+
+        self.find_last_seen(paths, encoding)
+        for file_index, path in enumerate(paths):
+            parser = parser_factory()
+            for encounter in parser.iter_file(path, encoding):
+                self.total_sets += 1
+                # Dropped encounters still count, as they do in the first pass
+                position = parser.total_sets + parser.dropped_sets - 1
+                key = encounter_key(encounter)
+                if self.last_seen(key) != (file_index, position):
+                    continue
+                self.store(key, fingerprint(encounter))
+                self.kept_sets += 1
+                yield encounter
+        self.connection.commit()
+        self.connection.execute("DROP TABLE temp.last_seen")
+
+    def find_last_seen(self, paths: List[str], encoding: str) -> None:
+        """ Record where each key's last encounter is
+
+        Lazy records are enough to read the keys, and bad lines are skipped
+        rather than raised, so every encounter a parser could start counts
+        towards the positions. """
+        connection = self.connection
+        connection.executescript(LAST_SEEN_SCHEMA)
+        for file_index, path in enumerate(paths):
+            parser = S1Parser(record_mode=LAZY_RECORDS, dead_letters=skip)
+            with open_s1(path, encoding) as lines:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO temp.last_seen VALUES (?, ?, ?, ?)",
+                    (
+                        encounter_key(encounter) + (file_index, position)
+                        for position, encounter in enumerate(
+                            parser.iter_encounters(lines)
+                        )
+                    ),
+                )
+
+    def last_seen(self, key: EncounterKey) -> Optional[Tuple[int, int]]:
+        row = self.connection.execute(
+            "SELECT file_index, position FROM temp.last_seen "
+            "WHERE provider_id = ? AND patient_control_number = ?",
+            key,
+        ).fetchone()
+        return None if row is None else (int(row[0]), int(row[1]))
@@ -0,0 +1,144 @@
+""" The encounters added, removed and changed between two S1 files
+
+Both files are grouped by encounter key with an external sort (see
+`s1.grouping`), so each comes out as a stream of encounters in key order, and
+the two streams are merge-joined: a key only in the new file was added, one
+only in the old file was removed, and one in both changed when the
+fingerprints of its two versions (see `s1.fingerprint`) differ. Memory is
+bounded by the sort's budget plus the two encounters being compared, however
+large the files are.
+
+Encounters are matched on key, not on position, so a resubmission that
+reorders its encounters only reports those whose content changed. Lines of
+one key are grouped together, so a key repeated within a file is compared as
+a single encounter holding all of its records. """
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from s1.compression import open_s1
+from s1.fingerprint import EncounterKey, encounter_key, fingerprint
+from s1.grouping import DEFAULT_MEMORY_BUDGET
+from s1.parsers import S1Parser
+from s1.records import RecordSet
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+CHANGE_KINDS = (ADDED, REMOVED, CHANGED, UNCHANGED)
+
+
+@dataclass
+class EncounterChange:
+    kind: str
+    key: EncounterKey
+    # None for an added encounter
+    old: Optional[RecordSet] = None
+    # None for a removed encounter
+    new: Optional[RecordSet] = None
+
+    @property
+    def encounter(self) -> RecordSet:
+        """ The new version, or the old one for a removed encounter """
+        found = self.old if self.new is None else self.new
+        assert found is not None
+        return found
+
+
+class EncounterDiff:
+    """ Compares two S1 files encounter by encounter
+
+        diff = EncounterDiff()
+        for change in diff.iter_file_changes("january.s1", "february.s1"):
+            if change.kind != REMOVED:
+                reprocess(change.new)
+
+    Unchanged encounters are only counted, unless `include_unchanged` is set.
+    The two files share the `memory_budget` of their sorts, which spill to
+    `tmpdir`. """
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        tmpdir: Optional[str] = None,
+        include_unchanged: bool = False,
+        parser_factory: Callable[[], S1Parser] = S1Parser,
+    ):
+        self.memory_budget = memory_budget
+        self.tmpdir = tmpdir
+        self.include_unchanged = include_unchanged
+        self.parser_factory = parser_factory
+        self.counts: Dict[str, int] = dict.fromkeys(CHANGE_KINDS, 0)
+
+    def change(
+        self,
+        kind: str,
+        key: EncounterKey,
+        old: Optional[RecordSet] = None,
+        new: Optional[RecordSet] = None,
+    ) -> Optional[EncounterChange]:
+        self.counts[kind] += 1
+        if kind == UNCHANGED and not self.include_unchanged:
+            return None
+        return EncounterChange(kind, key, old, new)
+
+    def compare(
+        self, key: EncounterKey, old: RecordSet, new: RecordSet
+    ) -> Optional[EncounterChange]:
+        if fingerprint(old) == fingerprint(new):
+            return self.change(UNCHANGED, key, old, new)
+        return self.change(CHANGED, key, old, new)
+
+    def iter_changes(
+        self, old: Iterable[RecordSet], new: Iterable[RecordSet]
+    ) -> Iterator[EncounterChange]:
+        """ Merge-join two streams of encounters, each in key order with
+        every key once, as `S1Parser.iter_grouped` yields them """
+        old_encounters = iter(old)
+        new_encounters = iter(new)
+        old_encounter = next(old_encounters, None)
+        new_encounter = next(new_encounters, None)
+        while old_encounter is not None or new_encounter is not None:
+            change: Optional[EncounterChange]
+            if new_encounter is None:
+                assert old_encounter is not None
+                change = self.change(
+                    REMOVED, encounter_key(old_encounter), old=old_encounter
+                )
+                old_encounter = next(old_encounters, None)
+            elif old_encounter is None:
+                change = self.change(
+                    ADDED, encounter_key(new_encounter), new=new_encounter
+                )
+                new_encounter = next(new_encounters, None)
+            else:
+                old_key = encounter_key(old_encounter)
+                new_key = encounter_key(new_encounter)
+                if old_key < new_key:
+                    change = self.change(REMOVED, old_key, old=old_encounter)
+                    old_encounter = next(old_encounters, None)
+                elif new_key < old_key:
+                    change = self.change(ADDED, new_key, new=new_encounter)
+                    new_encounter = next(new_encounters, None)
+                else:
+                    change = self.compare(old_key, old_encounter, new_encounter)
+                    old_encounter = next(old_encounters, None)
+                    new_encounter = next(new_encounters, None)
+            if change is not None:
+                yield change
+
+    def iter_grouped(self, path: str, encoding: str) -> Iterator[RecordSet]:
+        with open_s1(path, encoding) as lines:
+            yield from self.parser_factory().iter_grouped(
+                lines, self.memory_budget // 2, self.tmpdir
+            )
+
+    def iter_file_changes(
+        self, old_path: str, new_path: str, encoding: str = "utf-8"
+    ) -> Iterator[EncounterChange]:
+        """ The changes from the file at `old_path` to the one at `new_path`,
+        either of which may be compressed, in key order """
+        yield from self.iter_changes(
+            self.iter_grouped(old_path, encoding),
+            self.iter_grouped(new_path, encoding),
+        )
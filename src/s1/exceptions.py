@@ -12,3 +12,25 @@ class InvalidFieldLength(ValueError):
 
 class InvalidS1Line(ValueError):
     pass
+
+
+def locate_error(exc: BaseException, line_number: int, record_id: str) -> None:
+    """ Note on a parse error the line it happened on, keeping its type so
+    it's caught as before; the attributes survive pickling, so an error from a
+    worker process still says where it happened """
+    exc.line_number = line_number  # type: ignore
+    exc.record_id = record_id  # type: ignore
+
+
+def describe_error(exc: BaseException) -> str:
+    """ The error's type and message, and its line and record id if known """
+    description = type(exc).__name__
+    line_number = getattr(exc, "line_number", None)
+    if line_number is not None:
+        description += (
+            f" at line {line_number}"
+            f" (record id {getattr(exc, 'record_id', '')!r})"
+        )
+    if str(exc):
+        description += f": {exc}"
+    return description
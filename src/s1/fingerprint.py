@@ -0,0 +1,54 @@
+""" Keys and content fingerprints of encounters
+
+An encounter is identified by the provider id and patient control number its
+records carry, and summarized by a fingerprint: a hash of its records in a
+canonical form (sorted keys, fixed separators), so the same content gives the
+same fingerprint whichever record mode it was parsed in, on any machine. """
+import hashlib
+import json
+from typing import Any, Dict, Tuple
+
+from s1.records import RecordSet
+from s1.records.base import Record
+from s1.specifications.tha import PCN, PROVIDER_ID
+
+EncounterKey = Tuple[str, str]
+
+# Bytes of blake2b digest, hex encoded into twice as many characters
+DIGEST_SIZE = 16
+
+
+def as_dict(record: Record) -> Dict[str, Any]:
+    return record if isinstance(record, dict) else record.as_dict()
+
+
+def encounter_key(
+    encounter: RecordSet,
+    provider_field: str = PROVIDER_ID,
+    pcn_field: str = PCN,
+) -> EncounterKey:
+    """ The (provider id, patient control number) of an encounter's first
+    record """
+    if encounter.is_empty:
+        raise ValueError("An empty encounter has no key")
+    record = as_dict(encounter.records[0])
+    try:
+        return (str(record[provider_field]), str(record[pcn_field]))
+    except KeyError:
+        raise ValueError(
+            f"Record '{record['record_id']}' has no {provider_field} or "
+            f"{pcn_field} field"
+        )
+
+
+def fingerprint(encounter: RecordSet) -> str:
+    """ A stable hash of an encounter's records, in record order """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for record in encounter.records:
+        digest.update(
+            json.dumps(
+                as_dict(record), sort_keys=True, separators=(",", ":")
+            ).encode()
+        )
+        digest.update(b"\n")
+    return digest.hexdigest()
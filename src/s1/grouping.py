@@ -0,0 +1,213 @@
+""" Group records into encounters by key rather than by position
+
+Some files don't keep an encounter's lines together: records are interleaved
+with other encounters', or a PCN's 400s turn up far from its header. Grouping
+on (provider id, patient control number) instead of on `denotes_new_set` lines
+puts those encounters back together, at the cost of sorting the file.
+
+Lines are tagged with their key and buffered until an estimate of their size
+passes the memory budget; the buffer is then sorted and spilled to a
+temporary file as a sorted run. Once the input runs out the runs are merged,
+so every line of an encounter comes out together, header first and the rest
+in file order. Files that fit in the budget are sorted in memory without
+touching the disk. """
+import heapq
+import pickle
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from s1.exceptions import locate_error
+from s1.reader import RawLineReader
+from s1.records import RecordSpec
+from s1.records.base import SEP
+from s1.records.registry import spec_from_record_id
+from s1.parsing import line_record_id, record_id_from_line
+from s1.specifications.tha import PCN, PROVIDER_ID
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Roughly what a buffered entry costs on top of its line: the tuples, the two
+# key strings, the line number and the offset
+ENTRY_OVERHEAD = 360
+# Runs merged at once; more runs than this are merged in several passes
+MAX_MERGE_WIDTH = 64
+# Entries pickled together when writing a run
+SPILL_CHUNK = 4096
+
+# (provider id, patient control number, 0 for headers else 1, line number,
+# offset)
+SortKey = Tuple[str, str, int, int, int]
+Entry = Tuple[SortKey, str]
+# (line number, offset, line)
+NumberedLine = Tuple[int, int, str]
+# Called with a line whose key can't be read, its offset, the error and its
+# line number
+Reject = Callable[[str, int, Exception, int], Any]
+
+
+def numbered_lines(
+    lines: Iterable[str], reject: Optional[Reject] = None
+) -> Iterator[NumberedLine]:
+    """ Number the lines for the grouper, with the byte offsets a reader (see
+    `s1.reader.RawLineReader`) knows, or else running totals of the lines'
+    lengths, which are byte offsets for ASCII lines that keep their endings
+
+    A reader's lines that don't decode raise UnicodeDecodeError, unless
+    `reject` is given. """
+    if not isinstance(lines, RawLineReader):
+        offset = 0
+        for line_number, line in enumerate(lines, 1):
+            yield line_number, offset, line
+            offset += len(line)
+        return
+    encoding = lines.encoding
+    for line_number, (offset, raw_line) in enumerate(lines.iter_raw_lines(), 1):
+        try:
+            line = raw_line.decode(encoding)
+        except UnicodeDecodeError as exc:
+            line = raw_line.decode(encoding, errors="replace")
+            if reject is None:
+                locate_error(exc, line_number, line_record_id(line))
+                raise
+            reject(line, offset, exc, line_number)
+            continue
+        yield line_number, offset, line
+
+
+def write_run(entries: Iterable[Entry], tmpdir: Optional[str]) -> IO[bytes]:
+    run = tempfile.TemporaryFile(dir=tmpdir)
+    chunk: List[Entry] = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= SPILL_CHUNK:
+            pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+            chunk = []
+    if chunk:
+        pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run  # type: ignore
+
+
+def read_run(run: IO[bytes]) -> Iterator[Entry]:
+    with run:
+        while True:
+            try:
+                chunk = pickle.load(run)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class ExternalGrouper:
+    """ Sorts lines by encounter key, within `memory_budget` bytes
+
+    The budget covers the lines buffered before a spill, estimated from their
+    length; spilled runs go to `tmpdir` (the system default if None). """
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        tmpdir: Optional[str] = None,
+        key_fields: Tuple[str, str] = (PROVIDER_ID, PCN),
+    ):
+        self.memory_budget = memory_budget
+        self.tmpdir = tmpdir
+        self.key_fields = key_fields
+        self.runs: List[IO[bytes]] = []
+        # record id -> positions of the key fields and whether it's a header
+        self._key_positions: Dict[str, Tuple[int, int, int]] = {}
+
+    def key_positions(self, record_id: str) -> Tuple[int, int, int]:
+        positions = self._key_positions.get(record_id)
+        if positions is None:
+            spec: RecordSpec = spec_from_record_id(record_id)
+            try:
+                provider, pcn = (
+                    spec.field_positions[name] for name in self.key_fields
+                )
+            except KeyError:
+                raise ValueError(
+                    f"Record type '{record_id}' has no {self.key_fields} fields"
+                )
+            positions = (provider, pcn, 0 if spec.denotes_new_set else 1)
+            self._key_positions[record_id] = positions
+        return positions
+
+    def sort_key(self, line: str, line_number: int, offset: int) -> SortKey:
+        record_id = record_id_from_line(line)
+        try:
+            provider, pcn, rank = self.key_positions(record_id)
+        except KeyError:
+            raise ValueError(f"Encountered unknown record id of '{record_id}'")
+        fields = line.split(SEP, max(provider, pcn) + 1)
+        if len(fields) <= max(provider, pcn):
+            raise ValueError("Line is too short to hold the encounter key")
+        return (fields[provider], fields[pcn], rank, line_number, offset)
+
+    def spill(self, buffer: List[Entry]) -> None:
+        buffer.sort(key=itemgetter(0))
+        self.runs.append(write_run(buffer, self.tmpdir))
+
+    def merge(self, runs: List[IO[bytes]]) -> Iterator[Entry]:
+        while len(runs) > MAX_MERGE_WIDTH:
+            merged = heapq.merge(
+                *(read_run(run) for run in runs[:MAX_MERGE_WIDTH]),
+                key=itemgetter(0),
+            )
+            runs = runs[MAX_MERGE_WIDTH:] + [write_run(merged, self.tmpdir)]
+        return heapq.merge(*(read_run(run) for run in runs), key=itemgetter(0))
+
+    def iter_sorted(
+        self, lines: Iterable[NumberedLine], reject: Optional[Reject] = None
+    ) -> Iterator[Entry]:
+        """ Every line (see `numbered_lines`) with its sort key, in key order
+
+        Lines whose key can't be read raise ValueError, unless `reject` is
+        given, which is then called with the line, its offset, the error and
+        its line number. """
+        buffer: List[Entry] = []
+        buffered = 0
+        for line_number, offset, line in lines:
+            try:
+                key = self.sort_key(line, line_number, offset)
+            except ValueError as exc:
+                if reject is None:
+                    locate_error(exc, line_number, line_record_id(line))
+                    raise
+                reject(line, offset, exc, line_number)
+            else:
+                buffer.append((key, line))
+                buffered += len(line) + ENTRY_OVERHEAD
+                if buffered >= self.memory_budget:
+                    self.spill(buffer)
+                    buffer = []
+                    buffered = 0
+
+        if not self.runs:
+            buffer.sort(key=itemgetter(0))
+            yield from buffer
+            return
+        if buffer:
+            self.spill(buffer)
+        runs, self.runs = self.runs, []
+        yield from self.merge(runs)
+
+    def iter_groups(
+        self, lines: Iterable[NumberedLine], reject: Optional[Reject] = None
+    ) -> Iterator[List[Tuple[int, int, str]]]:
+        """ The (line number, offset, line) triples of each encounter, in key
+        order """
+        entries = self.iter_sorted(lines, reject)
+        for _, group in groupby(entries, key=lambda entry: entry[0][:2]):
+            yield [(key[3], key[4], line) for key, line in group]
@@ -0,0 +1,177 @@
+""" Random access to the encounters of an S1 file
+
+An index records where every encounter (a line whose spec `denotes_new_set`
+and the lines up to the next one) sits in the file, keyed by the provider id
+and patient control number on its header. It is kept next to the S1 file in a
+small sqlite database, so looking up an encounter is an indexed query and a
+seek rather than a re-parse of the whole file. """
+import os
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+from s1.records import RecordSet
+from s1.reader import MappedS1Reader
+from s1.specifications.tha import PCN, PROVIDER_ID
+
+INDEX_SUFFIX = ".idx"
+
+# (provider_id, patient_control_number, byte offset, length in bytes)
+IndexEntry = Tuple[str, str, int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS encounters (
+    provider_id TEXT NOT NULL,
+    patient_control_number TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source (
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+def scan_encounters(
+    reader: MappedS1Reader,
+    provider_field: str = PROVIDER_ID,
+    pcn_field: str = PCN,
+) -> Iterator[IndexEntry]:
+    """ Yield an index entry per encounter, in file order
+
+    Only the key fields of header lines are decoded; every other line is
+    just measured. """
+    current: Optional[Tuple[str, str, int]] = None
+    for offset, line in reader.iter_raw_lines():
+        spec = reader.spec_for_line(line)
+        if not spec.denotes_new_set:
+            continue
+        if current is not None:
+            yield current + (offset - current[2],)
+        names = spec.all_static_field_names
+        fields = line.split(b"|")
+        current = (
+            fields[names.index(provider_field)].decode(reader.encoding),
+            fields[names.index(pcn_field)].decode(reader.encoding),
+            offset,
+        )
+    if current is not None:
+        yield current + (reader.size - current[2],)
+
+
+class EncounterIndex:
+    """ The encounter index of one S1 file
+
+    `build()` scans the file once and writes the sidecar (by default the S1
+    path plus ".idx"); afterwards `lookup` and `encounters` only touch the
+    index and the lines of the encounters asked for. They refuse to read
+    from an S1 file that changed since (see `is_stale`). """
+
+    def __init__(
+        self,
+        s1_path: str,
+        index_path: Optional[str] = None,
+        encoding: str = "utf-8",
+    ):
+        self.s1_path = s1_path
+        self.index_path = index_path or s1_path + INDEX_SUFFIX
+        self.encoding = encoding
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "EncounterIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if not os.path.exists(self.index_path):
+                raise FileNotFoundError(
+                    f"No encounter index at {self.index_path}; build() it first"
+                )
+            self._connection = sqlite3.connect(self.index_path)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def build(self) -> "EncounterIndex":
+        self.close()
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        connection = self._connection = sqlite3.connect(self.index_path)
+        connection.executescript(SCHEMA)
+        with MappedS1Reader(self.s1_path, self.encoding) as reader:
+            connection.executemany(
+                "INSERT INTO encounters VALUES (?, ?, ?, ?)",
+                scan_encounters(reader),
+            )
+        connection.execute(
+            "CREATE INDEX encounter_keys "
+            "ON encounters (provider_id, patient_control_number)"
+        )
+        stat = os.stat(self.s1_path)
+        connection.execute(
+            "INSERT INTO source VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns)
+        )
+        connection.commit()
+        return self
+
+    @property
+    def is_stale(self) -> bool:
+        """ Whether the S1 file changed since the index was built """
+        stat = os.stat(self.s1_path)
+        row = self.connection.execute(
+            "SELECT size, mtime_ns FROM source"
+        ).fetchone()
+        return bool(row != (stat.st_size, stat.st_mtime_ns))
+
+    def check_fresh(self) -> None:
+        if self.is_stale:
+            raise ValueError(
+                f"{self.s1_path} has changed since it was indexed in "
+                f"{self.index_path}; build() the index again"
+            )
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM encounters"
+        ).fetchone()
+        return int(count)
+
+    def lookup(
+        self, provider_id: str, patient_control_number: str
+    ) -> List[Tuple[int, int]]:
+        """ (byte offset, length) of each matching encounter, in file order
+
+        Raises ValueError if the S1 file changed since the index was built,
+        since the offsets may then point anywhere. """
+        self.check_fresh()
+        rows = self.connection.execute(
+            "SELECT offset, length FROM encounters "
+            "WHERE provider_id = ? AND patient_control_number = ? "
+            "ORDER BY offset",
+            (provider_id, patient_control_number),
+        )
+        return [(offset, length) for offset, length in rows]
+
+    def encounters(
+        self, provider_id: str, patient_control_number: str
+    ) -> List[RecordSet]:
+        """ Parse only the lines of the matching encounters """
+        found = []
+        with MappedS1Reader(self.s1_path, self.encoding) as reader:
+            for offset, length in self.lookup(
+                provider_id, patient_control_number
+            ):
+                encounter = RecordSet()
+                for _, _, record in reader.iter_records(
+                    offset, offset + length
+                ):
+                    encounter.add_record(record)
+                found.append(encounter)
+        return found
@@ -0,0 +1,121 @@
+""" Instrumentation for parsers
+
+A `ParserMetrics` handed to `S1Parser(metrics=...)` counts lines and bytes per
+record type, the number of entries in repeated blocks, and errors by exception
+type. With `timing=True` the parser also times each stage of handling a line
+(record id extraction, spec lookup, split, validation and record build) and
+each flush. Without a metrics object the parser takes its usual path, so the
+cost of instrumentation is only paid when asked for.
+
+Byte counts are those of each line without its line ending: the raw bytes
+read when the parser decodes lines itself (`S1Parser.iter_file`, `s1 stats`),
+otherwise the length of each line encoded in `encoding`. """
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Optional
+
+from s1.records import RecordSpec
+from s1.records.base import SEP
+
+# Stages timed when `timing` is on
+RECORD_ID = "record_id"
+SPEC_LOOKUP = "spec_lookup"
+SPLIT = "split"
+VALIDATION = "validation"
+BUILD = "build"
+FLUSH = "flush"
+STAGES = (RECORD_ID, SPEC_LOOKUP, SPLIT, VALIDATION, BUILD, FLUSH)
+
+Snapshot = Dict[str, Any]
+
+
+class ParserMetrics:
+    def __init__(
+        self,
+        timing: bool = False,
+        callback: Optional[Callable[[Snapshot], None]] = None,
+        push_every: int = 100000,
+        encoding: str = "utf-8",
+    ):
+        self.timing = timing
+        self.callback = callback
+        self.push_every = push_every
+        self.encoding = encoding
+        self.started = time.perf_counter()
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.lines_by_type: Counter = Counter()
+        self.bytes_by_type: Counter = Counter()
+        # record id -> Counter of repeated block lengths
+        self.repeated_lengths: Dict[str, Counter] = {}
+        self.errors: Counter = Counter()
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+
+    def record_line(
+        self, spec: RecordSpec, line: str, num_bytes: Optional[int] = None
+    ) -> None:
+        size = (
+            len(line.encode(self.encoding)) if num_bytes is None else num_bytes
+        )
+        record_id = spec.record_id
+        self.total_lines += 1
+        self.total_bytes += size
+        self.lines_by_type[record_id] += 1
+        self.bytes_by_type[record_id] += size
+        if spec.repeated_block:
+            n_entries = (
+                line.count(SEP) + 1 - spec.num_static_fields
+            ) // spec.num_repeat_fields
+            lengths = self.repeated_lengths.get(record_id)
+            if lengths is None:
+                lengths = self.repeated_lengths[record_id] = Counter()
+            lengths[n_entries] += 1
+        if (
+            self.callback is not None
+            and self.total_lines % self.push_every == 0
+        ):
+            self.push()
+
+    def record_error(self, exc: BaseException) -> None:
+        self.errors[type(exc).__name__] += 1
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stage_seconds[stage] += seconds
+
+    def merge(self, other: "ParserMetrics") -> None:
+        """ Add the counts and timings of another parser, e.g. one that ran in
+        a worker process """
+        self.total_lines += other.total_lines
+        self.total_bytes += other.total_bytes
+        self.lines_by_type.update(other.lines_by_type)
+        self.bytes_by_type.update(other.bytes_by_type)
+        for record_id, lengths in other.repeated_lengths.items():
+            self.repeated_lengths.setdefault(record_id, Counter()).update(
+                lengths
+            )
+        self.errors.update(other.errors)
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+
+    def snapshot(self) -> Snapshot:
+        """ A copy of the current metrics, with rates since creation """
+        elapsed = time.perf_counter() - self.started
+        return {
+            "elapsed_seconds": elapsed,
+            "total_lines": self.total_lines,
+            "total_bytes": self.total_bytes,
+            "lines_per_sec": self.total_lines / elapsed if elapsed else 0.0,
+            "bytes_per_sec": self.total_bytes / elapsed if elapsed else 0.0,
+            "lines_by_type": dict(self.lines_by_type),
+            "bytes_by_type": dict(self.bytes_by_type),
+            "repeated_lengths": {
+                record_id: dict(lengths)
+                for record_id, lengths in self.repeated_lengths.items()
+            },
+            "errors": dict(self.errors),
+            "stage_seconds": dict(self.stage_seconds),
+        }
+
+    def push(self) -> None:
+        if self.callback is not None:
+            self.callback(self.snapshot())
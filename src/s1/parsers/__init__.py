@@ -1,20 +1,97 @@
-from typing import List, Tuple
+import os
+import time
+from dataclasses import replace
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
-from s1.exceptions import UnknownRecordType
-from s1.parsing import parse_line_with_spec, record_id_from_line
-from s1.records import RecordSet, RecordSpec, RecordType
+from s1.checkpoint import CHECKPOINT_SUFFIX, Checkpoint, iter_raw_lines_from
+from s1.compression import open_s1
+from s1.deadletter import (
+    DROP,
+    ENCOUNTER_POLICIES,
+    FLAG,
+    KEEP_PARTIAL,
+    DeadLetter,
+    DeadLetterSink,
+)
+from s1.exceptions import UnknownRecordType, locate_error
+from s1.grouping import DEFAULT_MEMORY_BUDGET, ExternalGrouper, numbered_lines
+from s1.metrics import (
+    BUILD,
+    FLUSH,
+    RECORD_ID,
+    SPEC_LOOKUP,
+    SPLIT,
+    VALIDATION,
+    ParserMetrics,
+)
+from s1.parsing import (
+    fields_from_line,
+    line_record_id,
+    record_id_from_line,
+    splat,
+)
+from s1.projection import Projection, ProjectionFields
+from s1.records import LazyRecord, Record, RecordSet, RecordSpec
+from s1.records.base import DICT_RECORDS, LAZY_RECORDS, RECORD_MODES, SEP
 from s1.records.registry import spec_from_record_id
 
 
 class S1Parser:
+    """ Groups lines into encounters of records
+
+    With a `projection` (see `s1.projection`) only the record types and
+    fields it names are built; other lines are skipped and counted in
+    `skipped_lines`. """
+
     class BatchSizeExceeded(Exception):
         pass
 
-    def __init__(self, batch_size=1000):
+    def __init__(
+        self,
+        batch_size=1000,
+        record_mode=DICT_RECORDS,
+        metrics: Optional[ParserMetrics] = None,
+        dead_letters: Optional[DeadLetterSink] = None,
+        encounter_policy: str = KEEP_PARTIAL,
+        max_batch_bytes: Optional[int] = None,
+        projection: Optional[ProjectionFields] = None,
+    ):
+        if record_mode not in RECORD_MODES:
+            raise ValueError(f"record_mode must be one of {RECORD_MODES}")
+        self.projection: Optional[Projection] = None
+        if projection is not None:
+            self.projection = Projection(projection)
+            if self.projection.has_field_lists and record_mode == LAZY_RECORDS:
+                raise ValueError(
+                    "Lazy records only build the fields read already; "
+                    "project record ids only (None for their fields)"
+                )
+        if encounter_policy not in ENCOUNTER_POLICIES:
+            raise ValueError(
+                f"encounter_policy must be one of {ENCOUNTER_POLICIES}"
+            )
         self.batch_size = batch_size
+        # Optional limit on the raw size of the buffered encounters' lines
+        self.max_batch_bytes = max_batch_bytes
+        self.record_mode = record_mode
+        self.metrics = metrics
+        # With a dead letter sink, bad lines are handed to it instead of raising
+        self.dead_letters = dead_letters
+        self.encounter_policy = encounter_policy
+        self.rejected_lines: int = 0
+        self.dropped_sets: int = 0
+        self.skipped_lines: int = 0
+        self._offset: int = 0
+        # Size of the line being parsed as read, when it was read as bytes
+        self._raw_bytes: Optional[int] = None
+        # Set while lines are parsed out of file order, see `iter_grouped`
+        self._line_number: Optional[int] = None
+        self._current_has_errors = False
         self.buffer: List[RecordSet] = []
         self.current_encounter: RecordSet = RecordSet()
         self._buffer_size: int = 0
+        self._buffer_bytes: int = 0
         self._total_lines: int = 0
         self._total_sets: int = 0
 
@@ -27,7 +104,17 @@ class S1Parser:
         self._buffer_size = size
 
     @property
-    def total_lines(self):
+    def buffer_bytes(self) -> int:
+        """ Running estimate of the buffer's size: the length of the lines
+        its encounters were parsed from """
+        return self._buffer_bytes
+
+    @buffer_bytes.setter
+    def buffer_bytes(self, size: int) -> None:
+        self._buffer_bytes = size
+
+    @property
+    def total_lines(self) -> int:
         return self._total_lines
 
     @total_lines.setter
@@ -42,45 +129,459 @@ class S1Parser:
     def total_sets(self, total: int) -> None:
         self._total_sets = total
 
-    def handle_new_line(self, line: str) -> Tuple[RecordSpec, RecordType]:
+    @property
+    def line_number(self) -> int:
+        """ Number of the line being parsed, counting from one """
+        if self._line_number is not None:
+            return self._line_number
+        return self.total_lines + self.rejected_lines + 1
+
+    def handle_new_line(self, line: str) -> Tuple[RecordSpec, Record]:
+        if self.metrics is None:
+            spec, record = self.build_record(line)
+        else:
+            spec, record = self.build_record_measured(line, self.metrics)
+        self.total_lines += 1
+        return spec, record
+
+    def build_record(self, line: str) -> Tuple[RecordSpec, Record]:
+        record: Record
+        if self.record_mode == LAZY_RECORDS:
+            spec = self.spec_for_record_id(record_id_from_line(line))
+            record = LazyRecord.from_line(spec, line)
+        else:
+            data_fields = fields_from_line(line)
+            spec = self.spec_for_record_id(data_fields[0])
+            if self.projection is None:
+                record = spec.decoder(self.record_mode)(data_fields)
+            else:
+                decode = self.projection.decoder(spec, self.record_mode)
+                record = decode(data_fields)
+        return spec, record
+
+    def decoder_for(self, spec: RecordSpec) -> Callable[[List[str]], Record]:
+        if self.projection is None:
+            return spec.decoder(self.record_mode)
+        return self.projection.decoder(spec, self.record_mode)
+
+    def build_record_measured(
+        self, line: str, metrics: ParserMetrics
+    ) -> Tuple[RecordSpec, Record]:
+        try:
+            if metrics.timing:
+                spec, record = self.build_record_timed(line, metrics)
+            else:
+                spec, record = self.build_record(line)
+        except Exception as exc:
+            metrics.record_error(exc)
+            raise
+        metrics.record_line(spec, line, self._raw_bytes)
+        return spec, record
+
+    def build_record_timed(
+        self, line: str, metrics: ParserMetrics
+    ) -> Tuple[RecordSpec, Record]:
+        """ `build_record` taken one stage at a time, with each stage timed """
+        clock = time.perf_counter
+        started = clock()
         record_id = record_id_from_line(line)
+        found_id = clock()
+        spec = self.spec_for_record_id(record_id)
+        found_spec = clock()
+        record: Record
+        if self.record_mode == LAZY_RECORDS:
+            # Lazy records don't split the line up front
+            split = found_spec
+            spec.validate_number_of_fields(line.count(SEP) + 1)
+            validated = clock()
+            record = LazyRecord(spec, line)
+        else:
+            data_fields = splat(line)
+            split = clock()
+            spec.validate_number_of_fields(len(data_fields))
+            validated = clock()
+            record = self.decoder_for(spec)(data_fields)
+        built = clock()
+        metrics.add_time(RECORD_ID, found_id - started)
+        metrics.add_time(SPEC_LOOKUP, found_spec - found_id)
+        metrics.add_time(SPLIT, split - found_spec)
+        metrics.add_time(VALIDATION, validated - split)
+        metrics.add_time(BUILD, built - validated)
+        return spec, record
+
+    def parse_line(
+        self, line: str
+    ) -> Tuple[Optional[RecordSpec], Optional[Record]]:
+        """ `handle_new_line`, sending bad lines to the dead letter sink if
+        there is one; the spec is then still looked up when possible """
+        if self.dead_letters is None:
+            try:
+                return self.handle_new_line(line)
+            except ValueError as exc:
+                locate_error(exc, self.line_number, line_record_id(line))
+                raise
+
+        offset = self._offset
+        self._offset += len(line)
+        try:
+            return self.handle_new_line(line)
+        except ValueError as exc:
+            return self.reject_line(line, offset, exc), None
+
+    def skip_line(self, line: str) -> Optional[RecordSpec]:
+        """ The spec of a line the projection leaves out, which then counts
+        as read; None when the line is to be parsed
+
+        Lines whose record id can't be found are parsed, so they're rejected
+        the same way as without a projection. """
+        assert self.projection is not None
+        try:
+            record_id = record_id_from_line(line)
+        except ValueError:
+            return None
+        if self.projection.includes(record_id):
+            return None
         try:
             spec = spec_from_record_id(record_id)
         except KeyError:
-            raise UnknownRecordType()
-        record = parse_line_with_spec(line, spec)
+            return None
+        if self.dead_letters is not None:
+            self._offset += len(line)
         self.total_lines += 1
-        return spec, record
+        self.skipped_lines += 1
+        return spec
 
-    def finish_current_encounter(self) -> None:
+    def reject_line(
+        self,
+        line: str,
+        offset: int,
+        exc: Exception,
+        line_number: Optional[int] = None,
+    ) -> Optional[RecordSpec]:
+        spec: Optional[RecordSpec] = None
+        if line_number is None:
+            line_number = self.line_number
+        self.rejected_lines += 1
+        record_id = line_record_id(line)
+        try:
+            spec = spec_from_record_id(record_id)
+        except KeyError:
+            pass
+        reason = (
+            f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+        )
+        if self.dead_letters is not None:
+            self.dead_letters(
+                DeadLetter(
+                    line_number=line_number,
+                    offset=offset,
+                    record_id=record_id,
+                    reason=reason,
+                    line=line,
+                )
+            )
+        return spec
+
+    def spec_for_record_id(self, record_id: str) -> RecordSpec:
+        try:
+            return spec_from_record_id(record_id)
+        except KeyError:
+            raise UnknownRecordType(
+                f"Encountered unknown record id of '{record_id}'"
+            )
+
+    def take_current_encounter(self) -> Optional[RecordSet]:
+        """ Hand off the encounter being built and start a fresh one """
+        has_errors, self._current_has_errors = self._current_has_errors, False
         # Catch an edge on the first feed or right after a flush
         if self.current_encounter.is_empty:
-            return
+            return None
 
-        self.buffer.append(self.current_encounter)
-        self.buffer_size += 1
-        self.total_sets += 1
+        encounter = self.current_encounter
         self.current_encounter = RecordSet()
+        if has_errors:
+            if self.encounter_policy == DROP:
+                self.dropped_sets += 1
+                return None
+            if self.encounter_policy == FLAG:
+                encounter.flagged = True
+        self.total_sets += 1
+        return encounter
+
+    def finish_current_encounter(self) -> None:
+        encounter = self.take_current_encounter()
+        if encounter is not None:
+            self.buffer_encounter(encounter)
+
+    def buffer_encounter(self, encounter: RecordSet) -> None:
+        self.buffer.append(encounter)
+        self.buffer_size += 1
+        self.buffer_bytes += encounter.num_bytes
 
-    def attach_record(self, record: RecordType) -> None:
+    def attach_record(self, record: Record) -> None:
         self.current_encounter.add_record(record)
 
     def feed(self, line: str) -> None:
-        spec, record = self.handle_new_line(line)
-        if spec.denotes_new_set:
-            self.finish_current_encounter()
-        self.attach_record(record)
+        encounter = self.add_line(line)
+        if encounter is not None:
+            self.buffer_encounter(encounter)
         self.check_batch_size()
 
     def check_batch_size(self) -> None:
         if self.buffer_size >= self.batch_size:
             raise self.BatchSizeExceeded()
+        if (
+            self.max_batch_bytes is not None
+            and self.buffer_bytes >= self.max_batch_bytes
+        ):
+            raise self.BatchSizeExceeded()
 
     def finish(self) -> None:
         self.finish_current_encounter()
 
+    def add_line(self, line: str) -> Optional[RecordSet]:
+        """ Parse a line into the current encounter, bypassing the buffer
+
+        Returns the previous encounter when this line starts a new one. """
+        if self.projection is not None:
+            skipped = self.skip_line(line)
+            if skipped is not None:
+                if skipped.denotes_new_set:
+                    return self.take_current_encounter()
+                return None
+        spec, record = self.parse_line(line)
+        encounter = None
+        if spec is not None and spec.denotes_new_set:
+            encounter = self.take_current_encounter()
+        if record is None:
+            # The line went to the dead letter sink
+            self._current_has_errors = True
+        else:
+            self.attach_record(record)
+            self.current_encounter.num_bytes += len(line)
+        return encounter
+
+    def add_raw_line(
+        self, raw_line: bytes, encoding: str
+    ) -> Optional[RecordSet]:
+        """ `add_line` for a line read as bytes; one that doesn't decode is
+        a bad line like any other, rejected when there's a dead letter sink """
+        try:
+            line = raw_line.decode(encoding)
+        except UnicodeDecodeError as exc:
+            line = raw_line.decode(encoding, errors="replace")
+            if self.dead_letters is None:
+                locate_error(exc, self.line_number, line_record_id(line))
+                raise
+            spec = self.reject_line(line, self._offset, exc)
+            encounter = None
+            if spec is not None and spec.denotes_new_set:
+                encounter = self.take_current_encounter()
+            self._current_has_errors = True
+            return encounter
+        self._raw_bytes = len(raw_line)
+        try:
+            return self.add_line(line)
+        finally:
+            self._raw_bytes = None
+
+    def iter_encounters(self, lines: Iterable[str]) -> Iterator[RecordSet]:
+        """ Lazily yield each encounter found in `lines`
+
+        `lines` may be any iterable of S1 lines, such as an open file. Only
+        the encounter currently being built is held; the buffer and
+        `BatchSizeExceeded` aren't involved, and the final encounter is
+        yielded once `lines` runs out. """
+        for line in lines:
+            encounter = self.add_line(line)
+            if encounter is not None:
+                yield encounter
+
+        encounter = self.take_current_encounter()
+        if encounter is not None:
+            yield encounter
+
+    def iter_file(
+        self, path: str, encoding: str = "utf-8"
+    ) -> Iterator[RecordSet]:
+        """ `iter_encounters` over the lines of a file, which may be
+        compressed (see `s1.compression.open_s1`)
+
+        Dead letters get the byte offset each line starts at in the file (in
+        the decompressed stream for a compressed one). """
+        with open_s1(path, encoding) as reader:
+            for offset, raw_line in reader.iter_raw_lines():
+                # Lines come without their line endings, so offsets can't be
+                # counted from the lines themselves
+                self._offset = offset
+                encounter = self.add_raw_line(raw_line, encoding)
+                if encounter is not None:
+                    yield encounter
+
+        encounter = self.take_current_encounter()
+        if encounter is not None:
+            yield encounter
+
+    def iter_batches(
+        self,
+        lines: Iterable[str],
+        batch_size: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+    ) -> Iterator[List[RecordSet]]:
+        """ Like `iter_encounters`, grouped into lists of up to `batch_size`
+        encounters (the parser's own batch_size by default)
+
+        A batch is also cut once its encounters' lines add up to
+        `max_batch_bytes` (again defaulting to the parser's own), so a batch
+        only goes over that limit by its last encounter. """
+        size = batch_size or self.batch_size
+        max_bytes = max_batch_bytes or self.max_batch_bytes
+        encounters = self.iter_encounters(lines)
+        if max_bytes is None:
+            while True:
+                batch = list(islice(encounters, size))
+                if not batch:
+                    return
+                yield batch
+
+        batch = []
+        batch_bytes = 0
+        for encounter in encounters:
+            batch.append(encounter)
+            batch_bytes += encounter.num_bytes
+            if len(batch) >= size or batch_bytes >= max_bytes:
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
+
+    def iter_grouped(
+        self,
+        lines: Iterable[str],
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        tmpdir: Optional[str] = None,
+    ) -> Iterator[RecordSet]:
+        """ Like `iter_encounters`, but grouping records on their provider id
+        and patient control number wherever they are in `lines`
+
+        The lines are sorted first (see `s1.grouping`), spilling to `tmpdir`
+        once more than `memory_budget` bytes are buffered, so encounters come
+        out ordered by key. Each starts with its header, if it has one,
+        followed by its other records in file order. Bad lines are reported
+        with their line number, and their byte offset when `lines` is a
+        reader such as `open_s1` returns (see `s1.grouping.numbered_lines`). """
+        grouper = ExternalGrouper(memory_budget, tmpdir)
+        reject = None
+        if self.dead_letters is not None:
+            reject = self.reject_line
+        groups = grouper.iter_groups(numbered_lines(lines, reject), reject)
+        try:
+            for group in groups:
+                for line_number, offset, line in group:
+                    # Errors report where the line was in the file
+                    self._line_number = line_number
+                    self._offset = offset
+                    if (
+                        self.projection is not None
+                        and self.skip_line(line) is not None
+                    ):
+                        continue
+                    spec, record = self.parse_line(line)
+                    if record is None:
+                        self._current_has_errors = True
+                    else:
+                        self.attach_record(record)
+                encounter = self.take_current_encounter()
+                if encounter is not None:
+                    yield encounter
+        finally:
+            self._line_number = None
+
+    def iter_checkpointed(
+        self,
+        path: str,
+        state_path: Optional[str] = None,
+        encoding: str = "utf-8",
+        batch_size: Optional[int] = None,
+    ) -> Iterator[List[RecordSet]]:
+        """ Like `iter_batches` over a file, saving a checkpoint (see
+        `s1.checkpoint`) to `state_path`, by default the S1 path plus
+        ".checkpoint", after each batch
+
+        A batch counts as done once the next one is asked for, so a job that
+        dies while handling a batch gets that batch again when it's restarted.
+        If `state_path` holds a checkpoint of this file, the counts are
+        restored from it and only the encounters after it are yielded. """
+        state_path = state_path or path + CHECKPOINT_SUFFIX
+        size = batch_size or self.batch_size
+        checkpoint = Checkpoint.load(state_path)
+        if checkpoint is None:
+            stat = os.stat(path)
+            checkpoint = Checkpoint(
+                size=stat.st_size, mtime_ns=stat.st_mtime_ns
+            )
+        elif not checkpoint.matches(path):
+            raise ValueError(
+                f"{path} has changed since it was checkpointed in {state_path}"
+            )
+        if checkpoint.complete:
+            return
+        self.total_lines = checkpoint.total_lines
+        self.total_sets = checkpoint.total_sets
+        self.rejected_lines = checkpoint.rejected_lines
+        self.dropped_sets = checkpoint.dropped_sets
+
+        batch: List[RecordSet] = []
+        with open_s1(path, encoding) as reader:
+            for offset, raw_line in iter_raw_lines_from(
+                reader, checkpoint.offset
+            ):
+                # The counts before a line that starts an encounter are the
+                # ones to resume with from that line
+                total_lines, rejected_lines = (
+                    self.total_lines,
+                    self.rejected_lines,
+                )
+                self._offset = offset
+                encounter = self.add_raw_line(raw_line, encoding)
+                if encounter is None:
+                    continue
+                batch.append(encounter)
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+                    checkpoint = replace(
+                        checkpoint,
+                        offset=offset,
+                        total_lines=total_lines,
+                        total_sets=self.total_sets,
+                        rejected_lines=rejected_lines,
+                        dropped_sets=self.dropped_sets,
+                    )
+                    checkpoint.save(state_path)
+
+        encounter = self.take_current_encounter()
+        if encounter is not None:
+            batch.append(encounter)
+        if batch:
+            yield batch
+        checkpoint = replace(
+            checkpoint,
+            total_lines=self.total_lines,
+            total_sets=self.total_sets,
+            rejected_lines=self.rejected_lines,
+            dropped_sets=self.dropped_sets,
+            complete=True,
+        )
+        checkpoint.save(state_path)
+
     def flush(self) -> List[RecordSet]:
+        started = time.perf_counter()
         flushed = self.buffer.copy()
         self.buffer.clear()
         self.buffer_size = 0
+        self.buffer_bytes = 0
+        if self.metrics is not None and self.metrics.timing:
+            self.metrics.add_time(FLUSH, time.perf_counter() - started)
         return flushed
@@ -0,0 +1,114 @@
+""" Parse S1 data as it arrives over the network
+
+`AsyncS1Parser` reads byte chunks from an `asyncio.StreamReader` (or any async
+iterable of bytes, such as an HTTP response body), cuts them into lines itself
+and groups encounters with an `S1Parser`, so the registry and grouping rules
+are the same. Results are produced through async generators: nothing is read
+from the source until the consumer asks for more, which gives backpressure,
+and control goes back to the event loop after every chunk so many submissions
+can be parsed side by side. """
+import asyncio
+from typing import AsyncIterable, AsyncIterator, List, Optional, Union
+
+from s1.parsers import S1Parser
+from s1.projection import ProjectionFields
+from s1.records import RecordSet
+from s1.records.base import DICT_RECORDS
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+ByteSource = Union[asyncio.StreamReader, AsyncIterable[bytes]]
+
+
+async def iter_chunks(
+    source: ByteSource, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    if isinstance(source, asyncio.StreamReader):
+        # Not iterating the reader line by line, which fails on lines longer
+        # than its buffer limit
+        while True:
+            chunk = await source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+class AsyncS1Parser:
+    def __init__(
+        self,
+        batch_size=1000,
+        record_mode=DICT_RECORDS,
+        encoding: str = "utf-8",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_batch_bytes: Optional[int] = None,
+        projection: Optional[ProjectionFields] = None,
+    ):
+        self.parser = S1Parser(
+            batch_size=batch_size,
+            record_mode=record_mode,
+            max_batch_bytes=max_batch_bytes,
+            projection=projection,
+        )
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+
+    @property
+    def total_lines(self) -> int:
+        return self.parser.total_lines
+
+    @property
+    def total_sets(self) -> int:
+        return self.parser.total_sets
+
+    async def iter_lines(self, source: ByteSource) -> AsyncIterator[List[str]]:
+        """ Yield the complete lines of each chunk, without line endings """
+        encoding = self.encoding
+        remainder = b""
+        async for chunk in iter_chunks(source, self.chunk_size):
+            pieces = (remainder + chunk).split(b"\n")
+            remainder = pieces.pop()
+            if pieces:
+                yield [piece.rstrip(b"\r").decode(encoding) for piece in pieces]
+        if remainder:
+            yield [remainder.rstrip(b"\r").decode(encoding)]
+
+    async def iter_encounters(
+        self, source: ByteSource
+    ) -> AsyncIterator[RecordSet]:
+        parser = self.parser
+        async for lines in self.iter_lines(source):
+            for line in lines:
+                encounter = parser.add_line(line)
+                if encounter is not None:
+                    yield encounter
+            # Parsing is CPU bound, let other tasks run between chunks
+            await asyncio.sleep(0)
+
+        encounter = parser.take_current_encounter()
+        if encounter is not None:
+            yield encounter
+
+    async def iter_batches(
+        self,
+        source: ByteSource,
+        batch_size: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+    ) -> AsyncIterator[List[RecordSet]]:
+        size = batch_size or self.parser.batch_size
+        max_bytes = max_batch_bytes or self.parser.max_batch_bytes
+        batch: List[RecordSet] = []
+        batch_bytes = 0
+        async for encounter in self.iter_encounters(source):
+            batch.append(encounter)
+            batch_bytes += encounter.num_bytes
+            if len(batch) >= size or (
+                max_bytes is not None and batch_bytes >= max_bytes
+            ):
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
@@ -0,0 +1,168 @@
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from s1.columnar import ColumnBatch, ColumnBuilder
+from s1.exceptions import UnknownRecordType, locate_error
+from s1.parsers import S1Parser
+from s1.parsing import fields_from_line, line_record_id
+from s1.records import RecordSpec
+from s1.records.registry import spec_from_record_id
+
+if TYPE_CHECKING:  # pragma: no cover
+    from s1.typed import BadValue
+
+ColumnBatches = Dict[str, ColumnBatch]
+
+
+class ColumnarS1Parser:
+    """ Groups lines into encounters like `S1Parser`, but flushes columns
+
+    Each flush returns one `ColumnBatch` per record type seen in the batch,
+    keyed by record id, plus a child table per repeated block (keyed like
+    "400.revenue_codes"). Every table carries an `encounter_index` column
+    giving the encounter's position within the batch, and child tables a
+    `row_index` pointing at their parent row. No record dicts are built.
+
+    With `typed` set, fields annotated in their spec's `field_types` are
+    converted a column at a time when a batch is flushed (see `s1.typed`,
+    which needs pyarrow). Values that don't convert become nulls and are kept
+    in `bad_values`, up to `max_bad_values` of them. """
+
+    BatchSizeExceeded = S1Parser.BatchSizeExceeded
+
+    def __init__(
+        self,
+        batch_size=1000,
+        max_batch_bytes: Optional[int] = None,
+        typed: bool = False,
+        max_bad_values: int = 1000,
+    ):
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.typed = typed
+        self.max_bad_values = max_bad_values
+        self.bad_values: List["BadValue"] = []
+        self.total_bad_values: int = 0
+        self.builders: Dict[str, ColumnBuilder] = {}
+        # Lines of the encounter being read, held until it's complete
+        self.current_encounter: List[Tuple[RecordSpec, List[str]]] = []
+        self.current_bytes: int = 0
+        self.buffer_size: int = 0
+        # Length of the lines behind the buffered encounters
+        self.buffer_bytes: int = 0
+        self.total_lines: int = 0
+        self.total_sets: int = 0
+
+    @property
+    def line_number(self) -> int:
+        """ Number of the line being parsed, counting from one """
+        return self.total_lines + 1
+
+    def handle_new_line(self, line: str) -> Tuple[RecordSpec, List[str]]:
+        # Lines straight from open() still end in a newline, which would
+        # otherwise be kept in the last column
+        data_fields = fields_from_line(line.rstrip("\r\n"))
+        try:
+            spec = spec_from_record_id(data_fields[0])
+        except KeyError:
+            raise UnknownRecordType(
+                f"Encountered unknown record id of '{data_fields[0]}'"
+            )
+        spec.validate_number_of_fields(len(data_fields))
+        if spec.has_interned_fields:
+            spec.intern_fields(data_fields)
+        self.total_lines += 1
+        return spec, data_fields
+
+    def finish_current_encounter(self) -> None:
+        if not self.current_encounter:
+            return
+
+        encounter_index = self.buffer_size
+        for spec, data_fields in self.current_encounter:
+            builder = self.builders.get(spec.record_id)
+            if builder is None:
+                builder = self.builders[spec.record_id] = ColumnBuilder(spec)
+            builder.append(data_fields, encounter_index)
+        self.current_encounter = []
+        self.buffer_size += 1
+        self.buffer_bytes += self.current_bytes
+        self.current_bytes = 0
+        self.total_sets += 1
+
+    def add_line(self, line: str) -> None:
+        try:
+            spec, data_fields = self.handle_new_line(line)
+        except ValueError as exc:
+            locate_error(exc, self.line_number, line_record_id(line))
+            raise
+        if spec.denotes_new_set:
+            self.finish_current_encounter()
+        self.current_encounter.append((spec, data_fields))
+        self.current_bytes += len(line)
+
+    def feed(self, line: str) -> None:
+        self.add_line(line)
+        self.check_batch_size()
+
+    def check_batch_size(self) -> None:
+        if self.batch_is_full():
+            raise self.BatchSizeExceeded()
+
+    def batch_is_full(self) -> bool:
+        return self.buffer_size >= self.batch_size or (
+            self.max_batch_bytes is not None
+            and self.buffer_bytes >= self.max_batch_bytes
+        )
+
+    def finish(self) -> None:
+        self.finish_current_encounter()
+
+    def flush(self) -> ColumnBatches:
+        flushed: ColumnBatches = {}
+        for builder in self.builders.values():
+            batches = builder.build()
+            if self.typed:
+                self.convert(builder.spec, batches)
+            for batch in batches:
+                flushed[batch.name] = batch
+        self.builders = {}
+        self.buffer_size = 0
+        self.buffer_bytes = 0
+        return flushed
+
+    def convert(self, spec: RecordSpec, batches: List[ColumnBatch]) -> None:
+        """ Convert the typed columns of a spec's table and child table """
+        from s1.typed import convert_batch
+
+        field_types = [spec.field_types]
+        if spec.repeated_block:
+            field_types.append(spec.repeated_block.field_types)
+        first_encounter = self.total_sets - self.buffer_size
+        for batch, types in zip(batches, field_types):
+            if not types:
+                continue
+            bad_values = convert_batch(batch, types, first_encounter)
+            self.total_bad_values += len(bad_values)
+            room = self.max_bad_values - len(self.bad_values)
+            self.bad_values.extend(bad_values[:room])
+
+    def iter_batches(self, lines: Iterable[str]) -> Iterator[ColumnBatches]:
+        """ Stream `lines`, yielding columns every `batch_size` encounters
+        (or once `max_batch_bytes` of lines are buffered) and once more for
+        whatever remains at the end """
+        for line in lines:
+            self.add_line(line)
+            if self.batch_is_full():
+                yield self.flush()
+
+        self.finish()
+        if self.buffer_size:
+            yield self.flush()
@@ -0,0 +1,351 @@
+""" Parse a single S1 file on several cores
+
+The file is cut into byte ranges, and each cut is moved forward to the start of
+the next line whose spec `denotes_new_set`, so that no encounter straddles two
+ranges. Ranges are parsed by an `S1Parser` (or a `ColumnarS1Parser`) in a
+process pool and their results handed back in file order.
+
+Whatever a worker returns is pickled, and unpickled again by the parent on a
+single core, so results should be cheap to load: unpickling a range's
+`RecordSet`s costs about as much as parsing them, which caps the speedup of
+`iter_encounters` well below the number of workers. `iter_ndjson` and
+`iter_tables` instead serialize in the workers and hand back bytes (NDJSON,
+or Arrow IPC streams) that the parent only has to write out. At most
+`max_pending` ranges are in flight at once, so results don't pile up in the
+parent when it consumes them slower than the pool produces them. """
+import io
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from s1.exceptions import locate_error
+from s1.parsers import S1Parser
+from s1.parsers.columnar import ColumnarS1Parser, ColumnBatches
+from s1.reader import MappedS1Reader
+from s1.records import RecordSet
+from s1.records.registry import spec_from_record_id
+
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+ByteRange = Tuple[int, int]
+
+
+@dataclass
+class ChunkResult:
+    encounters: List[RecordSet] = field(default_factory=list)
+    column_batches: List[ColumnBatches] = field(default_factory=list)
+    # The encounters as NDJSON, see `serialize_byte_range`
+    ndjson: bytes = b""
+    # One Arrow IPC stream per table of each flush, see
+    # `parse_byte_range_tables`
+    table_batches: List[Dict[str, bytes]] = field(default_factory=list)
+    total_lines: int = 0
+    total_sets: int = 0
+    lines_in_chunk: int = 0
+    # What stopped the range, with the line number in the range, see
+    # `keep_error`
+    error: Optional[Exception] = None
+
+
+def line_denotes_new_set(line: bytes, encoding: str = "utf-8") -> bool:
+    record_id = line.split(b"|", 1)[0].decode(encoding)
+    try:
+        return spec_from_record_id(record_id).denotes_new_set
+    except KeyError:
+        return False
+
+
+def next_set_start(fobj: BinaryIO, offset: int, encoding: str = "utf-8") -> int:
+    """ Byte offset of the first new-set line starting at or after `offset` """
+    if offset == 0:
+        fobj.seek(0)
+    else:
+        # Finish the line holding the byte before `offset`, which leaves us at
+        # `offset` itself when it already is the start of a line
+        fobj.seek(offset - 1)
+        fobj.readline()
+    while True:
+        position = fobj.tell()
+        line = fobj.readline()
+        if not line or line_denotes_new_set(line, encoding):
+            return position
+
+
+def split_file(
+    path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES, encoding: str = "utf-8",
+) -> List[ByteRange]:
+    """ Cut a file into byte ranges of about `chunk_bytes`, each starting on
+    an encounter boundary """
+    size = os.path.getsize(path)
+    with open(path, "rb") as fobj:
+        starts = [0]
+        for offset in range(chunk_bytes, size, chunk_bytes):
+            start = next_set_start(fobj, offset, encoding)
+            if start > starts[-1]:
+                starts.append(start)
+    ends = starts[1:] + [size]
+    return [(start, end) for start, end in zip(starts, ends) if start < end]
+
+
+def iter_range_lines(
+    path: str, byte_range: ByteRange, encoding: str
+) -> Iterator[str]:
+    """ The lines starting in a range of the file, decoded and without their
+    line endings, as `open_s1` would give them """
+    with MappedS1Reader(path, encoding) as reader:
+        for _, line in reader.iter_raw_lines(*byte_range):
+            yield line.decode(encoding)
+
+
+def count_lines(path: str, byte_range: ByteRange) -> int:
+    start, end = byte_range
+    with open(path, "rb") as fobj:
+        fobj.seek(start)
+        data = fobj.read(end - start)
+    n_lines = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        n_lines += 1
+    return n_lines
+
+
+def keep_error(result: ChunkResult, exc: Exception, line_number: int) -> None:
+    """ Hand the error that stopped a range back to the parent, which raises
+    it once the range's results from before it are used """
+    if getattr(exc, "line_number", None) is None:
+        locate_error(exc, line_number, "")
+    result.error = exc
+
+
+def parse_byte_range(
+    path: str, byte_range: ByteRange, encoding: str
+) -> ChunkResult:
+    """ Parse one range of a file, run within a worker process """
+    result = ChunkResult(lines_in_chunk=count_lines(path, byte_range))
+    parser = S1Parser()
+    lines = iter_range_lines(path, byte_range, encoding)
+    try:
+        for encounter in parser.iter_encounters(lines):
+            result.encounters.append(encounter)
+    except Exception as exc:
+        keep_error(result, exc, parser.line_number)
+    result.total_lines = parser.total_lines
+    result.total_sets = len(result.encounters)
+    return result
+
+
+def parse_byte_range_columns(
+    path: str, byte_range: ByteRange, encoding: str, batch_size: int
+) -> ChunkResult:
+    """ Like `parse_byte_range`, with a `ColumnarS1Parser` """
+    result = ChunkResult(lines_in_chunk=count_lines(path, byte_range))
+    parser = ColumnarS1Parser(batch_size=batch_size)
+    lines = iter_range_lines(path, byte_range, encoding)
+    try:
+        for batches in parser.iter_batches(lines):
+            result.column_batches.append(batches)
+    except Exception as exc:
+        keep_error(result, exc, parser.line_number)
+    result.total_lines = parser.total_lines
+    result.total_sets = parser.total_sets
+    return result
+
+
+def serialize_byte_range(
+    path: str, byte_range: ByteRange, encoding: str, backend: Optional[str]
+) -> ChunkResult:
+    """ Like `parse_byte_range`, with the encounters written to NDJSON by the
+    worker rather than sent back as objects """
+    from s1.writers import NDJSONWriter
+
+    result = ChunkResult(lines_in_chunk=count_lines(path, byte_range))
+    parser = S1Parser()
+    lines = iter_range_lines(path, byte_range, encoding)
+    out = io.BytesIO()
+    with NDJSONWriter(out, backend) as writer:
+        try:
+            writer.write_all(parser.iter_encounters(lines))
+        except Exception as exc:
+            keep_error(result, exc, parser.line_number)
+    result.ndjson = out.getvalue()
+    result.total_lines = parser.total_lines
+    result.total_sets = writer.total_sets
+    return result
+
+
+def table_to_ipc(table: Any) -> bytes:
+    """ A `pyarrow.Table` as an Arrow IPC stream """
+    import pyarrow
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    data: bytes = sink.getvalue().to_pybytes()
+    return data
+
+
+def table_from_ipc(data: bytes) -> Any:
+    import pyarrow
+
+    return pyarrow.ipc.open_stream(data).read_all()
+
+
+def parse_byte_range_tables(
+    path: str, byte_range: ByteRange, encoding: str, batch_size: int
+) -> ChunkResult:
+    """ Like `parse_byte_range_columns`, with each batch converted to Arrow
+    tables by the worker (requires pyarrow) """
+    result = parse_byte_range_columns(path, byte_range, encoding, batch_size)
+    result.table_batches = [
+        {name: table_to_ipc(batch.to_arrow()) for name, batch in flush.items()}
+        for flush in result.column_batches
+    ]
+    result.column_batches = []
+    return result
+
+
+def map_byte_ranges(
+    func: Callable[..., Any],
+    path: str,
+    *args: Any,
+    workers: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    encoding: str = "utf-8",
+    max_pending: Optional[int] = None,
+) -> Iterator[Any]:
+    """ Yield `func(path, byte_range, encoding, *args)` for each range of the
+    file, computed in a pool of worker processes and in file order
+
+    Ranges are submitted as results are consumed, with at most `max_pending`
+    (twice the number of workers by default) submitted but not yet yielded.
+    `func` has to be picklable, so a module level function. """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * workers
+    ranges = split_file(path, chunk_bytes, encoding)
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            for byte_range in ranges:
+                pending.append(
+                    executor.submit(func, path, byte_range, encoding, *args)
+                )
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Stopped early: don't parse ranges nobody will read
+            for future in pending:
+                future.cancel()
+
+
+class ParallelS1Parser:
+    """ Parses one S1 file across a pool of worker processes
+
+    Encounters come back in file order, and `total_lines`/`total_sets` add up
+    across workers. A line that doesn't parse raises in this process, as it
+    would parsing serially: once every encounter before it has been yielded,
+    with its `line_number` in the whole file (see
+    `s1.exceptions.locate_error`).
+
+    `iter_encounters` sends every `RecordSet` back to this process, which
+    spends about as long unpickling them as a single process would parsing
+    them; prefer `iter_ndjson` or `iter_tables` when the encounters are only
+    going to be written out. """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+        encoding: str = "utf-8",
+        max_pending: Optional[int] = None,
+    ):
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+        self.encoding = encoding
+        self.max_pending = max_pending
+        self.total_lines: int = 0
+        self.total_sets: int = 0
+
+    def iter_chunk_results(
+        self,
+        path: str,
+        func: Callable[..., ChunkResult] = parse_byte_range,
+        *args,
+    ) -> Iterator[ChunkResult]:
+        results = map_byte_ranges(
+            func,
+            path,
+            *args,
+            workers=self.workers,
+            chunk_bytes=self.chunk_bytes,
+            encoding=self.encoding,
+            max_pending=self.max_pending,
+        )
+        lines_before = 0
+        for result in results:
+            self.total_lines += result.total_lines
+            self.total_sets += result.total_sets
+            yield result
+            exc = result.error
+            if exc is not None:
+                locate_error(
+                    exc,
+                    lines_before + getattr(exc, "line_number"),
+                    getattr(exc, "record_id", ""),
+                )
+                raise exc
+            lines_before += result.lines_in_chunk
+
+    def iter_encounters(self, path: str) -> Iterator[RecordSet]:
+        for result in self.iter_chunk_results(path):
+            yield from result.encounters
+
+    def iter_ndjson(
+        self, path: str, backend: Optional[str] = None
+    ) -> Iterator[bytes]:
+        """ The encounters as NDJSON (see `s1.writers.ndjson`), one chunk of
+        bytes per range of the file """
+        for result in self.iter_chunk_results(
+            path, serialize_byte_range, backend
+        ):
+            yield result.ndjson
+
+    def iter_column_batches(
+        self, path: str, batch_size: int = 1000
+    ) -> Iterator[ColumnBatches]:
+        """ Columns as `ColumnarS1Parser.iter_batches` gives them, with each
+        range of the file parsed in its own batches """
+        for result in self.iter_chunk_results(
+            path, parse_byte_range_columns, batch_size
+        ):
+            yield from result.column_batches
+
+    def iter_tables(
+        self, path: str, batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """ Like `iter_column_batches`, with each batch already converted to
+        `pyarrow.Table`s by the workers (requires pyarrow) """
+        for result in self.iter_chunk_results(
+            path, parse_byte_range_tables, batch_size
+        ):
+            for tables in result.table_batches:
+                yield {
+                    name: table_from_ipc(data) for name, data in tables.items()
+                }
+
+    def parse(self, path: str) -> List[RecordSet]:
+        return list(self.iter_encounters(path))
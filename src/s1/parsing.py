@@ -1,11 +1,8 @@
-from itertools import islice, zip_longest
+from itertools import zip_longest
 from typing import Dict, Iterator, List, Union
 
 from s1.records import RecordSpec, RepeatedBlock, RecordType
-from s1.records.registry import spec_from_record_id
-from s1.exceptions import UnknownRecordType
-
-SEP = "|"
+from s1.records.base import SEP
 
 
 def splat(line: str) -> List[str]:
@@ -51,23 +48,29 @@ def parse_line_with_spec(line: str, spec: RecordSpec) -> RecordType:
     to look like.
     """
     data_fields = splat(line)
-    spec.validate_number_of_fields(len(data_fields))
     if data_fields[0] != spec.record_id:
+        spec.validate_number_of_fields(len(data_fields))
         raise ValueError()
-    record: RecordType = {}
-    record.update(dict(zip(spec.all_static_field_names, data_fields)))
-    if spec.repeated_block:
-        # Take the rest of the repeated fields, which we know cleanly
-        # fall into the number of fields in the repeated block
-        repeated_fields = islice(data_fields, spec.num_static_fields, None)
-        record[spec.repeated_block.key_name] = build_repeated_objects(
-            repeated_fields, spec.repeated_block
-        )
+    # The spec's compiled decoder checks the field count and builds the record
+    return spec.decode(data_fields)
+
 
-    return record
+def fields_from_line(line: str) -> List[str]:
+    """ Split a line once, so the record id and values come from one pass """
+    data_fields = splat(line)
+    if len(data_fields) == 1:
+        raise ValueError(f"An S1 line must contain at least one {SEP}")
+    return data_fields
 
 
 def record_id_from_line(line: str) -> str:
-    if SEP not in line:
+    position = line.find(SEP)
+    if position < 0:
         raise ValueError(f"An S1 line must contain at least one {SEP}")
-    return line.split(SEP, maxsplit=1)[0]
+    return line[:position]
+
+
+def line_record_id(line: str) -> str:
+    """ The record id of a line, empty when the line has no separator, for
+    reporting a bad line """
+    return line.split(SEP, 1)[0] if SEP in line else ""
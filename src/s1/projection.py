@@ -0,0 +1,75 @@
+""" Parse only the record types, and fields, that are wanted
+
+A projection maps record ids to the names of the fields to keep, or to None
+to keep every field of that record type:
+
+    projection = {"100": [PROVIDER_ID, PCN, "statement_from_date"],
+                  "400": ["revenue_code", "units", "charges"]}
+    parser = S1Parser(projection=projection)
+
+Lines of other record types are skipped right after their record id is read:
+they are counted, and headers still start a new encounter, but they are
+never split, validated or built, so data such as the 600 record's PII never
+makes it into memory. Lines of projected types are validated in full, but
+records only get the fields named (plus `record_id`), and a repeated block
+only if some of its fields are named. Field names can be static or repeated
+block fields. """
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from s1.records import RecordSpec
+from s1.records.base import COMPACT_RECORDS, DICT_RECORDS
+from s1.records.compact import compile_compact_decoder
+from s1.records.registry import default_registry, spec_from_record_id
+
+# Record id -> names of the fields to keep, None for all of them
+ProjectionFields = Mapping[str, Optional[List[str]]]
+
+
+class Projection:
+    def __init__(self, fields: ProjectionFields, registry=None):
+        self.fields = dict(fields)
+        self.registry = default_registry if registry is None else registry
+        for record_id, names in self.fields.items():
+            try:
+                spec = spec_from_record_id(record_id, self.registry)
+            except KeyError:
+                raise ValueError(
+                    f"Can't project unknown record id '{record_id}'"
+                )
+            # Raises for field names the spec doesn't have
+            spec.picked_fields(names)
+        self.record_ids = frozenset(self.fields)
+        # Whether some record type keeps only some of its fields
+        self.has_field_lists = any(
+            names is not None for names in self.fields.values()
+        )
+        self._decoders: Dict[Tuple[str, str], Callable[[List[str]], Any]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Projected decoders are compiled again when first needed
+        state = self.__dict__.copy()
+        state["_decoders"] = {}
+        return state
+
+    def includes(self, record_id: str) -> bool:
+        return record_id in self.record_ids
+
+    def decoder(
+        self, spec: RecordSpec, record_mode: str = DICT_RECORDS
+    ) -> Callable[[List[str]], Any]:
+        """ The decoder building the projected fields of `spec`'s records """
+        names = self.fields[spec.record_id]
+        if names is None:
+            return spec.decoder(record_mode)
+        decoder = self._decoders.get((spec.record_id, record_mode))
+        if decoder is None:
+            if record_mode == DICT_RECORDS:
+                decoder = spec.compile_decoder(names)
+            elif record_mode == COMPACT_RECORDS:
+                decoder = compile_compact_decoder(spec, names)
+            else:
+                raise ValueError(
+                    f"Fields can't be projected in '{record_mode}' mode"
+                )
+            self._decoders[spec.record_id, record_mode] = decoder
+        return decoder
@@ -1,2 +1,4 @@
-from .base import RecordSet, RecordSpec, RecordType, RepeatedBlock
+from .base import Record, RecordSet, RecordSpec, RecordType, RepeatedBlock
+from .compact import CompactRecord
+from .lazy import LazyRecord
 from .registry import register_record_spec, spec_from_record_id
@@ -1,22 +1,104 @@
-from typing import Dict, List, Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from dataclasses import dataclass, field
 
 from s1.exceptions import InvalidFieldLength
+from s1.records.compact import CompactRecord, compile_compact_decoder
+from s1.records.intern import InternTable, intern_table
+
+if TYPE_CHECKING:  # pragma: no cover
+    from s1.records.lazy import LazyRecord
+
+# Fields of an S1 line are separated by
+SEP = "|"
 
 
 @dataclass
 class RepeatedBlock:
     key_name: str
     fields: List[str]
+    # Low-cardinality fields whose values are deduplicated, see s1.records.intern
+    interned_fields: List[str] = field(default_factory=list)
+    # Field name -> one of FIELD_TYPES, for opt-in conversion, see s1.typed
+    field_types: Dict[str, str] = field(default_factory=dict)
 
     def __post_init__(self):
         self.num_fields = len(self.fields)
+        self.interners = _interners(self.fields, self.interned_fields)
+        _check_field_types(self.fields, self.field_types)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Intern tables are per process, the unpickled block finds its own
+        state = self.__dict__.copy()
+        del state["interners"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.interners = _interners(self.fields, self.interned_fields)
 
 
 # Records are dictionaries, which str keys, that point to str values or in Lists of Dicts
 # with str values and str keys
 RecordType = Dict[str, Union[str, List[Dict[str, str]]]]
 
+# Parsers can hold records in one of these representations
+DICT_RECORDS = "dict"
+COMPACT_RECORDS = "compact"
+LAZY_RECORDS = "lazy"
+RECORD_MODES = (DICT_RECORDS, COMPACT_RECORDS, LAZY_RECORDS)
+
+Record = Union[RecordType, CompactRecord, "LazyRecord"]
+
+# Types fields can be annotated with. Values always parse as strings; only the
+# typed columns of `ColumnarS1Parser(typed=True)` are converted, see s1.typed
+INTEGER = "integer"
+DECIMAL = "decimal"
+# MMDDYYYY
+DATE = "date"
+FIELD_TYPES = (INTEGER, DECIMAL, DATE)
+
+# (position, table) for each interned field
+Interners = List[Tuple[int, InternTable]]
+
+
+def _interners(names: List[str], interned: List[str]) -> Interners:
+    unknown = set(interned) - set(names)
+    if unknown:
+        raise ValueError(f"Can't intern unknown fields {sorted(unknown)}")
+    return [
+        (position, intern_table(name))
+        for position, name in enumerate(names)
+        if name in interned
+    ]
+
+
+def _check_field_types(names: List[str], field_types: Dict[str, str]) -> None:
+    unknown = set(field_types) - set(names)
+    if unknown:
+        raise ValueError(f"Can't type unknown fields {sorted(unknown)}")
+    for name, field_type in field_types.items():
+        if field_type not in FIELD_TYPES:
+            raise ValueError(
+                f"Field '{name}' has type '{field_type}', "
+                f"expected one of {FIELD_TYPES}"
+            )
+
+
+def _dict_display(picked: List[Tuple[int, str]], offset: str) -> str:
+    """ Source for a dict literal mapping each (i, name) pair's name to
+    `fields[offset + i]` """
+    items = ", ".join(f"{name!r}: fields[{offset}{i}]" for i, name in picked)
+    return "{" + items + "}"
+
 
 @dataclass
 class RecordSpec:
@@ -24,8 +106,15 @@ class RecordSpec:
     static_fields: List[str]
     denotes_new_set: bool = False
     repeated_block: Optional[RepeatedBlock] = None
+    # Low-cardinality fields whose values are deduplicated, see s1.records.intern
+    interned_fields: List[str] = field(default_factory=list)
+    # Field name -> one of FIELD_TYPES, for opt-in conversion, see s1.typed
+    field_types: Dict[str, str] = field(default_factory=dict)
     num_static_fields: int = field(init=False)
     num_repeat_fields: int = field(init=False)
+    decode: Callable[[List[str]], RecordType] = field(
+        init=False, repr=False, compare=False
+    )
 
     def __post_init__(self):
         # static fields are what's defined plus the spot for record_id
@@ -34,6 +123,180 @@ class RecordSpec:
             len(self.repeated_block.fields) if self.repeated_block else 0
         )
         self.all_static_field_names = ["record_id"] + self.static_fields
+        self.field_positions = {
+            name: position
+            for position, name in enumerate(self.all_static_field_names)
+        }
+        _check_field_types(self.all_static_field_names, self.field_types)
+        self.configure_decoders()
+
+    def configure_decoders(self) -> None:
+        self.interners = _interners(
+            self.all_static_field_names, self.interned_fields
+        )
+        self.has_interned_fields = bool(self.interners) or bool(
+            self.repeated_block and self.repeated_block.interners
+        )
+        self.decode = self.compile_decoder()
+        self._compact_decode: Optional[Callable[[List[str]], Any]] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Generated decoders can't be pickled; they're compiled again on load
+        state = self.__dict__.copy()
+        for name in ("decode", "_compact_decode", "interners"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.configure_decoders()
+
+    def set_interned_fields(self, names: List[str]) -> None:
+        """ Intern the given static and repeated block fields from now on,
+        replacing whatever was configured """
+        block = self.repeated_block
+        block_fields = block.fields if block else []
+        unknown = (
+            set(names) - set(self.all_static_field_names) - set(block_fields)
+        )
+        if unknown:
+            raise ValueError(f"Can't intern unknown fields {sorted(unknown)}")
+        self.interned_fields = [
+            name for name in names if name in self.field_positions
+        ]
+        if block is not None:
+            block.interned_fields = [
+                name for name in names if name in block_fields
+            ]
+            block.interners = _interners(block.fields, block.interned_fields)
+        self.configure_decoders()
+
+    def decoder(
+        self, record_mode: str = DICT_RECORDS
+    ) -> Callable[[List[str]], Any]:
+        """ The decoder building records from split fields in the given
+        representation (lazy records start from the unsplit line instead, see
+        `LazyRecord.from_line`)
+
+        Decoders for the opt-in representations are only compiled when first
+        asked for. """
+        if record_mode == DICT_RECORDS:
+            return self.decode
+        if record_mode == COMPACT_RECORDS:
+            if self._compact_decode is None:
+                self._compact_decode = compile_compact_decoder(self)
+            return self._compact_decode
+        raise ValueError(f"Unknown record mode '{record_mode}'")
+
+    def intern_fields(self, fields: List[str]) -> None:
+        """ Swap the values of interned fields, in place, for shared copies
+
+        `fields` must already have a valid length. """
+        for position, table in self.interners:
+            value = fields[position]
+            fields[position] = table.values.setdefault(value, value)
+            if len(table.values) > table.max_size:
+                table.evict()
+        block = self.repeated_block
+        if block is not None and block.interners:
+            stride = self.num_repeat_fields
+            for offset, table in block.interners:
+                # Every entry's value for this field, as one extended slice
+                first = self.num_static_fields + offset
+                fields[first::stride] = table.intern_many(fields[first::stride])
+
+    def picked_fields(
+        self, names: Optional[List[str]] = None
+    ) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]]]:
+        """ The (position, name) of the static fields, and of the repeated
+        block's fields, that are among `names` (all of them for None)
+
+        The record id is always picked. """
+        block_fields = self.repeated_block.fields if self.repeated_block else []
+        if names is not None:
+            unknown = (
+                set(names)
+                - set(self.all_static_field_names)
+                - set(block_fields)
+            )
+            if unknown:
+                raise ValueError(
+                    f"Record type '{self.record_id}' has no fields "
+                    f"{sorted(unknown)}"
+                )
+        static = [
+            (position, name)
+            for position, name in enumerate(self.all_static_field_names)
+            if names is None or name in names or position == 0
+        ]
+        block = [
+            (position, name)
+            for position, name in enumerate(block_fields)
+            if names is None or name in names
+        ]
+        return static, block
+
+    def compile_decoder(
+        self, names: Optional[List[str]] = None
+    ) -> Callable[[List[str]], RecordType]:
+        """ Build a function converting an already-split line into a record
+
+        Everything the generic parsing path would look up on the spec for
+        each line is resolved once here. The decoder's source is generated
+        (the same trick `dataclasses` uses) so static fields are unpacked by
+        index into a dict display, and each repeated block is cut out of the
+        remaining fields with a fixed stride. The field count only goes
+        through `validate_number_of_fields` when it doesn't fit, so the error
+        raised stays the same. Interning is only called for specs that have
+        interned fields.
+
+        Given `names`, records only get those fields (and the record id); the
+        others are never built, and the repeated block is left out if none of
+        its fields are named. The whole line is still validated. """
+        n_static, stride = self.num_static_fields, self.num_repeat_fields
+        intern = "    intern(fields)\n" if self.has_interned_fields else ""
+        picked_static, picked_block = self.picked_fields(names)
+        static = _dict_display(picked_static, "")
+        if self.repeated_block and not picked_block:
+            source = (
+                "def decode(fields):\n"
+                "    n_fields = len(fields)\n"
+                f"    if n_fields < {n_static} or "
+                f"(n_fields - {n_static}) % {stride}:\n"
+                "        validate(n_fields)\n"
+                f"{intern}"
+                f"    return {static}\n"
+            )
+        elif self.repeated_block:
+            block = _dict_display(picked_block, "start + ")
+            source = (
+                "def decode(fields):\n"
+                "    n_fields = len(fields)\n"
+                f"    if n_fields < {n_static} or "
+                f"(n_fields - {n_static}) % {stride}:\n"
+                "        validate(n_fields)\n"
+                f"{intern}"
+                f"    record = {static}\n"
+                f"    record[{self.repeated_block.key_name!r}] = [\n"
+                f"        {block}\n"
+                f"        for start in range({n_static}, n_fields, {stride})\n"
+                "    ]\n"
+                "    return record\n"
+            )
+        else:
+            source = (
+                "def decode(fields):\n"
+                f"    if len(fields) != {n_static}:\n"
+                "        validate(len(fields))\n"
+                f"{intern}"
+                f"    return {static}\n"
+            )
+        namespace: Dict[str, Callable] = {
+            "validate": self.validate_number_of_fields,
+            "intern": self.intern_fields,
+        }
+        exec(source, namespace)
+        return namespace["decode"]
 
     def validate_number_of_fields(self, n_fields: int) -> None:
         """ The number of fields expected in a line is the length of static
@@ -70,18 +333,26 @@ class RecordSpec:
 class RecordSet:
     """ Encounters capture a contiguous set of records """
 
-    records: List[RecordType] = field(default_factory=list)
+    records: List[Record] = field(default_factory=list)
+    # Set by tolerant parsers when some of the encounter's lines were rejected
+    flagged: bool = False
+    # Length of the lines the records were parsed from, as counted by parsers
+    num_bytes: int = field(default=0, compare=False)
 
     @property
     def is_empty(self):
         return len(self.records) == 0
 
-    def add_record(self, record: RecordType) -> None:
+    def add_record(self, record: Record) -> None:
         self.records.append(record)
 
     def as_dict(self) -> Dict[str, RecordType]:
         serialized = {}
-        for record in self.records:
+        for stored in self.records:
+            # Compact and lazy records serialize to the same dicts
+            record: RecordType = (
+                stored if isinstance(stored, dict) else stored.as_dict()
+            )
             # Unfortunately we have to appease the mypy gods here
             # (or better type our Records, which gets real hard real fast)
             # the isinstance tells mypy that the value from `record_id` must
@@ -0,0 +1,166 @@
+""" Tuple-backed records, an opt-in alternative to one dict per record
+
+For each RecordSpec (and its RepeatedBlock) a `namedtuple`-based class is
+generated, so a record costs one tuple instead of a dict plus its keys, while
+fields stay readable by name and `as_dict()` gives back the usual dict.
+
+Generated classes can't be found by name, so records pickle as their class's
+name, fields and values, and unpickling looks the class up (or generates it)
+in the same cache `compact_class` uses. """
+from collections import namedtuple
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from s1.records.base import RecordSpec
+
+
+class CompactRecord:
+    """ Mixed into every generated record class """
+
+    __slots__ = ()
+    _fields: tuple
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            name: [entry.as_dict() for entry in value]
+            if isinstance(value, list)
+            else value
+            for name, value in zip(self._fields, self)  # type: ignore
+        }
+
+    def __reduce__(self) -> Any:
+        return (
+            _rebuild,
+            (type(self).__name__, self._fields, tuple(self)),  # type: ignore
+        )
+
+
+# (class name, fields) -> generated class
+_classes: Dict[Tuple[str, Tuple[str, ...]], type] = {}
+
+
+def compact_class(name: str, fields: List[str]) -> type:
+    key = (name, tuple(fields))
+    record_class = _classes.get(key)
+    if record_class is None:
+        base = namedtuple("_" + name, fields)  # type: ignore
+        record_class = type(name, (base, CompactRecord), {"__slots__": ()})
+        _classes[key] = record_class
+    return record_class
+
+
+def _rebuild(name: str, fields: Tuple[str, ...], values: tuple) -> Any:
+    return tuple.__new__(compact_class(name, list(fields)), values)
+
+
+def compile_compact_decoder(
+    spec: "RecordSpec", names: Optional[List[str]] = None
+) -> Callable[[List[str]], CompactRecord]:
+    """ Like `RecordSpec.compile_decoder`, building compact records """
+    if names is not None:
+        return compile_projected_compact_decoder(spec, names)
+    n_static, stride = spec.num_static_fields, spec.num_repeat_fields
+    validate = spec.validate_number_of_fields
+    intern = spec.intern_fields if spec.has_interned_fields else None
+    new = tuple.__new__
+    block = spec.repeated_block
+
+    if not block:
+        record_class = compact_class(
+            f"Record{spec.record_id}", spec.all_static_field_names
+        )
+
+        def decode_static(fields: List[str]) -> CompactRecord:
+            if len(fields) != n_static:
+                validate(len(fields))
+            if intern is not None:
+                intern(fields)
+            return new(record_class, fields)  # type: ignore
+
+        return decode_static
+
+    record_class = compact_class(
+        f"Record{spec.record_id}",
+        spec.all_static_field_names + [block.key_name],
+    )
+    entry_class = compact_class(f"Record{spec.record_id}Entry", block.fields)
+
+    def decode_repeated(fields: List[str]) -> CompactRecord:
+        n_fields = len(fields)
+        if n_fields < n_static or (n_fields - n_static) % stride:
+            validate(n_fields)
+        if intern is not None:
+            intern(fields)
+        entries: List[Any] = [
+            new(entry_class, fields[start : start + stride])
+            for start in range(n_static, n_fields, stride)
+        ]
+        values: List[Any] = fields[:n_static]
+        values.append(entries)
+        return new(record_class, values)  # type: ignore
+
+    return decode_repeated
+
+
+def picker(positions: List[int]) -> Callable[[List[str]], Tuple[str, ...]]:
+    """ A function taking the values at `positions` out of a list """
+    if len(positions) == 1:
+        (position,) = positions
+        return lambda fields: (fields[position],)
+    return itemgetter(*positions)  # type: ignore
+
+
+def compile_projected_compact_decoder(
+    spec: "RecordSpec", names: List[str]
+) -> Callable[[List[str]], CompactRecord]:
+    """ A compact decoder building only the fields in `names` (and the record
+    id), see `RecordSpec.compile_decoder` """
+    n_static, stride = spec.num_static_fields, spec.num_repeat_fields
+    validate = spec.validate_number_of_fields
+    intern = spec.intern_fields if spec.has_interned_fields else None
+    new = tuple.__new__
+    block = spec.repeated_block
+    picked_static, picked_block = spec.picked_fields(names)
+    pick_static = picker([position for position, _ in picked_static])
+    static_names = [name for _, name in picked_static]
+    name = f"Record{spec.record_id}Projected"
+
+    if not block or not picked_block:
+        record_class = compact_class(name, static_names)
+
+        def decode_static(fields: List[str]) -> CompactRecord:
+            n_fields = len(fields)
+            if n_fields != n_static and (
+                not block
+                or n_fields < n_static
+                or (n_fields - n_static) % stride
+            ):
+                validate(n_fields)
+            if intern is not None:
+                intern(fields)
+            return new(record_class, pick_static(fields))  # type: ignore
+
+        return decode_static
+
+    record_class = compact_class(name, static_names + [block.key_name])
+    entry_class = compact_class(
+        f"{name}Entry", [name for _, name in picked_block]
+    )
+    pick_entry = picker([position for position, _ in picked_block])
+
+    def decode_repeated(fields: List[str]) -> CompactRecord:
+        n_fields = len(fields)
+        if n_fields < n_static or (n_fields - n_static) % stride:
+            validate(n_fields)
+        if intern is not None:
+            intern(fields)
+        entries: List[Any] = [
+            new(entry_class, pick_entry(fields[start : start + stride]))
+            for start in range(n_static, n_fields, stride)
+        ]
+        values: List[Any] = list(pick_static(fields))
+        values.append(entries)
+        return new(record_class, values)  # type: ignore
+
+    return decode_repeated
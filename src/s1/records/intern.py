@@ -0,0 +1,68 @@
+""" Bounded dedup tables for low-cardinality fields
+
+Splitting a line creates a new string for every field, so a batch of parsed
+records holds one copy of a provider id or revenue code per line it appears
+on. Fields named in a spec's (or repeated block's) `interned_fields` are
+passed through an `InternTable` instead, which hands back the first copy of
+each value it has seen.
+
+There is one table per field name, shared by every spec using that name. A
+table holds about `max_size` values; when a line takes it past that, the
+oldest values are dropped down to half of it, so a field with more distinct
+values than expected costs some churn but never pins an unbounded number of
+strings. """
+from itertools import islice
+from typing import Dict, List
+
+DEFAULT_MAX_SIZE = 4096
+
+
+class InternTable:
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.values: Dict[str, str] = {}
+
+    def __call__(self, value: str) -> str:
+        shared = self.values.setdefault(value, value)
+        if len(self.values) > self.max_size:
+            self.evict()
+        return shared
+
+    def intern_many(self, values: List[str]) -> List[str]:
+        shared = list(map(self.values.setdefault, values, values))
+        if len(self.values) > self.max_size:
+            self.evict()
+        return shared
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def evict(self) -> None:
+        """ Drop the oldest values, in insertion order, down to half the
+        table's size """
+        stale = list(islice(self.values, len(self.values) - self.max_size // 2))
+        for value in stale:
+            del self.values[value]
+
+
+_tables: Dict[str, InternTable] = {}
+
+
+def intern_table(field_name: str) -> InternTable:
+    """ The table shared by every field called `field_name` """
+    table = _tables.get(field_name)
+    if table is None:
+        table = _tables[field_name] = InternTable()
+    return table
+
+
+def set_intern_table_size(field_name: str, max_size: int) -> None:
+    """ Resize the table for `field_name`, which specs already hold on to """
+    if max_size < 1:
+        raise ValueError("max_size must be at least 1")
+    table = intern_table(field_name)
+    table.max_size = max_size
+    if len(table) > max_size:
+        table.evict()
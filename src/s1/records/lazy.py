@@ -0,0 +1,73 @@
+""" Records that keep their raw line and decode fields on first access
+
+A lazy record reads like the dict `parse_line_with_spec` would build, but
+holds only the line it came from. The line is split the first time a field is
+read, and a repeated block's list of dicts is only built (and then cached)
+when that block is read, so consumers touching a few fields skip most of the
+work and buffered batches hold one string per line. """
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+from s1.records.base import SEP
+
+if TYPE_CHECKING:  # pragma: no cover
+    from s1.records.base import RecordSpec
+
+
+class LazyRecord(Mapping):
+    __slots__ = ("spec", "line", "_fields", "_repeated")
+
+    def __init__(self, spec: "RecordSpec", line: str):
+        self.spec = spec
+        self.line = line
+        self._fields: Optional[List[str]] = None
+        self._repeated: Optional[List[Dict[str, str]]] = None
+
+    def __reduce__(self) -> Any:
+        # Just the line; fields are split again when read
+        return (LazyRecord, (self.spec, self.line))
+
+    @classmethod
+    def from_line(cls, spec: "RecordSpec", line: str) -> "LazyRecord":
+        """ Counting separators is enough to validate the line up front """
+        spec.validate_number_of_fields(line.count(SEP) + 1)
+        return cls(spec, line)
+
+    @property
+    def fields(self) -> List[str]:
+        if self._fields is None:
+            fields = self.line.split(SEP)
+            if self.spec.has_interned_fields:
+                self.spec.intern_fields(fields)
+            self._fields = fields
+        return self._fields
+
+    def __getitem__(self, key: str) -> Any:
+        spec = self.spec
+        position = spec.field_positions.get(key)
+        if position is not None:
+            return self.fields[position]
+        block = spec.repeated_block
+        if block is None or key != block.key_name:
+            raise KeyError(key)
+        if self._repeated is None:
+            fields, stride = self.fields, spec.num_repeat_fields
+            self._repeated = [
+                dict(zip(block.fields, fields[start : start + stride]))
+                for start in range(spec.num_static_fields, len(fields), stride)
+            ]
+        return self._repeated
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.spec.all_static_field_names
+        if self.spec.repeated_block:
+            yield self.spec.repeated_block.key_name
+
+    def __len__(self) -> int:
+        return self.spec.num_static_fields + bool(self.spec.repeated_block)
+
+    def __repr__(self) -> str:
+        return f"LazyRecord({self.line!r})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
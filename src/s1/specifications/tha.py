@@ -4,11 +4,28 @@
 See https://docs.google.com/document/d/1mp1lG1nkHwiMVZt3ZaClzzKc-bJ0dSNuhi2m04EljP8/ """
 
 
+from typing import Dict, List
+
 from s1.records import RecordSpec, RepeatedBlock, register_record_spec
+from s1.records.base import DATE, DECIMAL, INTEGER
 
 PROVIDER_ID = "provider_id"
 PCN = "patient_control_number"
 
+# Fields with few distinct values, by record id, see `intern_low_cardinality_fields`.
+# Single character codes (POA flags, patient sex) are left out, since Python
+# already shares one object per single character string.
+LOW_CARDINALITY_FIELDS: Dict[str, List[str]] = {
+    "100": [PROVIDER_ID],
+    "200": [PROVIDER_ID],
+    "300": [PROVIDER_ID],
+    "400": [PROVIDER_ID, "revenue_code", "unit_measurement_code"],
+    "500": [PROVIDER_ID, "designation"],
+    "600": [PROVIDER_ID],
+    "700": [PROVIDER_ID, "role"],
+    "800": [PROVIDER_ID],
+}
+
 Header100 = RecordSpec(
     record_id="100",
     static_fields=[
@@ -35,6 +52,13 @@ Header100 = RecordSpec(
         "hour_of_discharge",
     ],
     denotes_new_set=True,
+    field_types={
+        "statement_from_date": DATE,
+        "statement_through_date": DATE,
+        "date_of_admission": DATE,
+        "date_of_discharge": DATE,
+        "patient_age": INTEGER,
+    },
 )
 
 Procedures200 = RecordSpec(
@@ -49,7 +73,9 @@ Procedures200 = RecordSpec(
     repeated_block=RepeatedBlock(
         key_name="other_procedures",
         fields=["procedure_code", "procedure_date", "procedure_physician_npi"],
+        field_types={"procedure_date": DATE},
     ),
+    field_types={"principal_procedure_date": DATE},
 )
 
 Diagnoses300 = RecordSpec(
@@ -111,6 +137,13 @@ RevenueCodes400 = RecordSpec(
             "hcpcs_modifier_3",
             "hcpcs_modifier_4",
         ],
+        field_types={
+            "rate": DECIMAL,
+            "units": INTEGER,
+            "date_of_service": DATE,
+            "charges": DECIMAL,
+            "noncovered_charges": DECIMAL,
+        },
     ),
 )
 
@@ -140,6 +173,7 @@ Supplemental600 = RecordSpec(
         "patient_date_of_birth",
         "patient_ssn",
     ],
+    field_types={"patient_date_of_birth": DATE},
 )
 
 Physician700 = RecordSpec(
@@ -320,6 +354,10 @@ OccurrencesAndValues800 = RecordSpec(
         "value_code_24",
         "value_code_amount_24",
     ],
+    field_types={
+        **{f"occurrence_code_date_{n}": DATE for n in range(1, 25)},
+        **{f"value_code_amount_{n}": DECIMAL for n in range(1, 25)},
+    },
 )
 
 
@@ -334,3 +372,11 @@ all_specs = [
     Physician700,
     OccurrencesAndValues800,
 ]
+
+
+def intern_low_cardinality_fields() -> None:
+    """ Intern the `LOW_CARDINALITY_FIELDS` of the THA specs
+
+    This trades some parsing speed for smaller batches, so it's opt-in. """
+    for spec in all_specs:
+        spec.set_interned_fields(LOW_CARDINALITY_FIELDS[spec.record_id])
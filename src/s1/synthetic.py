@@ -0,0 +1,82 @@
+""" Deterministic synthetic S1 data, generated from RecordSpecs
+
+Used by the benchmarks (and handy in tests) to produce realistic-looking THA
+files of any size. Every encounter gets one line per spec, in spec order,
+with the header's provider id and a unique patient control number repeated on
+each line. Values are shaped after their field names (dates, amounts, counts
+or codes), and the number of entries in each repeated block is drawn
+uniformly from a configurable range per record id. The same arguments always
+produce the same lines. """
+import random
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from s1.records import RecordSpec
+from s1.records.base import SEP
+from s1.specifications.tha import PCN, PROVIDER_ID, all_specs as all_tha_specs
+
+# (min, max) entries per repeated block, by record id
+DEFAULT_REPEATS: Dict[str, Tuple[int, int]] = {
+    "200": (0, 6),
+    "300": (0, 12),
+    "400": (1, 40),
+    "500": (1, 3),
+    "700": (1, 4),
+}
+DEFAULT_REPEAT_RANGE = (0, 4)
+
+CODE_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ0123456789"
+
+
+def fake_value(rng: random.Random, name: str) -> str:
+    if "date" in name:
+        return f"{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}{rng.randint(2015, 2020)}"
+    if "charges" in name or "rate" in name or "amount" in name:
+        return f"{rng.randint(0, 250000) / 100:.2f}"
+    if "units" in name or "age" in name:
+        return str(rng.randint(0, 99))
+    if name.endswith("poa"):
+        return rng.choice("YNUW")
+    return "".join(rng.choice(CODE_CHARS) for _ in range(rng.randint(1, 8)))
+
+
+def fake_line(
+    rng: random.Random,
+    spec: RecordSpec,
+    keys: Dict[str, str],
+    repeats: Tuple[int, int],
+) -> str:
+    values = [spec.record_id]
+    for name in spec.static_fields:
+        values.append(keys[name] if name in keys else fake_value(rng, name))
+    if spec.repeated_block:
+        for _ in range(rng.randint(*repeats)):
+            for name in spec.repeated_block.fields:
+                values.append(fake_value(rng, name))
+    return SEP.join(values)
+
+
+def generate_lines(
+    n_encounters: int,
+    seed: int = 0,
+    repeats: Optional[Dict[str, Tuple[int, int]]] = None,
+    specs: Sequence[RecordSpec] = all_tha_specs,
+    n_providers: int = 20,
+) -> Iterator[str]:
+    """ Yield the lines (without line endings) of `n_encounters` encounters """
+    rng = random.Random(seed)
+    ranges = dict(DEFAULT_REPEATS, **(repeats or {}))
+    providers = [f"{rng.randint(100000, 999999)}" for _ in range(n_providers)]
+    for index in range(n_encounters):
+        keys = {PROVIDER_ID: rng.choice(providers), PCN: f"PCN{index:09d}"}
+        for spec in specs:
+            spec_range = ranges.get(spec.record_id, DEFAULT_REPEAT_RANGE)
+            yield fake_line(rng, spec, keys, spec_range)
+
+
+def write_file(path: str, n_encounters: int, **kwargs) -> int:
+    """ Write a synthetic S1 file, returning its size in bytes """
+    size = 0
+    with open(path, "w", newline="\n") as fobj:
+        for line in generate_lines(n_encounters, **kwargs):
+            size += fobj.write(line + "\n")
+    return size
@@ -0,0 +1,135 @@
+""" Opt-in conversion of typed columns
+
+Every value of an S1 line parses as a string. Fields annotated with a type in
+their spec's `field_types` (or their repeated block's) can instead be
+converted a whole column at a time, once `ColumnarS1Parser(typed=True)` has
+built a batch: integers to int64, decimals to decimal128 and MMDDYYYY dates
+to date32. Decimals keep their exact value, to `DECIMAL_SCALE` places, where
+float64 would round amounts such as 0.1. The work happens in pyarrow's
+compute kernels rather than in a Python loop over values, so the typed
+columns come out as pyarrow arrays.
+
+Empty values become nulls. Values that don't parse as their type become nulls
+too, as do integers outside int64's range and decimals with more digits than
+decimal128 holds at that scale, and are reported as `BadValue`s so nothing is
+lost silently. Requires pyarrow. """
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from s1.columnar import ENCOUNTER_INDEX, ColumnBatch
+from s1.records.base import DATE, DECIMAL, INTEGER
+
+INTEGER_PATTERN = r"^[+-]?\d+$"
+# Decimals are exact to DECIMAL_SCALE places, leaving the rest of
+# DECIMAL_PRECISION's digits for the integer part
+DECIMAL_PRECISION = 38
+DECIMAL_SCALE = 4
+DECIMAL_PATTERN = r"^[+-]?0*(\d{1,34}(\.\d{0,4})?|\.\d{1,4})$"
+DATE_PATTERN = r"^\d{8}$"
+DATE_FORMAT = "%m%d%Y"
+# The digits of int64's bounds, which longer integers can't fit in
+INT64_MAX_DIGITS = str(2 ** 63 - 1)
+INT64_MIN_DIGITS = str(2 ** 63)
+
+
+@dataclass
+class BadValue:
+    table: str
+    field_name: str
+    # Position of the encounter in the file, counting from zero
+    encounter: int
+    value: str
+
+
+def fits_int64(strings: Any) -> Any:
+    """ Whether each integer string is within int64's range, compared as
+    strings of digits since an overflowing cast raises rather than nulls """
+    import pyarrow.compute as compute
+
+    digits = compute.replace_substring_regex(strings, r"^[+-]?0*", "")
+    length = compute.utf8_length(digits)
+    limit = compute.if_else(
+        compute.starts_with(strings, "-"), INT64_MIN_DIGITS, INT64_MAX_DIGITS
+    )
+    n_digits = len(INT64_MAX_DIGITS)
+    return compute.or_(
+        compute.less(length, n_digits),
+        compute.and_(
+            compute.equal(length, n_digits), compute.less_equal(digits, limit)
+        ),
+    )
+
+
+def convert_column(values: List[str], field_type: str) -> Any:
+    """ A pyarrow array of `values` converted to `field_type`, with nulls
+    where a value is empty or doesn't parse """
+    import pyarrow
+    import pyarrow.compute as compute
+
+    strings = pyarrow.array(values, pyarrow.string())
+    if field_type == DATE:
+        valid = compute.match_substring_regex(strings, DATE_PATTERN)
+        candidates = compute.if_else(valid, strings, None)
+        timestamps = compute.strptime(
+            candidates, format=DATE_FORMAT, unit="s", error_is_null=True,
+        )
+        # strptime rolls days over (02302019 is March 2nd), so only keep
+        # dates whose day is still the one written
+        written_day = compute.utf8_slice_codeunits(candidates, 2, 4)
+        exact = compute.equal(
+            compute.day(timestamps), compute.cast(written_day, pyarrow.int64())
+        )
+        return compute.if_else(exact, timestamps, None).cast(pyarrow.date32())
+    if field_type == INTEGER:
+        valid = compute.and_(
+            compute.match_substring_regex(strings, INTEGER_PATTERN),
+            fits_int64(strings),
+        )
+        # The cast takes a leading minus but not a leading plus
+        unsigned = compute.replace_substring_regex(strings, r"^\+", "")
+        return compute.if_else(valid, unsigned, None).cast(pyarrow.int64())
+    if field_type == DECIMAL:
+        # Trailing zeros past the decimal point don't count against the scale
+        trimmed = compute.replace_substring_regex(
+            strings, r"(\.\d*?)0+$", r"\1"
+        )
+        valid = compute.match_substring_regex(trimmed, DECIMAL_PATTERN)
+        # The cast checks the values behind nulls too, so bad values are
+        # swapped for zero until it's done
+        decimals = compute.if_else(valid, trimmed, "0").cast(
+            pyarrow.decimal128(DECIMAL_PRECISION, DECIMAL_SCALE)
+        )
+        return compute.if_else(valid, decimals, None)
+    raise ValueError(f"Unknown field type '{field_type}'")
+
+
+def convert_batch(
+    batch: ColumnBatch, field_types: Dict[str, str], first_encounter: int = 0
+) -> List[BadValue]:
+    """ Replace the typed columns of `batch`, in place, returning the
+    non-empty values that couldn't be converted
+
+    `first_encounter` is the position in the file of the batch's first
+    encounter. """
+    import pyarrow.compute as compute
+
+    bad_values: List[BadValue] = []
+    for name, field_type in field_types.items():
+        values = batch.columns.get(name)
+        if values is None:
+            continue
+        converted = convert_column(values, field_type)
+        if converted.null_count:
+            for row in compute.indices_nonzero(converted.is_null()).to_pylist():
+                if values[row]:
+                    bad_values.append(
+                        BadValue(
+                            batch.name,
+                            name,
+                            first_encounter
+                            + batch.columns[ENCOUNTER_INDEX][row],
+                            values[row],
+                        )
+                    )
+        batch.columns[name] = converted
+    return bad_values
@@ -1,3 +1,7 @@
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from s1.exceptions import (
     InvalidS1Format,
     UnknownRecordType,
@@ -5,11 +9,87 @@ from s1.exceptions import (
     InvalidS1Line,
 )
 
+from s1.records import RecordSpec
+from s1.records.base import SEP
 from s1.records.registry import spec_from_record_id
-from s1.parsing import record_id_from_line, parse_line_with_spec
+from s1.parsing import parse_line_with_spec, record_id_from_line, splat
+from s1.compression import detect_compression, open_s1
+from s1.parsers.parallel import DEFAULT_CHUNK_BYTES, ByteRange, map_byte_ranges
+from s1.projection import Projection, ProjectionFields
+from s1.reader import SEP_BYTES, MappedS1Reader, RawLineReader
+
+
+@dataclass
+class LineError:
+    """ Where and why a line failed validation """
+
+    line_number: int
+    offset: int
+    kind: str
+    record_id: str
+    message: str = ""
+
+
+@dataclass
+class ValidationReport:
+    total_lines: int = 0
+    # Lines seen per record id, for the record ids that are known
+    record_counts: Dict[str, int] = field(default_factory=Counter)
+    # Failed lines per kind of error
+    error_counts: Dict[str, int] = field(default_factory=Counter)
+    errors: List[LineError] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.error_counts
+
+    def add_error(self, error: LineError, max_errors: Optional[int]) -> None:
+        self.error_counts[error.kind] += 1
+        if max_errors is None or len(self.errors) < max_errors:
+            self.errors.append(error)
+
+    def extend(
+        self, other: "ValidationReport", max_errors: Optional[int]
+    ) -> None:
+        """ Add the report of the lines following this report's lines """
+        lines_before = self.total_lines
+        self.total_lines += other.total_lines
+        # Both are Counters, so updating adds the counts up
+        self.record_counts.update(other.record_counts)
+        self.error_counts.update(other.error_counts)
+        for error in other.errors:
+            if max_errors is not None and len(self.errors) >= max_errors:
+                break
+            self.errors.append(
+                replace(error, line_number=lines_before + error.line_number)
+            )
 
 
 class S1Validator:
+    """ Validates lines without accumulating them
+
+    By default each line is fully parsed and the result thrown away. With
+    `fast=True` only the separators are counted and checked against the
+    spec's field count rules, which catches the same errors without
+    building any records.
+
+    With a `projection` (see `s1.projection`), lines of the record types it
+    leaves out are only checked for a known record id, and the lines that are
+    parsed only build the projected fields. """
+
+    def __init__(
+        self, fast: bool = False, projection: Optional[ProjectionFields] = None
+    ):
+        self.fast = fast
+        self.projection: Optional[Projection] = None
+        if projection is not None:
+            self.projection = Projection(projection)
+
+    def excludes(self, spec: RecordSpec) -> bool:
+        return self.projection is not None and not self.projection.includes(
+            spec.record_id
+        )
+
     def validate(self, line: str) -> None:
         try:
             record_id = record_id_from_line(line)
@@ -21,8 +101,145 @@ class S1Validator:
             raise UnknownRecordType(
                 f"Encountered unknown record id of '{record_id}'"
             )
+        if self.excludes(spec):
+            return
         try:
-            # Tossing away this data, but catching field length errors
-            parse_line_with_spec(line, spec)
+            if self.fast:
+                spec.validate_number_of_fields(line.count(SEP) + 1)
+            elif self.projection is None:
+                # Tossing away this data, but catching field length errors
+                parse_line_with_spec(line, spec)
+            else:
+                self.projection.decoder(spec)(splat(line))
         except InvalidFieldLength:
             raise InvalidS1Line()
+
+    def validate_file(
+        self,
+        path: str,
+        encoding: str = "utf-8",
+        max_errors: Optional[int] = None,
+        workers: Optional[int] = None,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    ) -> ValidationReport:
+        """ Validate every line of a file, reporting instead of raising
+
+        Uncompressed files are read from a memory map, compressed ones are
+        decompressed on a background thread (see `s1.compression`), in which
+        case offsets are positions in the decompressed data. In fast mode
+        lines are checked as raw bytes and never decoded. At most `max_errors`
+        errors are kept in the report, though all of them are counted.
+
+        With more than one worker, an uncompressed file is cut into ranges of
+        about `chunk_bytes` that are validated in a process pool. """
+        if workers is not None and workers > 1:
+            if detect_compression(path) is None:
+                return self.validate_file_parallel(
+                    path, encoding, max_errors, workers, chunk_bytes
+                )
+        with open_s1(path, encoding) as reader:
+            return self.validate_raw_lines(
+                reader, reader.iter_raw_lines(), max_errors
+            )
+
+    def validate_file_parallel(
+        self,
+        path: str,
+        encoding: str,
+        max_errors: Optional[int],
+        workers: int,
+        chunk_bytes: int,
+    ) -> ValidationReport:
+        report = ValidationReport()
+        for range_report in map_byte_ranges(
+            validate_byte_range,
+            path,
+            self.fast,
+            max_errors,
+            None if self.projection is None else self.projection.fields,
+            workers=workers,
+            chunk_bytes=chunk_bytes,
+            encoding=encoding,
+        ):
+            report.extend(range_report, max_errors)
+        return report
+
+    def validate_raw_lines(
+        self,
+        reader: RawLineReader,
+        raw_lines: Iterable[Tuple[int, bytes]],
+        max_errors: Optional[int] = None,
+    ) -> ValidationReport:
+        """ Validate (byte offset, line) pairs found by `reader` """
+        report = ValidationReport()
+        encoding = reader.encoding
+        for line_number, (offset, line) in enumerate(raw_lines, start=1):
+            report.total_lines += 1
+            if SEP_BYTES not in line:
+                error = LineError(
+                    line_number,
+                    offset,
+                    InvalidS1Format.__name__,
+                    "",
+                    "Does not contain S1 separator",
+                )
+                report.add_error(error, max_errors)
+                continue
+            try:
+                spec = reader.spec_for_line(line)
+            except UnknownRecordType as exc:
+                record_id = line.split(SEP_BYTES, 1)[0]
+                error = LineError(
+                    line_number,
+                    offset,
+                    UnknownRecordType.__name__,
+                    record_id.decode(encoding, errors="replace"),
+                    str(exc),
+                )
+                report.add_error(error, max_errors)
+                continue
+            report.record_counts[spec.record_id] += 1
+            if self.excludes(spec):
+                continue
+            try:
+                if self.fast:
+                    spec.validate_number_of_fields(line.count(SEP_BYTES) + 1)
+                elif self.projection is None:
+                    reader.decode_line(line, spec)
+                else:
+                    fields = line.decode(encoding).split(SEP)
+                    self.projection.decoder(spec)(fields)
+            except InvalidFieldLength as exc:
+                error = LineError(
+                    line_number,
+                    offset,
+                    InvalidS1Line.__name__,
+                    spec.record_id,
+                    str(exc),
+                )
+                report.add_error(error, max_errors)
+            except UnicodeDecodeError as exc:
+                error = LineError(
+                    line_number,
+                    offset,
+                    UnicodeDecodeError.__name__,
+                    spec.record_id,
+                    str(exc),
+                )
+                report.add_error(error, max_errors)
+        return report
+
+
+def validate_byte_range(
+    path: str,
+    byte_range: ByteRange,
+    encoding: str,
+    fast: bool,
+    max_errors: Optional[int],
+    projection: Optional[ProjectionFields] = None,
+) -> ValidationReport:
+    """ Validate one range of a file, run within a worker process """
+    with MappedS1Reader(path, encoding) as reader:
+        return S1Validator(fast, projection).validate_raw_lines(
+            reader, reader.iter_raw_lines(*byte_range), max_errors
+        )
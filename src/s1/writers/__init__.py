@@ -0,0 +1 @@
+from .ndjson import NDJSONWriter
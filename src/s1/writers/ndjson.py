@@ -0,0 +1,93 @@
+""" Stream encounters to newline-delimited JSON
+
+Each `RecordSet` is serialized on its own, as the dict `as_dict()` returns,
+and appended to a reusable byte buffer that is written out whenever it grows
+past `buffer_size`. Nothing beyond the encounter being serialized and that
+buffer is held. orjson is used when installed, the stdlib `json` otherwise. """
+import io
+import json
+from typing import IO, Any, Callable, Iterable, Optional
+
+from s1.records import RecordSet
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+ORJSON = "orjson"
+STDLIB_JSON = "json"
+
+
+def _dumps_stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def json_encoder(backend: Optional[str] = None) -> Callable[[Any], bytes]:
+    """ An encoder producing UTF-8 JSON bytes, preferring orjson """
+    if backend is None:
+        backend = ORJSON if orjson is not None else STDLIB_JSON
+    if backend == ORJSON:
+        if orjson is None:
+            raise ValueError(
+                "The orjson backend requires orjson to be installed"
+            )
+        return orjson.dumps  # type: ignore
+    if backend == STDLIB_JSON:
+        return _dumps_stdlib
+    raise ValueError(f"Unknown JSON backend '{backend}'")
+
+
+class NDJSONWriter:
+    """ Writes one encounter per line to a binary (or text) file object
+
+        with open("out.ndjson", "wb") as fobj, NDJSONWriter(fobj) as writer:
+            writer.write_all(parser.iter_encounters(lines))
+    """
+
+    def __init__(
+        self,
+        fobj: IO,
+        backend: Optional[str] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        self.fobj = fobj
+        self.encode = json_encoder(backend)
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.total_sets: int = 0
+        self._text = isinstance(fobj, io.TextIOBase)
+
+    def __enter__(self) -> "NDJSONWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def write(self, encounter: RecordSet) -> None:
+        buffer = self.buffer
+        buffer += self.encode(encounter.as_dict())
+        buffer += b"\n"
+        self.total_sets += 1
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, encounters: Iterable[RecordSet]) -> int:
+        """ Write every encounter, returning how many were written """
+        written = self.total_sets
+        for encounter in encounters:
+            self.write(encounter)
+        self.flush()
+        return self.total_sets - written
+
+    def flush(self) -> None:
+        if self.buffer:
+            if self._text:
+                self.fobj.write(self.buffer.decode("utf-8"))
+            else:
+                self.fobj.write(self.buffer)
+            # Keeps the allocation around for the next encounters
+            del self.buffer[:]
+        self.fobj.flush()
@@ -0,0 +1,107 @@
+""" Write column batches to Parquet, one dataset per table
+
+Each table `ColumnarS1Parser` flushes (a record type, or a repeated block's
+child table) goes to its own Parquet file in the output directory, e.g.
+"100.parquet" and "400.revenue_codes.parquet". Every flush becomes one row
+group, so memory stays bounded by the parser's batch size however big the
+file is. Tables get the schema `ColumnBatch.arrow_schema` gives them, so a
+table that is empty in the first flush still matches the ones that follow.
+Requires pyarrow.
+
+Within a batch `encounter_index` and `row_index` are positions in that batch;
+the writer offsets them by what it has already written so they stay unique,
+and joinable, across the whole dataset. """
+import os
+from typing import Any, Dict, Iterable
+
+import pyarrow
+import pyarrow.compute as compute
+import pyarrow.parquet
+
+from s1.columnar import ENCOUNTER_INDEX, ROW_INDEX, CHILD_SEP, ColumnBatch
+from s1.parsers.columnar import ColumnBatches
+
+PARQUET_SUFFIX = ".parquet"
+
+
+class ParquetWriter:
+    def __init__(self, directory: str, compression: str = "snappy"):
+        self.directory = directory
+        self.compression = compression
+        self.writers: Dict[str, Any] = {}
+        self.rows_written: Dict[str, int] = {}
+        self.total_sets: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self) -> "ParquetWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def path_for(self, table_name: str) -> str:
+        return os.path.join(self.directory, table_name + PARQUET_SUFFIX)
+
+    def to_table(self, batch: ColumnBatch) -> Any:
+        return self.offset_table(batch.name, batch.to_arrow())
+
+    def offset_table(self, name: str, table: Any) -> Any:
+        """ `table` with its index columns offset by what was already written """
+        table = table.set_column(
+            table.schema.get_field_index(ENCOUNTER_INDEX),
+            ENCOUNTER_INDEX,
+            compute.add(table.column(ENCOUNTER_INDEX), self.total_sets),
+        )
+        if ROW_INDEX in table.column_names:
+            parent = name.split(CHILD_SEP, 1)[0]
+            table = table.set_column(
+                table.schema.get_field_index(ROW_INDEX),
+                ROW_INDEX,
+                compute.add(
+                    table.column(ROW_INDEX), self.rows_written.get(parent, 0)
+                ),
+            )
+        return table
+
+    def write(self, batches: ColumnBatches) -> None:
+        """ Write one flush of `ColumnarS1Parser` as a row group per table """
+        self.write_tables(
+            {name: batch.to_arrow() for name, batch in batches.items()}
+        )
+
+    def write_tables(self, tables: Dict[str, Any]) -> None:
+        """ Like `write`, for a flush already converted to `pyarrow.Table`s
+        (as `ParallelS1Parser.iter_tables` gives them) """
+        offset = {
+            name: self.offset_table(name, table)
+            for name, table in tables.items()
+        }
+        for name, table in offset.items():
+            writer = self.writers.get(name)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(
+                    self.path_for(name),
+                    table.schema,
+                    compression=self.compression,
+                )
+                self.writers[name] = writer
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))
+        for name, table in tables.items():
+            self.rows_written[name] = (
+                self.rows_written.get(name, 0) + table.num_rows
+            )
+        last_encounters = [
+            compute.max(table.column(ENCOUNTER_INDEX)).as_py()
+            for table in tables.values()
+            if table.num_rows
+        ]
+        self.total_sets += 1 + max(last_encounters, default=-1)
+
+    def write_all(self, batches: Iterable[ColumnBatches]) -> None:
+        for batch in batches:
+            self.write(batch)
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
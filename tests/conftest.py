@@ -72,6 +72,21 @@ def tha_lines():
     ]
 
 
+@fixture
+def tha_text(tha_lines):
+    """ Builds the text of `n_encounters` copies of the THA encounter, told
+    apart by their patient control numbers: PCN<first>, PCN<first + 1>... """
+
+    def text(n_encounters, first=0, line_ending="\n"):
+        return "".join(
+            line.replace("|PCN|", f"|PCN{i}|") + line_ending
+            for i in range(first, first + n_encounters)
+            for line in tha_lines
+        )
+
+    return text
+
+
 @fixture
 def tha_encounter():
     """ This fixture is derived from the above lines """
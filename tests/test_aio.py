@@ -0,0 +1,48 @@
+import asyncio
+
+from s1 import AsyncS1Parser
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def collect(async_iterator):
+    return [item async for item in async_iterator]
+
+
+async def chunked(data, size):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_async_parser_stream_reader(tha_text, tha_encounter):
+    async def parse():
+        reader = asyncio.StreamReader()
+        reader.feed_data(tha_text(3, line_ending="\r\n").encode())
+        reader.feed_eof()
+        return await collect(
+            AsyncS1Parser(chunk_size=100).iter_encounters(reader)
+        )
+
+    encounters = run(parse())
+
+    assert len(encounters) == 3
+    revenue = encounters[0].as_dict()["400"]
+    assert revenue["revenue_codes"] == tha_encounter["400"]["revenue_codes"]
+
+
+def test_async_parser_batches_from_chunks(tha_lines, tha_text):
+    parser = AsyncS1Parser()
+    # Odd sized chunks and no final line ending
+    data = tha_text(5, line_ending="\r\n").encode().rstrip()
+
+    batches = run(collect(parser.iter_batches(chunked(data, 77), batch_size=2)))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert parser.total_lines == 5 * len(tha_lines)
+    assert parser.total_sets == 5
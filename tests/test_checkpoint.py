@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+
+from s1 import S1Parser
+from s1.checkpoint import Checkpoint
+from s1.synthetic import generate_lines
+
+
+@pytest.fixture(params=["plain", "gzip"])
+def s1_file(request, tmp_path):
+    data = "\n".join(generate_lines(25)).encode() + b"\n"
+    if request.param == "plain":
+        path = tmp_path / "data.s1"
+        path.write_bytes(data)
+    else:
+        path = tmp_path / "data.s1.gz"
+        path.write_bytes(gzip.compress(data))
+    return str(path)
+
+
+def pcns(batches):
+    return [
+        encounter.records[0]["patient_control_number"]
+        for batch in batches
+        for encounter in batch
+    ]
+
+
+def test_checkpointed_run_completes(s1_file):
+    parser = S1Parser()
+    batches = list(parser.iter_checkpointed(s1_file, batch_size=10))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    checkpoint = Checkpoint.load(s1_file + ".checkpoint")
+    assert checkpoint.complete
+    assert (checkpoint.total_lines, checkpoint.total_sets) == (200, 25)
+    # There is nothing left to resume
+    assert list(S1Parser().iter_checkpointed(s1_file)) == []
+
+
+def test_resume_after_failure(s1_file):
+    expected = pcns([list(S1Parser().iter_file(s1_file))])
+
+    batches = S1Parser().iter_checkpointed(s1_file, batch_size=7)
+    done = [next(batches), next(batches)]
+    # The job dies while handling the third batch
+    next(batches)
+    del batches
+
+    checkpoint = Checkpoint.load(s1_file + ".checkpoint")
+    assert (checkpoint.total_lines, checkpoint.total_sets) == (112, 14)
+    parser = S1Parser()
+    resumed = list(parser.iter_checkpointed(s1_file, batch_size=7))
+
+    assert pcns(done) + pcns(resumed) == expected
+    assert (parser.total_lines, parser.total_sets) == (200, 25)
+
+
+def test_resume_refuses_changed_file(tmp_path):
+    path = tmp_path / "data.s1"
+    path.write_text("\n".join(generate_lines(5)) + "\n")
+    batches = S1Parser().iter_checkpointed(str(path), batch_size=2)
+    next(batches)
+    next(batches)
+    del batches
+
+    with open(path, "a") as fobj:
+        fobj.write("\n".join(generate_lines(1)) + "\n")
+
+    with pytest.raises(ValueError):
+        list(S1Parser().iter_checkpointed(str(path)))
@@ -0,0 +1,149 @@
+import json
+
+import pytest
+
+from s1.cli import main
+from s1.synthetic import write_file
+
+
+@pytest.fixture
+def s1_file(tmp_path):
+    path = str(tmp_path / "data.s1")
+    write_file(path, 50)
+    return path
+
+
+def test_validate(s1_file, capsys):
+    assert main(["validate", s1_file, "--fast"]) == 0
+
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["total_lines"] == 400
+    assert summary["is_valid"]
+
+
+def test_validate_reports_errors(tmp_path, capsys):
+    path = tmp_path / "bad.s1"
+    path.write_text("100|a\n999|b\nnope\n")
+
+    assert main(["validate", str(path)]) == 1
+
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("line 1 (offset 0): InvalidS1Line '100'")
+    assert json.loads(out[-1])["error_counts"] == {
+        "InvalidS1Line": 1,
+        "UnknownRecordType": 1,
+        "InvalidS1Format": 1,
+    }
+
+
+def test_parse_to_ndjson(s1_file, tmp_path):
+    output = str(tmp_path / "out.ndjson")
+
+    assert main(["parse", s1_file, "-o", output, "--batch-size", "7"]) == 0
+
+    with open(output) as fobj:
+        encounters = [json.loads(line) for line in fobj]
+    assert len(encounters) == 50
+    assert encounters[0]["100"]["patient_control_number"] == "PCN000000000"
+
+
+def test_parse_with_workers_match(s1_file, tmp_path):
+    outputs = []
+    for workers in ("1", "2"):
+        output = tmp_path / f"out{workers}.ndjson"
+        assert (
+            main(["parse", s1_file, "-o", str(output), "--workers", workers])
+            == 0
+        )
+        outputs.append(output.read_bytes())
+
+    assert outputs[0] == outputs[1]
+
+
+@pytest.mark.parametrize("command", ["parse", "convert"])
+def test_bad_line_fails_the_same_with_workers(
+    s1_file, tmp_path, capsys, command
+):
+    if command == "convert":
+        pytest.importorskip("pyarrow")
+    with open(s1_file, "a") as fobj:
+        fobj.write("999|x|y\n")
+    errors = []
+    for workers in ("1", "2"):
+        output = str(tmp_path / f"out{workers}")
+        args = (
+            [command, s1_file, "-o", output]
+            if command == "parse"
+            else [command, s1_file, output,]
+        )
+        assert main(args + ["--workers", workers]) == 2
+        errors.append(capsys.readouterr().err)
+
+    assert errors[0] == errors[1]
+    assert errors[0].startswith(
+        "s1: error: UnknownRecordType at line 401 (record id '999')"
+    )
+
+
+def test_stats_with_workers_match(s1_file, capsys):
+    main(["stats", s1_file])
+    single = json.loads(capsys.readouterr().out)
+    main(["stats", s1_file, "--workers", "2"])
+    parallel = json.loads(capsys.readouterr().out)
+
+    for key in ("total_lines", "total_sets", "lines_by_type", "bytes_by_type"):
+        assert single[key] == parallel[key]
+    assert single["total_sets"] == 50
+
+
+def test_profile_prints_stages(s1_file, tmp_path, capsys):
+    main(["parse", s1_file, "-o", str(tmp_path / "out.ndjson"), "--profile"])
+
+    err = capsys.readouterr().err
+    assert "split" in err and "write" in err and "total" in err
+
+
+def test_convert(s1_file, tmp_path):
+    pytest.importorskip("pyarrow")
+    output = str(tmp_path / "columns")
+
+    assert main(["convert", s1_file, output, "--workers", "2"]) == 0
+
+
+def test_convert_with_workers_match(s1_file, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    for workers in ("1", "2"):
+        output = str(tmp_path / f"columns{workers}")
+        assert main(["convert", s1_file, output, "--workers", workers]) == 0
+
+    for name in ("100", "400", "400.revenue_codes"):
+        single = pq.read_table(str(tmp_path / "columns1" / f"{name}.parquet"))
+        parallel = pq.read_table(str(tmp_path / "columns2" / f"{name}.parquet"))
+        assert parallel.equals(single)
+
+
+def test_convert_typed(s1_file, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = tmp_path / "columns"
+
+    assert main(["convert", s1_file, str(output), "--typed"]) == 0
+
+    charges = pq.read_table(str(output / "400.revenue_codes.parquet"))
+    assert str(charges.schema.field("charges").type) == "decimal128(38, 4)"
+    assert str(charges.schema.field("revenue_code").type) == "string"
+
+
+def test_diff(s1_file, tmp_path, capsys):
+    with open(s1_file) as fobj:
+        lines = fobj.read().splitlines()
+    changed = tmp_path / "changed.s1"
+    changed.write_text("\n".join(lines[8:]) + "\n")
+
+    assert main(["diff", s1_file, str(changed)]) == 0
+
+    captured = capsys.readouterr()
+    rows = [json.loads(line) for line in captured.out.splitlines()]
+    assert [(row["change"], row["patient_control_number"]) for row in rows] == [
+        ("removed", "PCN000000000")
+    ]
+    assert json.loads(captured.err)["unchanged"] == 49
@@ -0,0 +1,76 @@
+import pytest
+
+from s1 import ColumnarS1Parser
+from s1.columnar import ENCOUNTER_INDEX, ROW_INDEX
+
+
+def test_columnar_tha(tha_lines, tha_encounter):
+    parser = ColumnarS1Parser()
+    for line in tha_lines:
+        parser.feed(line)
+
+    parser.finish()
+    batches = parser.flush()
+
+    header = batches["100"]
+    assert header.num_rows == 1
+    assert header.columns[ENCOUNTER_INDEX] == [0]
+    for name, value in tha_encounter["100"].items():
+        assert header.columns[name] == [value]
+
+    revenue_codes = batches["400.revenue_codes"]
+    assert revenue_codes.num_rows == 3
+    assert revenue_codes.columns[ROW_INDEX] == [0, 0, 0]
+    assert revenue_codes.columns["revenue_code"] == ["0123", "0124", "0001"]
+    assert batches["400"].columns["patient_control_number"] == ["PCN"]
+    assert "revenue_codes" not in batches["400"].columns
+
+
+def test_columnar_encounter_and_row_index(parser_specs, repeat_spec):
+    parser = ColumnarS1Parser()
+    lines = ["1|1|1", "2|a|b|c|d|e|f|g", "1|2|2", "2|h|i|j", "2|k|l|m|n|o"]
+    for line in lines:
+        parser.feed(line)
+    parser.finish()
+
+    batches = parser.flush()
+
+    assert batches["1"].columns[ENCOUNTER_INDEX] == [0, 1]
+    assert batches["2"].columns[ENCOUNTER_INDEX] == [0, 1, 1]
+    assert batches["2"].columns["a"] == ["a", "h", "k"]
+    repeats = batches["2.repeats"]
+    assert repeats.columns[ENCOUNTER_INDEX] == [0, 0, 1]
+    assert repeats.columns[ROW_INDEX] == [0, 0, 2]
+    assert repeats.columns["d"] == ["d", "f", "n"]
+    assert repeats.columns["e"] == ["e", "g", "o"]
+
+
+def test_columnar_iter_batches(parser_specs):
+    parser = ColumnarS1Parser(batch_size=2)
+    lines = ["1|1|1", "1|2|2", "2|x|x", "1|3|3"]
+
+    batches = list(parser.iter_batches(lines))
+
+    assert [batch["1"].num_rows for batch in batches] == [2, 1]
+    assert batches[0]["2"].columns[ENCOUNTER_INDEX] == [1]
+    assert parser.total_sets == 3
+
+
+def test_column_batch_to_arrow(tha_lines):
+    pyarrow = pytest.importorskip("pyarrow")
+    parser = ColumnarS1Parser()
+    (batches,) = parser.iter_batches(tha_lines)
+
+    table = batches["400.revenue_codes"].to_arrow()
+
+    assert table.num_rows == 3
+    assert table.column("charges").type == pyarrow.string()
+
+
+def test_columnar_iter_batches_by_bytes(parser_specs):
+    lines = ["1|1|1", "2|2|2", "2|2|2", "1|3|3", "1|4|4", "1|5|5"]
+    parser = ColumnarS1Parser(max_batch_bytes=10)
+
+    batches = list(parser.iter_batches(lines))
+
+    assert [batch["1"].num_rows for batch in batches] == [1, 2, 1]
@@ -0,0 +1,100 @@
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from s1 import S1Parser, S1Validator
+from s1.compression import (
+    BZ2,
+    GZIP,
+    XZ,
+    ZSTD,
+    ReadAheadS1Reader,
+    detect_compression,
+    open_s1,
+)
+from s1.reader import MappedS1Reader
+
+OPENERS = {GZIP: gzip.open, BZ2: bz2.open, XZ: lzma.open}
+
+
+@pytest.fixture(params=sorted(OPENERS))
+def compressed_file(request, tmp_path, tha_lines):
+    path = tmp_path / "tha.s1.compressed"
+    with OPENERS[request.param](str(path), "wb") as fobj:
+        fobj.write(b"\r\n".join(line.encode() for line in tha_lines * 3))
+    return request.param, str(path)
+
+
+def test_detect_compression(compressed_file, tmp_path):
+    compression, path = compressed_file
+    assert detect_compression(path) == compression
+
+    plain = tmp_path / "plain.s1"
+    plain.write_text("100|a|b\n")
+    assert detect_compression(str(plain)) is None
+
+
+def test_read_ahead_lines_and_offsets(compressed_file, tha_lines):
+    _, path = compressed_file
+    # Chunks this small split lines, and a short queue keeps the thread waiting
+    with ReadAheadS1Reader(path, chunk_size=7, read_ahead=2) as reader:
+        raw_lines = list(reader.iter_raw_lines())
+
+    assert [line.decode() for _, line in raw_lines] == tha_lines * 3
+    offset = 0
+    for (line_offset, line) in raw_lines:
+        assert line_offset == offset
+        offset += len(line) + 2
+
+
+def test_read_ahead_close_early(compressed_file):
+    _, path = compressed_file
+    with ReadAheadS1Reader(path, chunk_size=7, read_ahead=1) as reader:
+        next(iter(reader))
+    assert not reader._thread.is_alive()
+
+
+def test_read_ahead_raises_errors_from_thread(tmp_path):
+    path = tmp_path / "truncated.s1.gz"
+    path.write_bytes(gzip.compress(b"100|a|b\n" * 100)[:-10])
+
+    with ReadAheadS1Reader(str(path)) as reader:
+        with pytest.raises(EOFError):
+            list(reader)
+
+
+def test_open_s1_plain_file_is_mapped(tmp_path):
+    path = tmp_path / "plain.s1"
+    path.write_text("100|a|b\n")
+    with open_s1(str(path)) as reader:
+        assert isinstance(reader, MappedS1Reader)
+
+
+def test_parser_iter_file(compressed_file, tha_encounter):
+    _, path = compressed_file
+    encounters = list(S1Parser().iter_file(path))
+
+    assert len(encounters) == 3
+    assert encounters[0].as_dict() == tha_encounter
+
+
+def test_validate_compressed_file(compressed_file):
+    _, path = compressed_file
+    report = S1Validator(fast=True).validate_file(path)
+
+    assert report.is_valid
+    assert report.total_lines == 24
+
+
+def test_zstd(tmp_path, tha_lines):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "tha.s1.zst"
+    path.write_bytes(
+        zstandard.ZstdCompressor().compress("\n".join(tha_lines).encode())
+    )
+
+    assert detect_compression(str(path)) == ZSTD
+    with open_s1(str(path)) as reader:
+        assert list(reader) == tha_lines
@@ -0,0 +1,133 @@
+import io
+import json
+
+import pytest
+
+from s1 import S1Parser
+from s1.deadletter import DeadLetterWriter
+
+LINES = [
+    "1|1|1\n",
+    "2|2|2\n",
+    "1|3|3\n",
+    "nope|x\n",
+    "2|4\n",
+    "1|5|5\n",
+    "2|6|6\n",
+]
+
+
+def test_tolerant_parser_keeps_partial_encounters(parser_specs):
+    dead_letters = []
+    parser = S1Parser(dead_letters=dead_letters.append)
+
+    encounters = list(parser.iter_encounters(LINES))
+
+    assert [len(encounter.records) for encounter in encounters] == [2, 1, 2]
+    assert not any(encounter.flagged for encounter in encounters)
+    assert parser.total_lines == 5
+    assert parser.rejected_lines == 2
+    unknown, too_short = dead_letters
+    assert (unknown.line_number, unknown.offset) == (4, 18)
+    assert unknown.record_id == "nope"
+    assert unknown.reason.startswith("UnknownRecordType")
+    assert (too_short.line_number, too_short.offset) == (5, 25)
+    assert too_short.record_id == "2"
+    assert too_short.reason.startswith("InvalidFieldLength")
+
+
+def test_iter_file_offsets_are_byte_offsets(parser_specs, tmp_path):
+    path = tmp_path / "data.s1"
+    data = "".join(line.replace("\n", "\r\n") for line in LINES).encode()
+    path.write_bytes(data)
+    dead_letters = []
+    parser = S1Parser(dead_letters=dead_letters.append)
+
+    encounters = list(parser.iter_file(str(path)))
+
+    assert len(encounters) == 3
+    assert [dead_letter.offset for dead_letter in dead_letters] == [
+        data.index(b"nope|x"),
+        data.index(b"2|4\r"),
+    ]
+
+
+def iter_file(parser, path):
+    return list(parser.iter_file(path))
+
+
+def iter_checkpointed(parser, path):
+    return [
+        encounter
+        for batch in parser.iter_checkpointed(path)
+        for encounter in batch
+    ]
+
+
+@pytest.mark.parametrize("iter_path", [iter_file, iter_checkpointed])
+def test_tolerant_parser_rejects_undecodable_lines(
+    parser_specs, tmp_path, iter_path
+):
+    path = tmp_path / "data.s1"
+    path.write_bytes(b"1|1|1\n2|\xff|2\n1|3|3\n")
+    dead_letters = []
+    parser = S1Parser(dead_letters=dead_letters.append)
+
+    encounters = iter_path(parser, str(path))
+
+    assert [len(encounter.records) for encounter in encounters] == [1, 1]
+    (dead_letter,) = dead_letters
+    assert (dead_letter.line_number, dead_letter.offset) == (2, 6)
+    assert dead_letter.record_id == "2"
+    assert dead_letter.reason.startswith("UnicodeDecodeError")
+
+    # A file of its own, since a checkpointed run of `path` is complete
+    strict_path = tmp_path / "strict.s1"
+    strict_path.write_bytes(path.read_bytes())
+    with pytest.raises(UnicodeDecodeError) as raised:
+        iter_path(S1Parser(), str(strict_path))
+    assert raised.value.line_number == 2
+
+
+def test_tolerant_parser_drops_encounters(parser_specs):
+    parser = S1Parser(
+        dead_letters=lambda dead_letter: None, encounter_policy="drop"
+    )
+
+    encounters = list(parser.iter_encounters(LINES))
+
+    assert [e.records[0]["a"] for e in encounters] == ["1", "5"]
+    assert parser.total_sets == 2
+    assert parser.dropped_sets == 1
+
+
+def test_tolerant_parser_flags_encounters_when_fed(parser_specs):
+    fobj = io.StringIO()
+    parser = S1Parser(
+        dead_letters=DeadLetterWriter(fobj), encounter_policy="flag"
+    )
+
+    for line in LINES:
+        parser.feed(line)
+    parser.finish()
+    encounters = parser.flush()
+
+    assert [encounter.flagged for encounter in encounters] == [
+        False,
+        True,
+        False,
+    ]
+    written = [json.loads(line) for line in fobj.getvalue().splitlines()]
+    assert [entry["line_number"] for entry in written] == [4, 5]
+
+
+def test_parser_without_sink_still_raises(parser_specs):
+    parser = S1Parser()
+
+    with pytest.raises(ValueError):
+        list(parser.iter_encounters(LINES))
+
+
+def test_parser_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        S1Parser(encounter_policy="nope")
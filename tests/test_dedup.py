@@ -0,0 +1,106 @@
+import pytest
+
+from s1 import S1Parser
+from s1.dedup import Deduplicator
+from s1.fingerprint import encounter_key, fingerprint
+from s1.records.base import RECORD_MODES
+from s1.synthetic import generate_lines
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def changed(lines, pcn):
+    """ The lines with the last field of `pcn`'s header replaced """
+    result = list(lines)
+    for index, line in enumerate(result):
+        if line.startswith("100|") and pcn in line:
+            result[index] = line.rsplit("|", 1)[0] + "|CHANGED"
+    return result
+
+
+@pytest.fixture
+def files(tmp_path):
+    lines = list(generate_lines(6))
+    # The first four encounters, then all six with one of them changed
+    head = [line for line in lines if line.split("|")[2] < "PCN000000004"]
+    first = write_lines(tmp_path / "first.s1", head)
+    second = write_lines(tmp_path / "second.s1", changed(lines, "PCN000000002"))
+    return first, second
+
+
+def pcns(encounters):
+    return [encounter_key(encounter)[1][-1] for encounter in encounters]
+
+
+def headers(encounters):
+    return [encounter.records[0] for encounter in encounters]
+
+
+def test_keep_first(tmp_path, files):
+    with Deduplicator(str(tmp_path / "index.db")) as dedup:
+        kept = list(dedup.iter_files(list(files)))
+
+        assert pcns(kept) == ["0", "1", "2", "3", "4", "5"]
+        assert (dedup.total_sets, dedup.dropped_sets) == (10, 4)
+        assert len(dedup) == 6
+
+
+def test_keep_changed(tmp_path, files):
+    with Deduplicator(str(tmp_path / "index.db"), "changed") as dedup:
+        kept = list(dedup.iter_files(list(files)))
+
+    assert pcns(kept) == ["0", "1", "2", "3", "2", "4", "5"]
+    assert list(headers(kept)[4].values())[-1] == "CHANGED"
+
+
+def test_keep_last(tmp_path, files):
+    with Deduplicator(str(tmp_path / "index.db"), "last") as dedup:
+        kept = list(dedup.iter_files(list(files)))
+
+        assert pcns(kept) == ["0", "1", "2", "3", "4", "5"]
+        assert list(headers(kept)[2].values())[-1] == "CHANGED"
+        assert (dedup.total_sets, dedup.kept_sets) == (10, 6)
+        # Only the kept encounters make it into the index
+        assert dedup.stored_fingerprint(encounter_key(kept[2])) == (
+            fingerprint(kept[2])
+        )
+
+
+def test_index_persists_between_runs(tmp_path, files):
+    first, second = files
+    index_path = str(tmp_path / "index.db")
+    with Deduplicator(index_path) as dedup:
+        assert len(list(dedup.iter_files([first]))) == 4
+
+    with Deduplicator(index_path) as dedup:
+        kept = list(dedup.filter(S1Parser().iter_file(second)))
+
+    assert pcns(kept) == ["4", "5"]
+
+
+def test_filter_refuses_keep_last(tmp_path):
+    dedup = Deduplicator(str(tmp_path / "index.db"), "last")
+    with pytest.raises(ValueError):
+        list(dedup.filter([]))
+
+
+def test_unknown_policy(tmp_path):
+    with pytest.raises(ValueError):
+        Deduplicator(str(tmp_path / "index.db"), "newest")
+
+
+def test_fingerprint_is_the_same_in_every_record_mode():
+    lines = list(generate_lines(3))
+    fingerprints = [
+        [
+            fingerprint(encounter)
+            for encounter in S1Parser(record_mode=mode).iter_encounters(lines)
+        ]
+        for mode in RECORD_MODES
+    ]
+
+    assert all(found == fingerprints[0] for found in fingerprints)
+    assert len(set(fingerprints[0])) == 3
@@ -0,0 +1,77 @@
+import gzip
+
+import pytest
+
+from s1.diff import ADDED, CHANGED, REMOVED, UNCHANGED, EncounterDiff
+from s1.synthetic import generate_lines
+
+
+def pcn_of(line):
+    return line.split("|")[2]
+
+
+def encounters_by_pcn(lines):
+    grouped = {}
+    for line in lines:
+        grouped.setdefault(pcn_of(line), []).append(line)
+    return grouped
+
+
+@pytest.fixture
+def files(tmp_path):
+    old = encounters_by_pcn(generate_lines(8))
+    new = dict(old)
+    del new["PCN000000001"]
+    header, *rest = new["PCN000000003"]
+    new["PCN000000003"] = [header.rsplit("|", 1)[0] + "|CHANGED"] + rest
+    new["PCN000000009"] = [
+        line.replace("PCN000000000", "PCN000000009")
+        for line in old["PCN000000000"]
+    ]
+    old_path = tmp_path / "old.s1"
+    old_path.write_text("\n".join(sum(old.values(), [])) + "\n")
+    # Reordered, and compressed
+    new_path = tmp_path / "new.s1.gz"
+    new_lines = sum(reversed(list(new.values())), [])
+    new_path.write_bytes(gzip.compress("\n".join(new_lines).encode()))
+    return str(old_path), str(new_path)
+
+
+def summary(changes):
+    return [(change.kind, change.key[1][-1]) for change in changes]
+
+
+def test_diff_files(files):
+    diff = EncounterDiff()
+    changes = list(diff.iter_file_changes(*files))
+
+    assert sorted(summary(changes)) == [
+        (ADDED, "9"),
+        (CHANGED, "3"),
+        (REMOVED, "1"),
+    ]
+    assert diff.counts == {ADDED: 1, REMOVED: 1, CHANGED: 1, UNCHANGED: 6}
+    changed = next(change for change in changes if change.kind == CHANGED)
+    assert changed.encounter is changed.new
+    assert changed.old.records[0] != changed.new.records[0]
+    removed = next(change for change in changes if change.kind == REMOVED)
+    assert removed.new is None and removed.encounter is removed.old
+
+
+def test_diff_in_key_order_with_spills(files, tmp_path):
+    diff = EncounterDiff(
+        memory_budget=4096, tmpdir=str(tmp_path), include_unchanged=True
+    )
+    changes = list(diff.iter_file_changes(*files))
+
+    keys = [change.key for change in changes]
+    assert keys == sorted(keys)
+    assert len(changes) == 9
+
+
+def test_diff_of_identical_files(files):
+    old, _ = files
+    diff = EncounterDiff()
+
+    assert list(diff.iter_file_changes(old, old)) == []
+    assert diff.counts[UNCHANGED] == 8
@@ -0,0 +1,139 @@
+import random
+
+import pytest
+
+from s1 import S1Parser
+from s1.compression import open_s1
+from s1.grouping import ExternalGrouper, numbered_lines
+from s1.synthetic import generate_lines
+
+
+@pytest.fixture
+def shuffled_lines():
+    lines = list(generate_lines(30, seed=3))
+    shuffled = list(lines)
+    random.Random(0).shuffle(shuffled)
+    return lines, shuffled
+
+
+def by_pcn(encounters):
+    return {
+        encounter.records[0]["patient_control_number"]: encounter.as_dict()
+        for encounter in encounters
+    }
+
+
+@pytest.mark.parametrize("memory_budget", [10 ** 9, 4000])
+def test_grouped_matches_contiguous(shuffled_lines, memory_budget, tmp_path):
+    lines, shuffled = shuffled_lines
+    expected = by_pcn(S1Parser().iter_encounters(lines))
+
+    parser = S1Parser()
+    encounters = list(
+        parser.iter_grouped(shuffled, memory_budget, tmpdir=str(tmp_path))
+    )
+
+    assert by_pcn(encounters) == expected
+    assert all(e.records[0]["record_id"] == "100" for e in encounters)
+    assert parser.total_sets == 30
+    assert parser.total_lines == len(lines)
+
+
+def test_grouper_keeps_file_order_within_encounter():
+    lines = [
+        "200|P|2|x|y|z",
+        "100|P|1" + "|h" * 19,
+        "200|P|1|a|b|c",
+        "100|P|2" + "|h" * 19,
+        "200|P|1|d|e|f",
+    ]
+
+    groups = list(ExternalGrouper().iter_groups(numbered_lines(lines)))
+
+    assert [[line[:7] for _, _, line in group] for group in groups] == [
+        ["100|P|1", "200|P|1", "200|P|1"],
+        ["100|P|2", "200|P|2"],
+    ]
+    assert [(number, offset) for number, offset, _ in groups[0]] == [
+        (2, 13),
+        (3, 58),
+        (5, 116),
+    ]
+
+
+def test_grouper_many_runs_merge_in_passes(shuffled_lines, monkeypatch):
+    monkeypatch.setattr("s1.grouping.MAX_MERGE_WIDTH", 3)
+    lines, shuffled = shuffled_lines
+    grouper = ExternalGrouper(memory_budget=1)
+
+    sorted_lines = [
+        line for _, line in grouper.iter_sorted(numbered_lines(shuffled))
+    ]
+
+    assert sorted(sorted_lines) == sorted(lines)
+    assert len(sorted_lines) == len(lines)
+
+
+def test_grouped_dead_letters():
+    dead_letters = []
+    parser = S1Parser(dead_letters=dead_letters.append)
+    lines = ["100|P|1" + "|h" * 19, "nope", "999|x"]
+
+    encounters = list(parser.iter_grouped(lines))
+
+    assert len(encounters) == 1
+    assert [letter.line for letter in dead_letters] == ["nope", "999|x"]
+
+
+def test_grouped_dead_letters_point_into_the_file(tmp_path):
+    lines = list(generate_lines(2))
+    # An unknown record type, rejected while sorting, and a line too short
+    # for its spec, rejected while parsing its encounter
+    short_line = "|".join(lines[9].split("|")[:4])
+    lines[3:3] = ["999|x"]
+    lines[12:12] = [short_line]
+    path = tmp_path / "data.s1"
+    data = ("\r\n".join(lines) + "\r\n").encode()
+    path.write_bytes(data)
+    dead_letters = []
+    parser = S1Parser(dead_letters=dead_letters.append)
+
+    with open_s1(str(path)) as reader:
+        encounters = list(parser.iter_grouped(reader))
+
+    assert len(encounters) == 2
+    assert [(letter.line_number, letter.offset) for letter in dead_letters] == [
+        (4, data.index(b"999|x")),
+        (13, data.index(short_line.encode() + b"\r")),
+    ]
+
+
+def test_grouped_error_has_the_file_line_number():
+    lines = list(generate_lines(2))
+    lines[12:12] = ["|".join(lines[9].split("|")[:4])]
+
+    with pytest.raises(ValueError) as raised:
+        list(S1Parser().iter_grouped(lines))
+
+    assert raised.value.line_number == 13
+
+
+def test_grouped_rejects_undecodable_lines(tmp_path):
+    lines = [line.encode() for line in generate_lines(2)]
+    lines[9] = lines[9].replace(b"|", b"|\xff", 3)
+    path = tmp_path / "data.s1"
+    data = b"\n".join(lines) + b"\n"
+    path.write_bytes(data)
+    dead_letters = []
+    parser = S1Parser(dead_letters=dead_letters.append)
+
+    with open_s1(str(path)) as reader:
+        encounters = list(parser.iter_grouped(reader))
+
+    assert len(encounters) == 2
+    (dead_letter,) = dead_letters
+    assert (dead_letter.line_number, dead_letter.offset) == (
+        10,
+        data.index(lines[9]),
+    )
+    assert dead_letter.reason.startswith("UnicodeDecodeError")
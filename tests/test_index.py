@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from s1 import S1Parser
+from s1.index import EncounterIndex
+from s1.reader import MappedS1Reader
+
+
+def test_index_lookup_returns_encounter(tmp_path, tha_text):
+    path = str(tmp_path / "tha.s1")
+    with open(path, "w") as fobj:
+        fobj.write(tha_text(10))
+    with MappedS1Reader(path) as reader:
+        expected = list(S1Parser().iter_encounters(reader))[7]
+
+    with EncounterIndex(path).build() as index:
+        assert len(index) == 10
+        (found,) = index.encounters("123456", "PCN7")
+
+    assert found == expected
+
+
+def test_index_reopens_from_sidecar(tmp_path, tha_text):
+    path = str(tmp_path / "tha.s1")
+    with open(path, "w") as fobj:
+        fobj.write(tha_text(3))
+    EncounterIndex(path).build().close()
+
+    with EncounterIndex(path) as index:
+        assert not index.is_stale
+        offsets = index.lookup("123456", "PCN2")
+        assert index.lookup("123456", "missing") == []
+
+    with open(path, "rb") as fobj:
+        data = fobj.read()
+    ((offset, length),) = offsets
+    assert offset + length == len(data)
+    assert data[offset:].startswith(b"100|123456|PCN2|")
+
+
+def test_index_detects_stale_file(tmp_path, tha_text):
+    path = str(tmp_path / "tha.s1")
+    with open(path, "w") as fobj:
+        fobj.write(tha_text(3))
+    index = EncounterIndex(path).build()
+
+    with open(path, "w") as fobj:
+        fobj.write(tha_text(4))
+
+    assert index.is_stale
+    with pytest.raises(ValueError):
+        index.lookup("123456", "PCN1")
+    with pytest.raises(ValueError):
+        index.encounters("123456", "PCN1")
+    index.close()
+
+
+def test_index_requires_build(tmp_path, tha_text):
+    path = str(tmp_path / "tha.s1")
+    with open(path, "w") as fobj:
+        fobj.write(tha_text(3))
+
+    with EncounterIndex(path) as index:
+        with pytest.raises(FileNotFoundError, match="build"):
+            index.lookup("123456", "PCN1")
+
+    assert not os.path.exists(path + ".idx")
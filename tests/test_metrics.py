@@ -0,0 +1,65 @@
+import pytest
+
+from s1 import S1Parser
+from s1.exceptions import UnknownRecordType
+from s1.metrics import STAGES, ParserMetrics
+
+
+def test_metrics_counts(tha_lines):
+    metrics = ParserMetrics()
+    parser = S1Parser(metrics=metrics)
+
+    list(parser.iter_encounters(tha_lines + tha_lines))
+
+    snapshot = metrics.snapshot()
+    assert snapshot["total_lines"] == 16
+    assert snapshot["lines_by_type"]["400"] == 2
+    assert snapshot["bytes_by_type"]["500"] == 2 * len(tha_lines[4])
+    assert snapshot["total_bytes"] == 2 * sum(len(line) for line in tha_lines)
+    assert snapshot["repeated_lengths"]["400"] == {3: 2}
+    assert snapshot["repeated_lengths"]["200"] == {3: 2}
+    assert snapshot["stage_seconds"] == {}
+
+
+@pytest.mark.parametrize("record_mode", ["dict", "lazy"])
+def test_metrics_timing_and_errors(tha_lines, tha_encounter, record_mode):
+    metrics = ParserMetrics(timing=True)
+    parser = S1Parser(record_mode=record_mode, metrics=metrics)
+
+    for line in tha_lines:
+        parser.feed(line)
+    with pytest.raises(UnknownRecordType):
+        parser.feed("nope|a")
+    parser.finish()
+    (encounter,) = parser.flush()
+
+    assert encounter.as_dict() == tha_encounter
+    snapshot = metrics.snapshot()
+    assert snapshot["errors"] == {"UnknownRecordType": 1}
+    assert set(snapshot["stage_seconds"]) == set(STAGES)
+
+
+def test_metrics_callback(tha_lines):
+    pushed = []
+    metrics = ParserMetrics(callback=pushed.append, push_every=3)
+    parser = S1Parser(metrics=metrics)
+
+    list(parser.iter_encounters(tha_lines))
+
+    assert [snapshot["total_lines"] for snapshot in pushed] == [3, 6]
+
+
+def test_metrics_count_bytes_not_characters(tmp_path, tha_lines):
+    lines = [line.replace("PCN", "PCNé") for line in tha_lines]
+    path = tmp_path / "tha.s1"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    n_bytes = sum(len(line.encode("utf-8")) for line in lines)
+    assert n_bytes > sum(len(line) for line in lines)
+
+    from_text = ParserMetrics()
+    list(S1Parser(metrics=from_text).iter_encounters(lines))
+    from_file = ParserMetrics()
+    list(S1Parser(metrics=from_file).iter_file(str(path)))
+
+    assert from_text.total_bytes == from_file.total_bytes == n_bytes
+    assert from_file.bytes_by_type["100"] == len(lines[0].encode("utf-8"))
@@ -0,0 +1,150 @@
+import io
+
+import pytest
+
+from s1 import S1Parser, S1Validator
+from s1.compression import open_s1
+from s1.exceptions import UnknownRecordType
+from s1.parsers.parallel import (
+    ParallelS1Parser,
+    map_byte_ranges,
+    parse_byte_range,
+    split_file,
+)
+from s1.writers import NDJSONWriter
+
+
+def test_split_file_aligns_to_encounters(tmp_path, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+
+    ranges = split_file(str(path), chunk_bytes=1000)
+
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0
+    with open(path, "rb") as fobj:
+        data = fobj.read()
+    assert ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[start:].startswith(b"100|")
+
+
+def test_parallel_parse_matches_serial(tmp_path, tha_lines, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+    with open_s1(str(path)) as lines:
+        expected = list(S1Parser().iter_encounters(lines))
+
+    parser = ParallelS1Parser(workers=2, chunk_bytes=1000)
+    encounters = parser.parse(str(path))
+
+    assert [e.as_dict() for e in encounters] == [e.as_dict() for e in expected]
+    assert parser.total_lines == 20 * len(tha_lines)
+    assert parser.total_sets == 20
+
+
+def consume_until_error(encounters):
+    """ The encounters yielded before the iterator raised, and the error """
+    consumed = []
+    with pytest.raises(UnknownRecordType) as raised:
+        for encounter in encounters:
+            consumed.append(encounter)
+    return consumed, raised.value
+
+
+def test_parallel_parse_raises_in_file_order(tmp_path, tha_lines, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(10) + "999|x|y\n" + tha_text(10, first=10))
+    with open_s1(str(path)) as lines:
+        expected, serial_error = consume_until_error(
+            S1Parser().iter_encounters(lines)
+        )
+
+    parser = ParallelS1Parser(workers=2, chunk_bytes=1000)
+    encounters, error = consume_until_error(parser.iter_encounters(str(path)))
+
+    assert len(split_file(str(path), chunk_bytes=1000)) > 2
+    # Every encounter before the bad line, none after it
+    assert len(encounters) == len(expected) == 9
+    assert [e.as_dict() for e in encounters] == [e.as_dict() for e in expected]
+    assert (
+        error.line_number == serial_error.line_number == 10 * len(tha_lines) + 1
+    )
+    assert error.record_id == serial_error.record_id == "999"
+
+
+def test_parallel_column_batches(tmp_path, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+
+    parser = ParallelS1Parser(workers=2, chunk_bytes=1000)
+    batches = list(parser.iter_column_batches(str(path), batch_size=3))
+
+    assert len(batches) > 1
+    assert sum(batch["100"].num_rows for batch in batches) == 20
+    assert parser.total_sets == 20
+
+
+def test_parallel_validate_file(tmp_path, tha_lines, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+    with open(path, "a") as fobj:
+        fobj.write("100|too|short\n")
+    serial = S1Validator().validate_file(str(path))
+
+    report = S1Validator().validate_file(str(path), workers=2, chunk_bytes=1000)
+
+    assert report == serial
+    assert report.errors[0].line_number == 20 * len(tha_lines) + 1
+
+
+def test_map_byte_ranges_keeps_file_order(tmp_path, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+
+    results = list(
+        map_byte_ranges(
+            parse_byte_range,
+            str(path),
+            workers=2,
+            chunk_bytes=1000,
+            max_pending=1,
+        )
+    )
+
+    assert len(results) == len(split_file(str(path), chunk_bytes=1000))
+    pcns = [
+        encounter.records[0]["patient_control_number"]
+        for result in results
+        for encounter in result.encounters
+    ]
+    assert pcns == [f"PCN{i}" for i in range(20)]
+
+
+def test_parallel_ndjson_matches_serial(tmp_path, tha_text):
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+    out = io.BytesIO()
+    with open_s1(str(path)) as lines, NDJSONWriter(out) as writer:
+        writer.write_all(S1Parser().iter_encounters(lines))
+
+    parser = ParallelS1Parser(workers=2, chunk_bytes=1000)
+    chunks = list(parser.iter_ndjson(str(path)))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == out.getvalue()
+    assert parser.total_sets == 20
+
+
+def test_parallel_tables(tmp_path, tha_text):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "tha.s1"
+    path.write_text(tha_text(20))
+
+    parser = ParallelS1Parser(workers=2, chunk_bytes=1000)
+    tables = list(parser.iter_tables(str(path), batch_size=3))
+
+    assert len(tables) > 1
+    assert sum(flush["100"].num_rows for flush in tables) == 20
+    assert parser.total_sets == 20
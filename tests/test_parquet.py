@@ -0,0 +1,47 @@
+import pytest
+
+from s1 import ColumnarS1Parser
+from s1.synthetic import generate_lines
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from s1.writers.parquet import ParquetWriter  # noqa: E402
+
+
+def test_parquet_writer_row_group_per_flush(tmp_path):
+    lines = list(generate_lines(25, repeats={"400": (2, 2)}))
+    parser = ColumnarS1Parser(batch_size=10)
+
+    with ParquetWriter(str(tmp_path)) as writer:
+        writer.write_all(parser.iter_batches(lines))
+
+    headers = pq.ParquetFile(str(tmp_path / "100.parquet"))
+    assert headers.metadata.num_row_groups == 3
+    header_table = headers.read()
+    assert header_table.column("encounter_index").to_pylist() == list(range(25))
+    assert header_table.column("patient_control_number").to_pylist() == [
+        f"PCN{index:09d}" for index in range(25)
+    ]
+
+    revenue_codes = pq.read_table(str(tmp_path / "400.revenue_codes.parquet"))
+    assert revenue_codes.num_rows == 50
+    assert revenue_codes.column("row_index").to_pylist() == [
+        row for row in range(25) for _ in range(2)
+    ]
+    assert revenue_codes.column("encounter_index").to_pylist()[-1] == 24
+
+
+def test_parquet_writer_schema_of_empty_first_batch(tmp_path):
+    # No revenue codes in the first flush, then two per encounter
+    lines = list(generate_lines(1, repeats={"400": (0, 0)}))
+    lines += list(generate_lines(3, repeats={"400": (2, 2)}))[8:]
+    parser = ColumnarS1Parser(batch_size=1)
+
+    with ParquetWriter(str(tmp_path)) as writer:
+        writer.write_all(parser.iter_batches(lines))
+
+    revenue_codes = pq.read_table(str(tmp_path / "400.revenue_codes.parquet"))
+    assert revenue_codes.num_rows == 4
+    assert str(revenue_codes.schema.field("revenue_code").type) == "string"
+    assert str(revenue_codes.schema.field("row_index").type) == "int64"
+    assert revenue_codes.column("encounter_index").to_pylist() == [1, 1, 2, 2]
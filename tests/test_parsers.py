@@ -1,5 +1,10 @@
+import pickle
+
 import pytest
 
+from s1 import S1Parser
+from s1.exceptions import InvalidFieldLength
+
 
 def test_parser_feed_flush_returns_approprate_sets(
     parser, good_lines, parser_specs
@@ -39,3 +44,112 @@ def test_parser_raises_batch_size_exceeded(parser, good_lines, parser_specs):
     # We should raise after submitting a new record that denotes a new encounter
     with pytest.raises(parser.BatchSizeExceeded):
         parser.feed("1|1|1")
+
+
+def test_parser_iter_encounters_yields_final_encounter(parser, parser_specs):
+    lines = ["1|1|1", "2|2|2", "1|3|3", "2|4|4", "2|5|5"]
+
+    encounters = list(parser.iter_encounters(lines))
+
+    assert [len(encounter.records) for encounter in encounters] == [2, 3]
+    assert parser.total_lines == 5
+    assert parser.total_sets == 2
+    # Nothing is left behind in the buffer or in the current encounter
+    assert parser.buffer_size == 0
+    assert parser.current_encounter.is_empty
+
+
+def test_parser_iter_encounters_is_lazy(parser, parser_specs):
+    lines = iter(["1|1|1", "2|2|2", "1|3|3", "2|4|4"])
+
+    encounters = parser.iter_encounters(lines)
+    first = next(encounters)
+
+    assert len(first.records) == 2
+    # Only the line starting the next encounter was read past the first one
+    assert next(lines) == "2|4|4"
+
+
+def test_parser_iter_batches(parser, parser_specs):
+    lines = ["1|1|1", "1|2|2", "1|3|3", "2|4|4", "1|5|5"]
+
+    batches = list(parser.iter_batches(lines, batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2]
+    assert parser.total_sets == 4
+
+
+def test_parser_raises_batch_bytes_exceeded(parser_specs):
+    parser = S1Parser(max_batch_bytes=10)
+
+    parser.feed("1|1|1")
+    parser.feed("2|2|2")
+    assert parser.buffer_bytes == 0
+
+    # Starting the next encounter buffers the first one's two lines
+    with pytest.raises(parser.BatchSizeExceeded):
+        parser.feed("1|3|3")
+    assert parser.buffer_bytes == 10
+
+    parser.flush()
+    assert parser.buffer_bytes == 0
+
+
+def test_parser_iter_batches_by_bytes(parser, parser_specs):
+    lines = ["1|1|1", "2|2|2", "2|2|2", "1|3|3", "1|4|4", "1|5|5"]
+
+    batches = list(parser.iter_batches(lines, max_batch_bytes=10))
+
+    assert [len(batch) for batch in batches] == [1, 2, 1]
+    assert [sum(e.num_bytes for e in batch) for batch in batches] == [15, 10, 5]
+
+
+def test_parser_compact_records(tha_lines, tha_encounter):
+    parser = S1Parser(record_mode="compact")
+
+    (encounter,) = parser.iter_encounters(tha_lines)
+
+    header = encounter.records[0]
+    assert header.patient_control_number == "PCN"
+    revenue_codes = encounter.records[3].revenue_codes
+    assert [code.revenue_code for code in revenue_codes] == [
+        "0123",
+        "0124",
+        "0001",
+    ]
+    assert encounter.as_dict() == tha_encounter
+
+
+def test_parser_rejects_unknown_record_mode():
+    with pytest.raises(ValueError):
+        S1Parser(record_mode="nope")
+
+
+def test_parser_lazy_records(tha_lines, tha_encounter):
+    parser = S1Parser(record_mode="lazy")
+
+    (encounter,) = parser.iter_encounters(tha_lines)
+
+    revenue = encounter.records[3]
+    assert "charges" not in revenue
+    assert revenue["patient_control_number"] == "PCN"
+    assert revenue["revenue_codes"][1]["revenue_code"] == "0124"
+    assert revenue == tha_encounter["400"]
+    assert encounter.as_dict() == tha_encounter
+
+
+@pytest.mark.parametrize("record_mode", ["dict", "compact", "lazy"])
+def test_parsed_encounters_pickle(tha_lines, tha_encounter, record_mode):
+    (encounter,) = S1Parser(record_mode=record_mode).iter_encounters(tha_lines)
+
+    unpickled = pickle.loads(pickle.dumps(encounter))
+
+    assert unpickled.as_dict() == tha_encounter
+    assert type(unpickled.records[3]) is type(encounter.records[3])
+
+
+def test_parser_lazy_records_validate_length(parser_specs):
+    parser = S1Parser(record_mode="lazy")
+
+    with pytest.raises(InvalidFieldLength):
+        parser.feed("2|too|many|fields")
@@ -58,3 +58,19 @@ def test_build_repeated_objects_empty_data():
     block = RepeatedBlock(key_name="something", fields=["a", "b"])
     repeated_objects = build_repeated_objects(iterator, block)
     assert len(repeated_objects) == 0
+
+
+def test_compiled_decoder_matches_generic_build(repeat_spec):
+    """ The spec's compiled decoder should produce the same dicts as pairing
+    static fields and grouping the repeated block generically """
+    fields = "2|1|2|3|4|5|6|7".split("|")
+    expected = dict(zip(repeat_spec.all_static_field_names, fields))
+    expected["repeats"] = build_repeated_objects(
+        fields[repeat_spec.num_static_fields :], repeat_spec.repeated_block
+    )
+    assert repeat_spec.decode(fields) == expected
+
+
+def test_compiled_decoder_validates_length(repeat_spec):
+    with pytest.raises(InvalidFieldLength):
+        repeat_spec.decode("2|1|2|3|4|5|6".split("|"))
@@ -0,0 +1,111 @@
+import pytest
+
+from s1 import S1Parser, S1Validator
+from s1.synthetic import generate_lines
+
+PROJECTION = {
+    "100": ["patient_control_number", "statement_from_date"],
+    "400": ["revenue_code", "charges"],
+}
+
+
+@pytest.fixture
+def lines():
+    return list(generate_lines(5))
+
+
+def test_projection_keeps_only_named_records_and_fields(lines):
+    parser = S1Parser(projection=PROJECTION)
+    full = list(S1Parser().iter_encounters(lines))
+    projected = list(parser.iter_encounters(lines))
+
+    assert len(projected) == len(full) == 5
+    for encounter, original in zip(projected, full):
+        header, revenue_codes = encounter.records
+        assert header == {
+            key: original.records[0][key]
+            for key in (
+                "record_id",
+                "patient_control_number",
+                "statement_from_date",
+            )
+        }
+        assert list(revenue_codes) == ["record_id", "revenue_codes"]
+        assert revenue_codes["revenue_codes"] == [
+            {"revenue_code": entry["revenue_code"], "charges": entry["charges"]}
+            for entry in original.records[3]["revenue_codes"]
+        ]
+    assert parser.total_lines == len(lines)
+    assert parser.skipped_lines == 30
+
+
+def test_projection_of_record_ids(lines):
+    for record_mode in ("dict", "compact", "lazy"):
+        parser = S1Parser(record_mode=record_mode, projection={"600": None})
+        encounters = list(parser.iter_encounters(lines))
+
+        # Without headers the encounters are still cut at each one
+        assert len(encounters) == 5
+        assert [len(encounter.records) for encounter in encounters] == [1] * 5
+        assert encounters[0].as_dict()["600"]["patient_first_name"]
+
+
+def test_compact_projection_matches_dict(lines):
+    dicts = S1Parser(projection=PROJECTION).iter_encounters(lines)
+    compact = S1Parser(record_mode="compact", projection=PROJECTION)
+
+    for expected, encounter in zip(dicts, compact.iter_encounters(lines)):
+        assert encounter.as_dict() == expected.as_dict()
+
+
+def test_projected_lines_are_still_validated():
+    letters = []
+    parser = S1Parser(
+        projection={"100": ["patient_age"]}, dead_letters=letters.append
+    )
+    lines = ["100|a|b", "600|x|y", "100|" + "|".join("v" * 21)]
+
+    encounters = list(parser.iter_encounters(lines))
+
+    # The bad header is rejected, the 600 line skipped without a look
+    assert [encounter.records for encounter in encounters] == [
+        [{"record_id": "100", "patient_age": "v"}]
+    ]
+    assert [letter.line_number for letter in letters] == [1]
+    assert parser.skipped_lines == 1
+
+
+def test_bad_projections():
+    with pytest.raises(ValueError):
+        S1Parser(projection={"999": None})
+    with pytest.raises(ValueError):
+        S1Parser(projection={"100": ["charges"]})
+    with pytest.raises(ValueError):
+        S1Parser(record_mode="lazy", projection={"100": ["patient_age"]})
+
+
+def test_validator_skips_excluded_record_types(tmp_path):
+    path = tmp_path / "data.s1"
+    path.write_text("100|a\n600|b\n999|c\n")
+    validator = S1Validator(projection={"100": ["patient_age"]})
+
+    report = validator.validate_file(str(path))
+
+    assert dict(report.error_counts) == {
+        "InvalidS1Line": 1,
+        "UnknownRecordType": 1,
+    }
+    assert report.record_counts == {"100": 1, "600": 1}
+    validator.validate("600|too|short")
+
+
+def test_parallel_validation_with_projection(tmp_path):
+    path = tmp_path / "data.s1"
+    path.write_text("\n".join(generate_lines(40)) + "\n600|short\n")
+    validator = S1Validator(projection={"100": None, "400": ["charges"]})
+
+    single = validator.validate_file(str(path))
+    parallel = validator.validate_file(str(path), workers=2, chunk_bytes=4096)
+
+    assert single.is_valid and parallel.is_valid
+    assert parallel.record_counts == single.record_counts
@@ -0,0 +1,60 @@
+import pytest
+
+from s1 import S1Parser
+from s1.exceptions import UnknownRecordType
+from s1.reader import MappedS1Reader
+
+
+@pytest.fixture
+def s1_file(tmp_path, tha_lines):
+    path = tmp_path / "tha.s1"
+    # Mixed line endings and no final newline
+    path.write_bytes(
+        b"\r\n".join(line.encode() for line in tha_lines[:4])
+        + b"\n"
+        + b"\n".join(line.encode() for line in tha_lines[4:])
+    )
+    return str(path)
+
+
+def test_reader_strips_line_endings(s1_file, tha_lines):
+    with MappedS1Reader(s1_file) as reader:
+        assert list(reader) == tha_lines
+
+
+def test_reader_offsets(s1_file):
+    with open(s1_file, "rb") as fobj:
+        data = fobj.read()
+
+    with MappedS1Reader(s1_file) as reader:
+        for offset, line in reader.iter_raw_lines():
+            assert data[offset:].startswith(line)
+            assert offset == 0 or data[offset - 1 : offset] == b"\n"
+
+
+def test_reader_records_match_parser(s1_file, tha_encounter):
+    with MappedS1Reader(s1_file) as reader:
+        records = {
+            spec.record_id: record for _, spec, record in reader.iter_records()
+        }
+        assert records == tha_encounter
+
+        encounters = list(S1Parser().iter_encounters(reader))
+        assert [e.as_dict() for e in encounters] == [tha_encounter]
+
+
+def test_reader_unknown_record_type(tmp_path):
+    path = tmp_path / "bad.s1"
+    path.write_bytes(b"nope|a|b\n")
+
+    with MappedS1Reader(str(path)) as reader:
+        with pytest.raises(UnknownRecordType):
+            list(reader.iter_records())
+
+
+def test_reader_empty_file(tmp_path):
+    path = tmp_path / "empty.s1"
+    path.write_bytes(b"")
+
+    with MappedS1Reader(str(path)) as reader:
+        assert list(reader) == []
@@ -1,6 +1,22 @@
+import pickle
+from typing import List
+
 import pytest
 
-from s1.records.base import InvalidFieldLength, RecordSpec
+from s1.records import LazyRecord
+from s1.records.base import (
+    COMPACT_RECORDS,
+    InvalidFieldLength,
+    RecordSpec,
+    RepeatedBlock,
+)
+from s1.records.intern import InternTable
+from s1.specifications.tha import (
+    PROVIDER_ID,
+    RevenueCodes400,
+    all_specs,
+    intern_low_cardinality_fields,
+)
 
 
 def test_validate_number_of_fields_correct(basic_spec: RecordSpec) -> None:
@@ -41,3 +57,84 @@ def test_validate_number_of_fields_repeat_spec_wrong_repeats(
     """ The repeat spec is (1) + 3 * 2X """
     with pytest.raises(InvalidFieldLength):
         repeat_spec.validate_number_of_fields(7)
+
+
+def test_interned_fields_share_values() -> None:
+    spec = RecordSpec(
+        record_id="9",
+        static_fields=["interned_a", "b"],
+        repeated_block=RepeatedBlock(
+            key_name="repeats",
+            fields=["interned_c", "d"],
+            interned_fields=["interned_c"],
+        ),
+        interned_fields=["interned_a"],
+    )
+    lines = ["9|x1|y1|z1|w|z1|w", "9|x1|y1|z1|w"]
+
+    first, second = (spec.decode(line.split("|")) for line in lines)
+    first_repeats, second_repeats = first["repeats"], second["repeats"]
+    assert isinstance(first_repeats, list)
+    assert isinstance(second_repeats, list)
+    assert first["interned_a"] is second["interned_a"]
+    assert first_repeats[1]["interned_c"] is second_repeats[0]["interned_c"]
+    assert first["b"] is not second["b"]
+
+    compact = spec.decoder(COMPACT_RECORDS)(lines[1].split("|"))
+    assert compact.interned_a is first["interned_a"]
+    lazy = LazyRecord.from_line(spec, lines[1])
+    assert lazy["repeats"][0]["interned_c"] is first_repeats[0]["interned_c"]
+
+
+def test_set_interned_fields(repeat_spec: RecordSpec) -> None:
+    repeat_spec.set_interned_fields(["a", "d"])
+    assert repeat_spec.interned_fields == ["a"]
+    assert repeat_spec.repeated_block is not None
+    assert repeat_spec.repeated_block.interned_fields == ["d"]
+    assert repeat_spec.has_interned_fields
+
+    with pytest.raises(ValueError):
+        repeat_spec.set_interned_fields(["nope"])
+
+
+def test_intern_low_cardinality_fields(tha_lines: List[str]) -> None:
+    (line,) = [line for line in tha_lines if line.startswith("400|")]
+    intern_low_cardinality_fields()
+    try:
+        first, second = (RevenueCodes400.decode(line.split("|")) for _ in "ab")
+        first_codes, second_codes = (
+            first["revenue_codes"],
+            second["revenue_codes"],
+        )
+        assert isinstance(first_codes, list)
+        assert isinstance(second_codes, list)
+        assert first[PROVIDER_ID] is second[PROVIDER_ID]
+        assert first_codes[0]["revenue_code"] is second_codes[0]["revenue_code"]
+        assert first["patient_control_number"] is not (
+            second["patient_control_number"]
+        )
+    finally:
+        for spec in all_specs:
+            spec.set_interned_fields([])
+
+
+def test_intern_table_evicts_oldest_values() -> None:
+    table = InternTable(max_size=4)
+    for value in "abcde":
+        table(value)
+
+    # Going past 4 values dropped the oldest down to 2
+    assert list(table.values) == ["d", "e"]
+
+
+def test_spec_pickles_and_recompiles_its_decoders(
+    repeat_spec: RecordSpec,
+) -> None:
+    repeat_spec.set_interned_fields(["a", "d"])
+
+    unpickled = pickle.loads(pickle.dumps(repeat_spec))
+
+    assert unpickled == repeat_spec
+    fields = "2|1|2|3|4|5|6|7".split("|")
+    assert unpickled.decode(list(fields)) == repeat_spec.decode(list(fields))
+    assert unpickled.has_interned_fields
@@ -0,0 +1,30 @@
+from s1 import S1Parser, S1Validator
+from s1.synthetic import generate_lines, write_file
+
+
+def test_generate_lines_is_deterministic():
+    assert list(generate_lines(5, seed=1)) == list(generate_lines(5, seed=1))
+    assert list(generate_lines(5, seed=1)) != list(generate_lines(5, seed=2))
+
+
+def test_generated_lines_parse_into_encounters():
+    lines = list(generate_lines(10, repeats={"400": (3, 3)}))
+
+    encounters = list(S1Parser().iter_encounters(lines))
+
+    assert len(encounters) == 10
+    for index, encounter in enumerate(encounters):
+        records = encounter.as_dict()
+        assert records["100"]["patient_control_number"] == f"PCN{index:09d}"
+        assert len(records["400"]["revenue_codes"]) == 3
+
+
+def test_write_file_validates(tmp_path):
+    path = str(tmp_path / "synthetic.s1")
+    size = write_file(path, 10)
+
+    report = S1Validator(fast=True).validate_file(path)
+
+    assert report.is_valid
+    assert report.total_lines == 80
+    assert size == (tmp_path / "synthetic.s1").stat().st_size
@@ -0,0 +1,141 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from s1 import ColumnarS1Parser
+from s1.records import RecordSpec, RepeatedBlock
+from s1.records.base import DATE, DECIMAL, INTEGER
+from s1.synthetic import generate_lines
+
+pyarrow = pytest.importorskip("pyarrow")
+
+from s1.typed import BadValue, convert_column  # noqa: E402
+
+
+def test_convert_column():
+    assert convert_column(
+        ["1", "-20", "", "x", "1.5"], INTEGER
+    ).to_pylist() == [1, -20, None, None, None,]
+    assert convert_column(
+        ["1833.94", ".5", "7", "1,0"], DECIMAL
+    ).to_pylist() == [Decimal("1833.94"), Decimal("0.5"), Decimal(7), None,]
+    assert convert_column(
+        ["09152015", "13012019", "9152015"], DATE
+    ).to_pylist() == [datetime.date(2015, 9, 15), None, None,]
+
+
+def test_convert_integer_signs_and_overflow():
+    values = [
+        "+5",
+        "007",
+        "9223372036854775807",
+        "-9223372036854775808",
+        "9223372036854775808",
+        "-9223372036854775809",
+        "99999999999999999999",
+    ]
+
+    assert convert_column(values, INTEGER).to_pylist() == [
+        5,
+        7,
+        2 ** 63 - 1,
+        -(2 ** 63),
+        None,
+        None,
+        None,
+    ]
+
+
+def test_convert_decimal_exact_and_scale():
+    values = [
+        "0.1",
+        "+1.25",
+        "-007.5",
+        "2.50000",
+        "1.23456",
+        "9" * 34 + ".9999",
+        "9" * 35,
+    ]
+
+    converted = convert_column(values, DECIMAL)
+
+    assert converted.type == pyarrow.decimal128(38, 4)
+    assert converted.to_pylist() == [
+        Decimal("0.1"),
+        Decimal("1.25"),
+        Decimal("-7.5"),
+        Decimal("2.5"),
+        None,
+        Decimal("9" * 34 + ".9999"),
+        None,
+    ]
+
+
+def test_typed_batches_convert_annotated_columns():
+    lines = list(generate_lines(12))
+    plain = ColumnarS1Parser(batch_size=5)
+    typed = ColumnarS1Parser(batch_size=5, typed=True)
+
+    for strings, converted in zip(
+        plain.iter_batches(lines), typed.iter_batches(lines)
+    ):
+        header = converted["100"].columns
+        assert header["patient_age"].type == pyarrow.int64()
+        assert header["statement_from_date"].type == pyarrow.date32()
+        assert header["patient_age"].to_pylist() == [
+            int(age) for age in strings["100"].columns["patient_age"]
+        ]
+        # Unannotated fields are left as they are
+        assert header["mrn"] == strings["100"].columns["mrn"]
+        charges = converted["400.revenue_codes"].columns["charges"]
+        assert charges.type == pyarrow.decimal128(38, 4)
+    assert typed.bad_values == []
+
+
+def test_bad_values_become_nulls_and_are_reported():
+    spec = RecordSpec(
+        record_id="100",
+        static_fields=["age"],
+        denotes_new_set=True,
+        repeated_block=RepeatedBlock(
+            key_name="items",
+            fields=["when", "amount"],
+            field_types={"when": DATE, "amount": DECIMAL},
+        ),
+        field_types={"age": INTEGER},
+    )
+    parser = ColumnarS1Parser(typed=True, max_bad_values=2)
+    for fields in (["42", "01022019", "1.5"], ["old", "02302019", "", "", "x"]):
+        parser.current_encounter.append((spec, ["100"] + fields))
+        parser.finish_current_encounter()
+    batches = parser.flush()
+
+    assert batches["100"].columns["age"].to_pylist() == [42, None]
+    items = batches["100.items"].columns
+    assert items["when"].to_pylist() == [datetime.date(2019, 1, 2), None, None]
+    assert items["amount"].to_pylist() == [Decimal("1.5"), None, None]
+    assert parser.total_bad_values == 3
+    assert parser.bad_values == [
+        BadValue("100", "age", 1, "old"),
+        BadValue("100.items", "when", 1, "02302019"),
+    ]
+
+
+def test_unknown_field_types():
+    with pytest.raises(ValueError):
+        RecordSpec(record_id="1", static_fields=["a"], field_types={"b": DATE})
+    with pytest.raises(ValueError):
+        RepeatedBlock(key_name="r", fields=["a"], field_types={"a": "money"})
+
+
+def test_typed_lines_from_file(tmp_path):
+    path = tmp_path / "data.s1"
+    path.write_text("\n".join(generate_lines(5)) + "\n")
+    parser = ColumnarS1Parser(typed=True)
+
+    with open(path) as fobj:
+        (batches,) = parser.iter_batches(fobj)
+
+    assert parser.bad_values == []
+    assert batches["800"].columns["value_code_amount_24"].null_count == 0
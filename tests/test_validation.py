@@ -1,5 +1,6 @@
 import pytest
 
+from s1 import S1Validator
 from s1.exceptions import InvalidS1Format, UnknownRecordType, InvalidS1Line
 
 
@@ -23,3 +24,57 @@ def test_validator_throws_invalid_line(validator):
 
     with pytest.raises(InvalidS1Line):
         validator.validate(invalid_line)
+
+
+def test_fast_validator_throws_invalid_line():
+    validator = S1Validator(fast=True)
+
+    validator.validate("1|a|b|c")
+    with pytest.raises(InvalidS1Line):
+        validator.validate("1|a|b|c|d")
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_validate_file_report(tmp_path, fast, basic_spec):
+    path = tmp_path / "data.s1"
+    path.write_bytes(b"1|a|b|c\nnope|a\n1|a|b\r\n1|a|b|c\nno separator\n")
+
+    report = S1Validator(fast=fast).validate_file(str(path))
+
+    assert not report.is_valid
+    assert report.total_lines == 5
+    assert report.record_counts == {"1": 3}
+    assert report.error_counts == {
+        "UnknownRecordType": 1,
+        "InvalidS1Line": 1,
+        "InvalidS1Format": 1,
+    }
+    unknown, invalid, no_separator = report.errors
+    assert (unknown.line_number, unknown.offset) == (2, 8)
+    assert unknown.record_id == "nope"
+    assert (invalid.line_number, invalid.offset) == (3, 15)
+    assert invalid.record_id == "1"
+    assert no_separator.line_number == 5
+
+
+def test_validate_file_max_errors(tmp_path, basic_spec):
+    path = tmp_path / "data.s1"
+    path.write_bytes(b"nope|a\n" * 5)
+
+    report = S1Validator(fast=True).validate_file(str(path), max_errors=2)
+
+    assert report.error_counts == {"UnknownRecordType": 5}
+    assert len(report.errors) == 2
+
+
+def test_validate_file_reports_undecodable_lines(tmp_path, basic_spec):
+    path = tmp_path / "data.s1"
+    path.write_bytes(b"1|a|b|c\n1|a|\xff|c\n1|a|b|c\n")
+
+    report = S1Validator().validate_file(str(path))
+
+    assert report.total_lines == 3
+    assert report.error_counts == {"UnicodeDecodeError": 1}
+    (error,) = report.errors
+    assert (error.line_number, error.offset) == (2, 8)
+    assert error.record_id == "1"
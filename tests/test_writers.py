@@ -0,0 +1,40 @@
+import io
+import json
+
+import pytest
+
+from s1 import S1Parser
+from s1.writers import NDJSONWriter
+from s1.writers.ndjson import ORJSON, STDLIB_JSON, orjson
+
+BACKENDS = [STDLIB_JSON] + ([ORJSON] if orjson is not None else [])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ndjson_writer_one_encounter_per_line(
+    tha_lines, tha_encounter, backend
+):
+    fobj = io.BytesIO()
+    encounters = S1Parser().iter_encounters(tha_lines + tha_lines)
+
+    with NDJSONWriter(fobj, backend=backend, buffer_size=10) as writer:
+        assert writer.write_all(encounters) == 2
+
+    lines = fobj.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [tha_encounter] * 2
+
+
+def test_ndjson_writer_text_file_and_lazy_records(tha_lines, tha_encounter):
+    fobj = io.StringIO()
+    parser = S1Parser(record_mode="lazy")
+
+    with NDJSONWriter(fobj) as writer:
+        for encounter in parser.iter_encounters(tha_lines):
+            writer.write(encounter)
+
+    assert json.loads(fobj.getvalue()) == tha_encounter
+
+
+def test_ndjson_writer_unknown_backend():
+    with pytest.raises(ValueError):
+        NDJSONWriter(io.BytesIO(), backend="nope")